@@ -0,0 +1,157 @@
+"""
+Generate a synthetic PNG corpus for the benchmarks.
+
+Files are built from deterministic pseudo random data, the same arguments
+always give the same bytes so results can be compared across releases.
+"""
+import argparse
+import os
+import random
+import struct
+import zlib
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+PNG_MAGIC_NUMBER = b'\x89PNG\r\n\x1a\n'
+
+# allowed bit depths of each color type
+DEPTHS: Dict[int, Tuple[int, ...]] = {
+    0: (1, 2, 4, 8, 16),
+    2: (8, 16),
+    3: (1, 2, 4, 8),
+    4: (8, 16),
+    6: (8, 16),
+}
+SAMPLES = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+SIZES: Dict[str, Tuple[int, int]] = {
+    'icon': (16, 16),
+    'small': (256, 256),
+    'medium': (1024, 1024),
+    'large': (4096, 4096),
+    'huge': (10000, 10000),
+}
+PRESETS: Dict[str, Tuple[str, ...]] = {
+    'quick': ('icon', 'small'),
+    'default': ('icon', 'small', 'medium'),
+    'full': tuple(SIZES),
+}
+
+LAYOUTS = ('single', 'split')
+# IDAT size of the split layout
+SPLIT_IDAT_SIZE = 1024
+
+_ADAM7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+
+class Case(NamedTuple):
+    size: str
+    color_type: int
+    bit_depth: int
+    interlace: int
+    layout: str
+
+    @property
+    def name(self) -> str:
+        return f'{self.size}-c{self.color_type}-d{self.bit_depth}-' \
+               f'{"adam7" if self.interlace else "flat"}-{self.layout}'
+
+
+def iter_cases(sizes=PRESETS['default']) -> Iterator[Case]:
+    for size in sizes:
+        for color_type, depths in DEPTHS.items():
+            for bit_depth in depths:
+                for interlace in (0, 1):
+                    for layout in LAYOUTS:
+                        yield Case(size, color_type, bit_depth, interlace, layout)
+
+
+def _chunk(type_: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + type_ + data + struct.pack('>I', zlib.crc32(type_ + data))
+
+
+def _row_sizes(width: int, height: int, bits_per_pixel: int, interlace: int) -> Iterator[int]:
+    def row_size(pixels: int) -> int:
+        return (pixels * bits_per_pixel + 7) // 8
+
+    if not interlace:
+        for _ in range(height):
+            yield row_size(width)
+        return
+
+    for xstart, ystart, xstep, ystep in _ADAM7:
+        if xstart >= width:
+            continue
+        pixels = (width - xstart + xstep - 1) // xstep
+        for _ in range(ystart, height, ystep):
+            yield row_size(pixels)
+
+
+def _image_data(case: Case, width: int, height: int, seed: int) -> bytes:
+    # any byte string is valid filtered data, rows cycle through the 5 filters
+    # and mix a smooth gradient with noise to keep a realistic ratio
+    rng = random.Random(seed)
+    bits_per_pixel = SAMPLES[case.color_type] * case.bit_depth
+    max_row = (width * bits_per_pixel + 7) // 8
+
+    gradient = bytes((i * 7 // 5) & 0xff for i in range(max_row + 256))
+    noise = bytes(rng.getrandbits(8) for _ in range(min(max_row, 4096) + 256))
+
+    rows = []
+    for y, size in enumerate(_row_sizes(width, height, bits_per_pixel, case.interlace)):
+        if y % 8 == 7:
+            start = (y * 37) % 256
+            row = (noise * (size // len(noise) + 2))[start:start + size]
+        else:
+            row = gradient[y % 256:y % 256 + size]
+        rows.append(bytes((y % 5,)) + row)
+    return b''.join(rows)
+
+
+def make_png(case: Case, seed: int = 0) -> bytes:
+    """
+    Build the PNG of a corpus case.
+    """
+    width, height = SIZES[case.size]
+    ihdr = struct.pack('>IIBBBBB', width, height, case.bit_depth, case.color_type, 0, 0, case.interlace)
+
+    data = PNG_MAGIC_NUMBER + _chunk(b'IHDR', ihdr)
+    if case.color_type == 3:
+        data += _chunk(b'PLTE', bytes(random.Random(seed).getrandbits(8) for _ in range(256 * 3)))
+
+    compressed = zlib.compress(_image_data(case, width, height, seed), 6)
+    if case.layout == 'split':
+        parts = [compressed[i:i + SPLIT_IDAT_SIZE] for i in range(0, len(compressed), SPLIT_IDAT_SIZE)]
+    else:
+        parts = [compressed]
+    data += b''.join(_chunk(b'IDAT', part) for part in parts)
+    return data + _chunk(b'IEND', b'')
+
+
+def generate(directory: str, cases: List[Case], seed: int = 0) -> List[Tuple[Case, str]]:
+    """
+    Write the corpus files missing from `directory`, return the path of every case.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for case in cases:
+        path = os.path.join(directory, f'{case.name}.png')
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(make_png(case, seed))
+        paths.append((case, path))
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate the synthetic benchmark corpus')
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('-p', '--preset', choices=PRESETS, default='default')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    for case, path in generate(args.directory, list(iter_cases(PRESETS[args.preset])), args.seed):
+        print(f'{case.name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
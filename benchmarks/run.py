@@ -0,0 +1,149 @@
+"""
+Time the main stages of pngparser on the synthetic corpus and report JSON.
+
+    python -m benchmarks.run -p quick -o results.json
+    python -m benchmarks.run -p quick --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from pngparser import PngParser
+from pngparser.version import __version__
+from pngparser.filters import HAS_NUMPY
+
+from .corpus import PRESETS, generate, iter_cases
+
+STAGES = ('open', 'get_image_data', 'scanlines', 'to_bytes', 'set_image_data', 'save_file',
+          'iter_scanlines', 'decode_region', 'preview')
+
+
+def _timed(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_once(path: str, output: str) -> Dict[str, float]:
+    """
+    Time each stage once on the file at `path`.
+    """
+    timings: Dict[str, float] = {}
+    state: Dict[str, Any] = {}
+
+    start = time.perf_counter()
+    png = PngParser(path)
+    timings['open'] = time.perf_counter() - start
+
+    with png:
+        timings['get_image_data'] = _timed(lambda: state.setdefault('img', png.get_image_data()))
+        img = state['img']
+        timings['scanlines'] = _timed(lambda: img.scanlines)
+        timings['to_bytes'] = _timed(img.to_bytes)
+        timings['set_image_data'] = _timed(lambda: png.set_image_data(img))
+        timings['save_file'] = _timed(lambda: png.save_file(output))
+
+    # streaming decoders on a parser of their own, nothing decoded above is reused
+    with PngParser(path, lazy=True) as png:
+        header = png.get_header()
+        # block at the middle of the image, the rows above it are decoded too
+        y = header.height // 2
+        timings['iter_scanlines'] = _timed(lambda: deque(png.iter_scanlines(), maxlen=0))
+        timings['decode_region'] = _timed(lambda: png.decode_region(
+            0, y, min(64, header.width), min(64, header.height - y)))
+        timings['preview'] = _timed(lambda: png.preview(8))
+    return timings
+
+
+def bench_file(path: str, repeat: int) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, 'out.png')
+        runs = [run_once(path, output) for _ in range(repeat)]
+
+    return {
+        stage: {
+            'min': min(run[stage] for run in runs),
+            'median': statistics.median(run[stage] for run in runs),
+        } for stage in STAGES
+    }
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'pngparser': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'numpy': HAS_NUMPY,
+    }
+
+
+def run(corpus: str, preset: str, repeat: int, match: Optional[str] = None) -> Dict[str, Any]:
+    results = []
+    for case, path in generate(corpus, list(iter_cases(PRESETS[preset]))):
+        if match and match not in case.name:
+            continue
+        stages = bench_file(path, repeat)
+        results.append({'case': case.name, **case._asdict(), 'file_size': os.path.getsize(path),
+                        'stages': stages})
+        print(f'{case.name}: ' + ' '.join(f'{s}={v["min"] * 1000:.2f}ms' for s, v in stages.items()),
+              file=sys.stderr)
+
+    return {'environment': environment(), 'preset': preset, 'repeat': repeat, 'results': results}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    List the stages slower than the baseline by more than `threshold` (1.2 is 20% slower).
+    """
+    base = {r['case']: r['stages'] for r in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        if result['case'] not in base:
+            continue
+        for stage, values in result['stages'].items():
+            before = base[result['case']].get(stage, {}).get('min')
+            if before and values['min'] / before > threshold:
+                regressions.append(f'{result["case"]} {stage}: {before * 1000:.2f}ms -> '
+                                   f'{values["min"] * 1000:.2f}ms (x{values["min"] / before:.2f})')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark pngparser on a synthetic corpus')
+    parser.add_argument('-p', '--preset', choices=PRESETS, default='quick')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs of each file, the best is kept')
+    parser.add_argument('-k', '--match', help='Only run cases whose name contains this string')
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'pngparser-corpus'),
+                        help='Corpus directory, files are generated once')
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='Baseline JSON report to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2, help='Slowdown ratio reported as regression')
+    args = parser.parse_args()
+
+    report = run(args.corpus, args.preset, args.repeat, args.match)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'regression: {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
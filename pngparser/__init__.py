@@ -1,5 +1,9 @@
 from .png import PngParser, PNG_MAGIC_NUMBER
 from .chunks import *
 from .imagedata import ImageData, Scanline
+from .probe import ProbeResult, probe
+from .aio import AsyncPngParser
+from .cache import ImageCache, disable_image_cache, enable_image_cache, get_image_cache
+from .limits import LimitExceeded, Limits
 # from .pixel import Pixel
 from .chunktypes import *
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, List, Optional, Tuple, Union
+
+from .chunks import ChunkIHDR, create_chunk
+from .chunktypes import (CHUNK_CRC_SIZE, CHUNK_LENGTH_SIZE, CHUNK_TYPE_SIZE,
+                         TYPE_IDAT, TYPE_IEND, TYPE_IHDR)
+from .imagedata import Scanline, ScanlineDecoder, raw_size
+from .limits import Limits
+from .png import PNG_MAGIC_NUMBER
+
+DEFAULT_READ_SIZE = 64 * 1024
+
+
+class AsyncPngParser:
+    """
+    Parse a PNG while it is received, from an asyncio.StreamReader or any async
+    iterable of bytes.
+
+    The header is available as soon as it is read and image data is inflated
+    block by block as it arrives, the whole file is never buffered.
+    """
+
+    def __init__(self, source: Union[asyncio.StreamReader, AsyncIterable[bytes]],
+                 read_size: int = DEFAULT_READ_SIZE, limits: Optional[Limits] = None) -> None:
+        self.source = source
+        self.read_size = read_size
+        # resource budgets of untrusted streams, unlimited when None
+        self.limits = limits
+
+        self.header: Optional[ChunkIHDR] = None
+        # every chunk read so far except IDAT chunks given to the decoder
+        self.chunks: List[Any] = []
+        self.ended = False
+
+        self._buffer = bytearray()
+        self._iterator: Optional[AsyncIterator[bytes]] = None
+        self._received = 0
+        self._chunk_count = 0
+
+    async def _pull(self) -> bytes:
+        data = await self._pull_source()
+        self._received += len(data)
+        if self.limits is not None:
+            self.limits.check('max_file_size', self._received)
+        return data
+
+    async def _pull_source(self) -> bytes:
+        if isinstance(self.source, asyncio.StreamReader):
+            return await self.source.read(self.read_size)
+
+        if self._iterator is None:
+            self._iterator = self.source.__aiter__()
+        try:
+            return bytes(await self._iterator.__anext__())
+        except StopAsyncIteration:
+            return b''
+
+    async def _read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            data = await self._pull()
+            if not data:
+                raise EOFError(f'stream ended, {size - len(self._buffer)} bytes missing')
+            self._buffer += data
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def _read_some(self, size: int) -> bytes:
+        # at most `size` bytes, as soon as some are available
+        if not self._buffer:
+            data = await self._pull()
+            if not data:
+                raise EOFError(f'stream ended, {size} bytes missing')
+            self._buffer += data
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    async def _read_chunk_header(self) -> Tuple[int, bytes]:
+        header = await self._read(CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE)
+        length = int.from_bytes(header[:CHUNK_LENGTH_SIZE], 'big')
+
+        self._chunk_count += 1
+        if self.limits is not None:
+            # before the payload is buffered
+            self.limits.check('max_chunks', self._chunk_count)
+            self.limits.check('max_chunk_length', length)
+        return length, header[CHUNK_LENGTH_SIZE:]
+
+    async def _read_chunk_body(self, chunk_type: bytes, length: int) -> Any:
+        data = await self._read(length)
+        crc = await self._read(CHUNK_CRC_SIZE)
+        chunk = create_chunk(chunk_type, data, crc, self.limits)
+
+        logging.debug('found chunk %s', chunk_type)
+        if chunk_type == TYPE_IEND:
+            self.ended = True
+        return chunk
+
+    async def read_header(self) -> ChunkIHDR:
+        """
+        Read the signature and the IHDR chunk, the stream is left after IHDR.
+        """
+        if self.header is not None:
+            return self.header
+
+        if await self._read(len(PNG_MAGIC_NUMBER)) != PNG_MAGIC_NUMBER:
+            raise Exception('stream is not a PNG !')
+
+        length, chunk_type = await self._read_chunk_header()
+        if chunk_type != TYPE_IHDR:
+            raise Exception(f'first chunk must be IHDR not {chunk_type!r}')
+
+        header = await self._read_chunk_body(chunk_type, length)
+        if self.limits is not None:
+            self.limits.check('max_pixels', header.width * header.height)
+            self.limits.check('max_inflated_bytes', raw_size(header))
+        self.header = header
+        self.chunks.append(header)
+        return header
+
+    async def iter_chunks(self) -> AsyncIterator[Any]:
+        """
+        Yield each chunk as soon as it is received, until IEND.
+        """
+        await self.read_header()
+        while not self.ended:
+            length, chunk_type = await self._read_chunk_header()
+            chunk = await self._read_chunk_body(chunk_type, length)
+            self.chunks.append(chunk)
+            yield chunk
+
+    async def iter_scanlines(self) -> AsyncIterator[Scanline]:
+        """
+        Decode the image data row by row while it is received.
+
+        IDAT payloads are fed to the inflater by blocks of at most `read_size` bytes
+        and the event loop gets control back after each block. The chunks after
+        the image data are read until IEND.
+        """
+        header = await self.read_header()
+        decoder = ScanlineDecoder(header)
+        seen_idat = finished = False
+
+        while not self.ended:
+            length, chunk_type = await self._read_chunk_header()
+            if chunk_type != TYPE_IDAT:
+                # image data is contiguous, the first chunk after IDAT ends it
+                if seen_idat and not finished:
+                    finished = True
+                    for scanline in decoder.finish():
+                        yield scanline
+                self.chunks.append(await self._read_chunk_body(chunk_type, length))
+                continue
+
+            logging.debug('found chunk %s', chunk_type)
+            seen_idat = True
+            while length > 0:
+                block = await self._read_some(min(length, self.read_size))
+                length -= len(block)
+                for scanline in decoder.feed(block):
+                    yield scanline
+                await asyncio.sleep(0)
+            await self._read(CHUNK_CRC_SIZE)
+
+        if not finished:
+            for scanline in decoder.finish():
+                yield scanline
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional
+
+from .chunktypes import TYPE_IHDR
+from .png import PngParser
+
+# paths submitted to the pool at once, bound the memory used on huge archives
+SUBMIT_WINDOW = 4096
+
+
+def iter_png_files(paths: Iterable[str]) -> Iterator[str]:
+    """
+    Yield files from a list of files and directories, directories are walked recursively.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.png'):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _header_record(header) -> Dict[str, int]:
+    return {
+        'width': header.width,
+        'height': header.height,
+        'bit_depth': header.bit_depth,
+        'color_type': header.color_type,
+        'compression_method': header.compression_method,
+        'filter_method': header.filter_method,
+        'interlace_method': header.interlace_method,
+    }
+
+
+def _text_record(chunk) -> Dict[str, Any]:
+    if hasattr(chunk, 'text'):
+        return {'type': chunk.type.decode('latin-1'), 'key': chunk.key, 'text': chunk.text}
+    return {'type': chunk.type.decode('latin-1'), 'key': None,
+            'text': bytes(chunk.data).decode('utf-8', 'replace')}
+
+
+def analyse_file(path: str) -> Dict[str, Any]:
+    """
+    Parse a PNG file and return a JSON serializable record, errors are reported in the record.
+    """
+    record: Dict[str, Any] = {'path': path}
+    try:
+        record['size'] = os.stat(path).st_size
+        with PngParser(path, lazy=True, zero_copy=True) as png:
+            record['chunks'] = [{
+                'type': type_.decode('latin-1'),
+                'offset': offset,
+                'length': length,
+                'crc_ok': png.verify_crc(idx),
+            } for idx, (offset, length, type_) in enumerate(png.chunks_index)]
+
+            if png.get_by_type(TYPE_IHDR):
+                record['header'] = _header_record(png.get_header())
+            record['text'] = [_text_record(c) for c in png.get_text_chunks()]
+    except Exception as e:  # pylint: disable=broad-except
+        record['error'] = f'{type(e).__name__}: {e}'
+    return record
+
+
+def run_batch(paths: Iterable[str], output: IO[str], workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Analyse every file on a process pool and write one JSON record per line to `output`.
+
+    Return the throughput summary.
+    """
+    start = time.perf_counter()
+    files = errors = size = 0
+
+    files_iter = iter_png_files(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            window: List[str] = list(islice(files_iter, SUBMIT_WINDOW))
+            if not window:
+                break
+
+            for record in executor.map(analyse_file, window, chunksize=64):
+                files += 1
+                size += record.get('size', 0)
+                if 'error' in record:
+                    errors += 1
+                output.write(json.dumps(record) + '\n')
+
+    elapsed = time.perf_counter() - start
+    return {
+        'files': files,
+        'errors': errors,
+        'bytes': size,
+        'seconds': round(elapsed, 3),
+        'files_per_second': round(files / elapsed, 1) if elapsed else 0.0,
+        'mb_per_second': round(size / 1e6 / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print(f'{summary["files"]} files ({summary["errors"]} errors) in {summary["seconds"]}s : '
+          f'{summary["files_per_second"]} files/s, {summary["mb_per_second"]} MB/s',
+          file=sys.stderr)
@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def image_size(img: Any) -> int:
+    """
+    Estimate the memory held by a decoded image, its inflated data and scanlines.
+    """
+    return 2 * len(img.data)
+
+
+class ImageCache:
+    """
+    LRU cache of decoded ImageData bounded by entries and bytes, thread safe.
+
+    Cached images are shared by every parser of the same file, they must not be modified.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            img = self._entries.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key: Hashable, img: Any) -> None:
+        size = image_size(img)
+        if size > self.max_bytes:
+            logging.debug('image of %d bytes too large for the cache', size)
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= image_size(self._entries.pop(key))
+            self._entries[key] = img
+            self.size += size
+
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= image_size(evicted)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            img = self._entries.pop(key, None)
+            if img is not None:
+                self.size -= image_size(img)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+_image_cache: Optional[ImageCache] = None
+
+
+def enable_image_cache(max_entries: int = DEFAULT_MAX_ENTRIES,
+                       max_bytes: int = DEFAULT_MAX_BYTES) -> ImageCache:
+    """
+    Share decoded images between every PngParser of the process.
+    """
+    global _image_cache  # pylint: disable=global-statement
+    _image_cache = ImageCache(max_entries, max_bytes)
+    return _image_cache
+
+
+def disable_image_cache() -> None:
+    global _image_cache  # pylint: disable=global-statement
+    _image_cache = None
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    return _image_cache
@@ -0,0 +1,108 @@
+import logging
+import zlib
+from itertools import islice
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Sequence
+
+from .chunks import ChunkIHDR
+from .filters import unfilter_row
+from .imagedata import DEFAULT_CHECKPOINT_INTERVAL, INFLATE_BLOCK_SIZE, Scanline
+
+
+class Checkpoint(NamedTuple):
+    """
+    Decoder state before a row: where the next compressed byte is, the
+    inflater with its window and the reconstructed previous row.
+    """
+    row: int
+    chunk: int
+    offset: int
+    inflater: Any
+    previous: Optional[bytes]
+
+
+class RowIndex:
+    """
+    Random access to the rows of a non interlaced image without decoding from the first row.
+
+    `build()` decodes the image once and keeps a checkpoint every `interval` rows,
+    `rows()` then resumes from the nearest checkpoint. Each checkpoint holds a
+    copy of the inflater, about 40K, and one row.
+    """
+
+    def __init__(self, header: ChunkIHDR, chunks: Sequence[bytes], interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> None:
+        if header.interlace_method == 1:
+            raise ValueError('random row access needs a non interlaced image')
+        if interval <= 0:
+            raise ValueError(f'checkpoint interval must be positive not {interval}')
+
+        self.header = header
+        self.chunks = [memoryview(c) for c in chunks]
+        self.interval = interval
+        self.checkpoints: List[Checkpoint] = []
+
+    def _decode(self, start: Checkpoint, end: int,
+                on_row: Optional[Callable[[int, int, int, Any, bytes], None]] = None) -> Iterator[Scanline]:
+        # yield the rows from `start.row` to `end`, `on_row(y, chunk, offset, inflater, recon)`
+        # is called after each row with the state before the next one
+        row_size = self.header.row_length()
+        fu = self.header.filter_unit
+        inflater = start.inflater.copy()
+        chunk, offset = start.chunk, start.offset
+        previous = start.previous
+        row = bytearray()
+
+        y = start.row
+        while y < end:
+            if chunk >= len(self.chunks):
+                # output still held by the inflater
+                out = inflater.decompress(b'', row_size + 1 - len(row))
+            else:
+                data = self.chunks[chunk]
+                # bounded block, the unconsumed tail is given again from `offset` on the next call
+                block = data[offset:offset + INFLATE_BLOCK_SIZE]
+                out = inflater.decompress(block, row_size + 1 - len(row))
+                offset += len(block) - len(inflater.unconsumed_tail)
+                if offset == len(data):
+                    chunk, offset = chunk + 1, 0
+
+            if not out and chunk >= len(self.chunks):
+                logging.error('missing scanlines in image data')
+                return
+            row += out
+
+            if len(row) == row_size + 1:
+                filter_type = row[0]
+                previous = unfilter_row(filter_type, row[1:], previous, fu)
+                row = bytearray()
+                if on_row is not None:
+                    on_row(y + 1, chunk, offset, inflater, previous)
+                yield Scanline(filter_type, previous)
+                y += 1
+
+    def build(self) -> None:
+        """
+        Decode the image once and record the checkpoints.
+        """
+        self.checkpoints = [Checkpoint(0, 0, 0, zlib.decompressobj(), None)]
+
+        def on_row(y: int, chunk: int, offset: int, inflater: Any, recon: bytes) -> None:
+            if y % self.interval == 0 and y < self.header.height:
+                self.checkpoints.append(Checkpoint(y, chunk, offset, inflater.copy(), bytes(recon)))
+
+        for _ in self._decode(self.checkpoints[0], self.header.height, on_row):
+            pass
+        logging.debug('%d checkpoints recorded', len(self.checkpoints))
+
+    def rows(self, y0: int, y1: int) -> List[Scanline]:
+        """
+        Get the reconstructed scanlines from row `y0` included to `y1` excluded.
+        """
+        y0 = max(0, y0)
+        y1 = min(y1, self.header.height)
+        if y0 >= y1:
+            return []
+        if not self.checkpoints:
+            self.build()
+
+        start = self.checkpoints[min(y0 // self.interval, len(self.checkpoints) - 1)]
+        return list(islice(self._decode(start, y1), y0 - start.row, None))
@@ -4,6 +4,8 @@ from ..chunktypes import (CHUNK_LENGTH_SIZE, TYPE_IDAT, TYPE_IEND, TYPE_IHDR,
                           TYPE_PLTE, TYPE_iTXt, TYPE_pHYs, TYPE_tEXt,
                           TYPE_tIME, TYPE_zTXt)
 from ..color import Color
+from ..limits import Limits
+from .base import TrackedChunk
 from .bkgd import ChunkBkgd
 from .ihdr import ChunkIHDR
 from .phys import ChunkPhys
@@ -13,7 +15,7 @@ from .time import ChunkTime
 from .ztxt import ChunkZtxt
 
 
-class ChunkRaw:
+class ChunkRaw(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: Optional[bytes] = None) -> None:
         self.type = type_
         self.data = data
@@ -24,7 +26,7 @@ class ChunkRaw:
         return length + self.type + self.data + self.crc
 
     def __str__(self) -> str:
-        return f'Chunk({Color.text}{self.data!r}{Color.r})'
+        return f'Chunk({Color.text}{bytes(self.data)!r}{Color.r})'
 
 
 FACTORY = {
@@ -40,7 +42,16 @@ FACTORY = {
 }
 
 
-def create_chunk(chunk_type: bytes, data: bytes, crc: bytes) -> Any:
+def is_raw_chunk(chunk_type: bytes) -> bool:
+    """
+    Check if chunk of this type keep their data unparsed.
+    """
+    return FACTORY.get(chunk_type, ChunkRaw) is ChunkRaw
+
+
+def create_chunk(chunk_type: bytes, data: bytes, crc: bytes, limits: Optional[Limits] = None) -> Any:
+    if chunk_type == TYPE_zTXt and limits is not None:
+        return ChunkZtxt(chunk_type, data, crc, max_length=limits.max_text_inflate)
     if chunk_type in FACTORY:
         return FACTORY[chunk_type](chunk_type, data, crc)
     return ChunkRaw(chunk_type, data, crc)
@@ -0,0 +1,15 @@
+class TrackedChunk:
+    """
+    Mark the chunk as modified when any of its attributes is assigned.
+
+    Chunks read from a file are reset to unmodified by the parser so they can be
+    copied from the file when saving. In place changes, like editing the palette
+    list, are not detected: set `dirty` to True after them.
+    """
+
+    dirty = True
+
+    def __setattr__(self, name, value) -> None:
+        if name != 'dirty':
+            object.__setattr__(self, 'dirty', True)
+        object.__setattr__(self, name, value)
@@ -1,8 +1,9 @@
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from .base import TrackedChunk
 
 
-class ChunkBkgd:
+class ChunkBkgd(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
         self.type = type_
         self.data = data
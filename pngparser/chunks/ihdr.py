@@ -1,8 +1,11 @@
+import logging
 import struct
+from typing import Optional
 
 from ..utils import pixel_type_to_length
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from .base import TrackedChunk
 
 COLOR_TYPE = {
     '0': ([1, 2, 4, 8, 16], 'Each pixel is a grayscale sample.'),
@@ -19,7 +22,7 @@ COLOR_TYPE_ALPHAGRAY = 4
 COLOR_TYPE_RGBA = 6
 
 
-class ChunkIHDR:
+class ChunkIHDR(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
         self.type = type_
         self.crc = crc
@@ -43,7 +46,7 @@ class ChunkIHDR:
             color = COLOR_TYPE[color_type]
 
             if self.bit_depth not in color[0]:
-                print(f'{Color.unknown}Bit depth no allowed in color type{Color.r}')
+                logging.warning('bit depth %d not allowed in color type %d', self.bit_depth, self.color_type)
 
             self.color_type_display = f'Code = {self.color_type} ; Depth Allow = {color[0]} ; {color[1]}'
 
@@ -59,6 +62,29 @@ class ChunkIHDR:
         """
         return pixel_type_to_length(self.color_type)
 
+    @property
+    def bits_per_pixel(self) -> int:
+        return self.pixel_len * self.bit_depth
+
+    @property
+    def filter_unit(self) -> int:
+        """
+        Get the byte distance used by filters to find the previous pixel.
+
+        One byte when pixels are smaller than a byte.
+        """
+        return max(1, self.bits_per_pixel // 8)
+
+    def row_length(self, width: Optional[int] = None) -> int:
+        """
+        Get the size in bytes of a scanline of `width` pixels, without filter byte.
+
+        Use the image width by default.
+        """
+        if width is None:
+            width = self.width
+        return (width * self.bits_per_pixel + 7) // 8
+
     @property
     def data(self) -> bytes:
         return struct.pack('>IIBBBBB',
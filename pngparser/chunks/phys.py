@@ -2,9 +2,10 @@ import struct
 
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from .base import TrackedChunk
 
 
-class ChunkPhys:
+class ChunkPhys(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
         self.type = type_
         self.crc = crc
@@ -2,11 +2,12 @@ from PIL import Image
 
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from .base import TrackedChunk
 
 PIXEL_LEN = 3
 
 
-class ChunkPLTE:
+class ChunkPLTE(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
         self.type = type_
         self.crc = crc
@@ -25,10 +26,7 @@ class ChunkPLTE:
 
     @property
     def data(self) -> bytes:
-        ret = bytes()
-        for pixel in self.palette:
-            ret += bytes(pixel)
-        return ret
+        return b''.join(bytes(pixel) for pixel in self.palette)
 
     def __str__(self) -> str:
         size = 10
@@ -2,9 +2,10 @@ from typing import Optional
 
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from .base import TrackedChunk
 
 
-class ChunkText:
+class ChunkText(TrackedChunk):
     def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
         self.type = type_
         self.crc = crc
@@ -1,11 +1,14 @@
 import zlib
+from typing import Optional
 
 from ..color import Color
 from ..chunktypes import CHUNK_LENGTH_SIZE
+from ..limits import inflate_limited
+from .base import TrackedChunk
 
 
-class ChunkZtxt:
-    def __init__(self, type_: bytes, data: bytes, crc: bytes) -> None:
+class ChunkZtxt(TrackedChunk):
+    def __init__(self, type_: bytes, data: bytes, crc: bytes, max_length: Optional[int] = None) -> None:
         self.type = type_
         self.crc = crc
 
@@ -13,7 +16,11 @@ class ChunkZtxt:
 
         self.key = key.decode('utf-8')
         self.method = rest[0]
-        self.text = zlib.decompress(rest[1:]).decode('utf-8', 'replace')
+        if max_length is None:
+            text = zlib.decompress(rest[1:])
+        else:
+            text = inflate_limited([rest[1:]], max_length, 'max_text_inflate')
+        self.text = text.decode('utf-8', 'replace')
         self.data = self.text
 
     def to_bytes(self) -> bytes:
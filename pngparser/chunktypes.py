@@ -3,6 +3,7 @@ from typing import List
 CHUNK_LENGTH_SIZE = 4
 CHUNK_TYPE_SIZE = 4
 CHUNK_CRC_SIZE = 4
+CHUNK_HEADER_SIZE = CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE
 
 
 TYPE_IHDR = b'IHDR'
@@ -7,11 +7,17 @@ import sys
 import logging
 import random
 import zlib
+from typing import Optional
 
+from .batch import print_summary, run_batch
+from .chunks import create_chunk
 from .color import Color
-from .png import PngParser
+from .events import iter_chunks
+from .index_cache import IndexCache
+from .png import PngParser, computed_crc, stored_crc
+from .stats import Stats
 from .version import __version__
-from .chunktypes import CHUNK_CRC_SIZE
+from .chunktypes import CHUNK_CRC_SIZE, is_text_chunk
 
 
 RAW_BANNER = """
@@ -57,23 +63,24 @@ def print_error_and_exit(*args, **kwargs) -> None:
     sys.exit(1)
 
 
-def print_chunk(chunk, idx: int, spos: int, epos: int,
-                print_data: bool = False, format_raw: bool = False,
-                print_crc: bool = False, print_length: bool = False,
-                hexa: bool = False) -> None:
+def print_chunk(chunk_type: bytes, idx: int, spos: int, epos: int, data_size: int, *,
+                chunk=None, crc=None, format_raw: bool = False,
+                print_length: bool = False, hexa: bool = False) -> None:
+    """
+    Print one chunk, its data is printed when `chunk` is given and
+    `crc` is the stored and computed crc when they are printed.
+    """
     if hexa:
         print(f'[{Color.line}{spos:08x}-{epos:08x}{Color.r}] ({Color.id}{idx}{Color.r})')
     else:
         print(f'[{Color.line}{spos:08d}-{epos:08d}{Color.r}] ({Color.id}{idx}{Color.r})')
     try:
-        print(f'{Color.chunk}{chunk.type.decode()}{Color.r}:')
+        print(f'{Color.chunk}{chunk_type.decode()}{Color.r}:')
     except UnicodeDecodeError:
-        print(f'{Color.chunk}{chunk.type}{Color.r}:')
+        print(f'{Color.chunk}{chunk_type}{Color.r}:')
 
-    if print_crc:
-        current = chunk.crc
-        computed = zlib.crc32(
-            chunk.type + chunk.data).to_bytes(CHUNK_CRC_SIZE, 'big')
+    if crc is not None:
+        current, computed = crc
         if current == computed:
             print(f'{Color.crc}CRC : {computed.hex()}{Color.r}')
         else:
@@ -81,8 +88,8 @@ def print_chunk(chunk, idx: int, spos: int, epos: int,
     if print_length:
         print(f'{Color.length}Length : {epos - spos}{Color.r}')
 
-    print(f'{Color.length}Data size : {len(chunk.data)}{Color.r}')
-    if print_data:
+    print(f'{Color.length}Data size : {data_size}{Color.r}')
+    if chunk is not None:
         if format_raw:
             print(chunk.data)
         else:
@@ -93,7 +100,7 @@ def print_chunk(chunk, idx: int, spos: int, epos: int,
 
 def args_parser() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='Prints PNG text sections')
-    parser.add_argument('file', help='A PNG image')
+    parser.add_argument('file', help='A PNG image, - to read standard input')
 
     # Select Chunk
     group = parser.add_mutually_exclusive_group()
@@ -118,6 +125,10 @@ def args_parser() -> argparse.Namespace:
         '--hex', help='Print bytes position in Hexadecimal', action='store_true')
     parser.add_argument('-s', '--show', help='Show image', action='store_true')
 
+    parser.add_argument(
+        '--index-cache', help='Keep the chunk table of the file in this cache directory for next runs',
+        nargs='?', const='', metavar='DIR')
+
     # Save file
     parser.add_argument(
         '-o', '--output', help='Save image (fix input file errors if any)', type=str, default='')
@@ -125,46 +136,171 @@ def args_parser() -> argparse.Namespace:
     # Debug
     parser.add_argument('-v', '--verbose', action='count',
                         help='Increase verbosity')
+    parser.add_argument(
+        '--profile', help='Decode the image and print the time spent in each stage', action='store_true')
+    parser.add_argument(
+        '--profile-memory', help='Also trace allocation peaks, slower', action='store_true')
+    parser.add_argument(
+        '--profile-output', help='Write the profile as JSON to this file', type=str)
     return parser.parse_args()
 
 
+def batch_args_parser(argv) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='png-parser batch', description='Analyse many PNG files, print one JSON record per file')
+    parser.add_argument('paths', nargs='*', help='PNG files or directories')
+    parser.add_argument(
+        '-f', '--file-list', help='Read paths from this file, one per line, - for stdin', type=str)
+    parser.add_argument(
+        '-j', '--jobs', help='Number of worker processes, default one per core', type=int)
+    parser.add_argument(
+        '-o', '--output', help='Write records to this file instead of stdout', type=str)
+    return parser.parse_args(argv)
+
+
+def batch_main(argv) -> None:
+    args = batch_args_parser(argv)
+
+    paths = list(args.paths)
+    if args.file_list == '-':
+        paths += [line.rstrip('\n') for line in sys.stdin if line.strip()]
+    elif args.file_list:
+        with open(args.file_list, encoding='utf-8') as list_file:
+            paths += [line.rstrip('\n') for line in list_file if line.strip()]
+    if not paths:
+        print_error_and_exit('Error: no file to analyse')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            summary = run_batch(paths, output, args.jobs)
+    else:
+        summary = run_batch(paths, sys.stdout, args.jobs)
+    print_summary(summary)
+
+
+def stream_main(args: argparse.Namespace) -> None:
+    """
+    Print the chunks of a PNG read from standard input, one chunk at a time.
+    """
+    if args.show or args.output:
+        print_error_and_exit('Error: --show and --output need a file')
+    if args.text:
+        args.data = True
+
+    type_filter = args.type.encode() if args.type is not None else None
+    selected = 0
+    for idx, event in enumerate(iter_chunks(sys.stdin.buffer)):
+        if args.chunk is not None and idx != args.chunk:
+            continue
+        if type_filter is not None and event.type != type_filter:
+            continue
+        if args.text and not is_text_chunk(event.type):
+            continue
+
+        data = event.read()
+        crc = None
+        if args.crc:
+            crc = (event.crc, zlib.crc32(event.type + data).to_bytes(CHUNK_CRC_SIZE, 'big'))
+        chunk = create_chunk(event.type, data, event.crc) if args.data else None
+        print_chunk(event.type, selected, event.offset, event.end - 1, len(data), chunk=chunk, crc=crc,
+                    format_raw=args.raw, print_length=args.length, hexa=args.hex)
+        selected += 1
+
+        if args.chunk is not None:
+            break
+
+
+def select_chunks(args: argparse.Namespace, index: list) -> list:
+    """
+    Get the indexes of the chunks to print from the (offset, length, type) index.
+    """
+    if args.chunk is not None:
+        if args.chunk >= len(index):
+            print_error_and_exit(f'Error: index {args.chunk} too big')
+        return [args.chunk]
+    if args.type is not None:
+        return [idx for idx, (_, _, type_) in enumerate(index) if type_ == args.type.encode()]
+    if args.text:
+        args.data = True
+        return [idx for idx, (_, _, type_) in enumerate(index) if is_text_chunk(type_)]
+    return list(range(len(index)))
+
+
+def print_file_chunks(png: PngParser, args: argparse.Namespace) -> None:
+    """
+    Print the chunks of a file selected by the command line arguments.
+    """
+    index = png.chunks_index
+    for number, idx in enumerate(select_chunks(args, index)):
+        _, length, type_ = index[idx]
+        spos, epos = png.chunks_pos[idx]
+        crc = None
+        if args.crc:
+            # verdicts come from the index cache when enabled
+            stored = stored_crc(png.reader, index[idx])
+            crc = (stored, stored if png.verify_crc(idx) else computed_crc(png.reader, index[idx]))
+        # payloads are only read to print them
+        chunk = png.get_by_index(idx) if args.data else None
+        print_chunk(type_, number, spos, epos, length, chunk=chunk, crc=crc,
+                    format_raw=args.raw, print_length=args.length, hexa=args.hex)
+
+
+def print_profile(png: PngParser, stats: Stats, output: Optional[str]) -> None:
+    """
+    Decode the image so every stage is measured, print the report and write it as JSON to `output`.
+    """
+    img = png.get_image_data()
+    if img is not None:
+        img.get_image_buffer()
+    stats.close()
+    print(stats.report(), file=sys.stderr)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(stats.to_json())
+
+
 def main() -> None:
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+        return
+
     show_banner()
     args = args_parser()
 
     filename = args.file
-    if not os.path.isfile(filename):
+    if filename != '-' and not os.path.isfile(filename):
         print_error_and_exit(f'Error: file not found {filename}')
-    show_meta(filename)
 
     if args.verbose:
         logging.basicConfig(level=logging.DEBUG)
     else:
         logging.basicConfig(level=logging.INFO)
 
-    with PngParser(filename) as png:
-        chunks: list
-        if args.chunk is not None:
-            chunks = [png.get_by_index(args.chunk)]
-        elif args.type is not None:
-            chunks = png.get_by_type(args.type.encode())
-        elif args.text:
-            args.data = True
-            chunks = png.get_text_chunks()
-        else:
-            chunks = png.get_all()
+    if filename == '-':
+        stream_main(args)
+        return
+    show_meta(filename)
 
-        for idx, chunk in enumerate(chunks):
-            spos, epos = png.get_pos(chunk)
-            print_chunk(chunk, idx, spos, epos, args.data,
-                        args.raw, args.crc, args.length, args.hex)
+    stats = None
+    if args.profile or args.profile_memory or args.profile_output:
+        stats = Stats(trace_memory=args.profile_memory)
+
+    index_cache = None
+    if args.index_cache is not None:
+        index_cache = IndexCache(args.index_cache or None)
+
+    # chunks are only read when printed when the index is cached
+    with PngParser(filename, lazy=index_cache is not None, stats=stats, index_cache=index_cache) as png:
+        print_file_chunks(png, args)
 
         if args.show:
             png.show_image()
 
         if args.output:
-            name = args.output
-            png.save_file(name)
+            png.save_file(args.output, fix_crc=True)
+
+        if stats is not None:
+            print_profile(png, stats, args.profile_output)
 
     # if args.show:
     #     flush_input()
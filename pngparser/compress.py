@@ -0,0 +1,107 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+DEFAULT_BLOCK_SIZE = 128 * 1024
+# deflate window, also the dictionary size given to each block
+WINDOW_SIZE = 32 * 1024
+
+_ADLER_BASE = 65521
+
+
+def adler32_combine(adler1: int, adler2: int, length2: int) -> int:
+    """
+    Compute the Adler-32 of two concatenated buffers from the checksum of each,
+    `length2` is the size of the second buffer. Port of zlib adler32_combine.
+    """
+    rem = length2 % _ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xffff) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= _ADLER_BASE << 1:
+        sum2 -= _ADLER_BASE << 1
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _zlib_header(level: int) -> bytes:
+    if level == zlib.Z_DEFAULT_COMPRESSION:
+        level = 6
+
+    if level < 2:
+        flevel = 0
+    elif level < 6:
+        flevel = 1
+    elif level == 6:
+        flevel = 2
+    else:
+        flevel = 3
+
+    cmf = 0x78  # deflate with 32K window
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+    return bytes((cmf, flg))
+
+
+def _compress_block(data: memoryview, start: int, end: int, level: int, last: bool) -> Tuple[bytes, int]:
+    zdict = data[max(0, start - WINDOW_SIZE):start]
+    if zdict:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    block = data[start:end]
+    out = compressor.compress(block)
+    # a full flush ends the block on a byte boundary so blocks can be concatenated
+    out += compressor.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+    return out, zlib.adler32(block)
+
+
+def parallel_compress(data: bytes, level: int = zlib.Z_DEFAULT_COMPRESSION,
+                      threads: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE) -> bytes:
+    """
+    Compress `data` to a single zlib stream using a pool of threads.
+
+    The data is split in blocks of `block_size` bytes compressed independently,
+    each block is primed with the 32K bytes preceding it to keep the ratio of
+    a single stream. zlib releases the GIL so blocks are compressed in parallel
+    on `threads` threads, one per core when None.
+    """
+    if block_size <= 0:
+        raise ValueError(f'block size must be positive not {block_size}')
+
+    if len(data) <= block_size or threads == 1:
+        return zlib.compress(data, level)
+
+    view = memoryview(data)
+    bounds = [(start, min(start + block_size, len(data)))
+              for start in range(0, len(data), block_size)]
+
+    # the executor default is not one thread per core
+    workers = min(len(bounds), threads or os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_compress_block, view, start, end, level, end == len(data))
+                   for start, end in bounds]
+        results = [f.result() for f in futures]
+
+    adler = 1
+    for (start, end), (_, block_adler) in zip(bounds, results):
+        adler = adler32_combine(adler, block_adler, end - start)
+
+    return b''.join([_zlib_header(level)] + [out for out, _ in results] + [adler.to_bytes(4, 'big')])
+
+
+def split_data(data: bytes, size: Optional[int] = None) -> List[bytes]:
+    """
+    Split compressed data in parts of at most `size` bytes, one part when no size.
+    """
+    if not size or len(data) <= size:
+        return [data]
+    return [data[i:i+size] for i in range(0, len(data), size)]
@@ -0,0 +1,153 @@
+import logging
+import os
+import zlib
+from typing import IO, Iterator, Optional
+
+from .chunktypes import CHUNK_CRC_SIZE, CHUNK_HEADER_SIZE, CHUNK_LENGTH_SIZE, TYPE_IEND
+from .png import PNG_MAGIC_NUMBER
+
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def _read_exact(stream: IO[bytes], size: int) -> bytes:
+    # raw streams and pipes may return less than asked before the end
+    data = stream.read(size)
+    if data is None:
+        data = b''
+    while len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+class ChunkEvent:
+    """
+    Chunk found by `iter_chunks`, its payload is only read on demand.
+
+    The payload is read before the iterator moves to the next chunk, the bytes
+    left unread and the CRC are skipped otherwise. `crc_ok` is None until the
+    payload has been read.
+    """
+
+    def __init__(self, stream: IO[bytes], type_: bytes, offset: int, length: int) -> None:
+        self.type = type_
+        self.offset = offset
+        self.length = length
+
+        self.crc: Optional[bytes] = None
+        self.crc_ok: Optional[bool] = None
+
+        self._stream = stream
+        self._consumed = False
+        # bytes of payload and CRC not read from the stream yet
+        self._remaining = length + CHUNK_CRC_SIZE
+
+    @property
+    def end(self) -> int:
+        """
+        Offset of the byte following the chunk.
+        """
+        return self.offset + CHUNK_HEADER_SIZE + self.length + CHUNK_CRC_SIZE
+
+    def _consume(self) -> None:
+        if self._consumed:
+            raise Exception(f'payload of chunk {self.type!r} already consumed')
+        self._consumed = True
+
+    def iter_payload(self, block_size: int = READ_BLOCK_SIZE) -> Iterator[bytes]:
+        """
+        Yield the payload by blocks of at most `block_size` bytes and check the CRC.
+        """
+        self._consume()
+        crc = zlib.crc32(self.type)
+        remaining = self.length
+        while remaining > 0:
+            block = _read_exact(self._stream, min(remaining, block_size))
+            if not block:
+                logging.error('chunk %s truncated', self.type)
+                self.crc_ok = False
+                return
+            remaining -= len(block)
+            self._remaining -= len(block)
+            crc = zlib.crc32(block, crc)
+            yield block
+
+        self.crc = _read_exact(self._stream, CHUNK_CRC_SIZE)
+        self._remaining -= len(self.crc)
+        self.crc_ok = self.crc == crc.to_bytes(CHUNK_CRC_SIZE, 'big')
+
+    def read(self) -> bytes:
+        """
+        Read the whole payload and check the CRC.
+        """
+        return b''.join(self.iter_payload())
+
+    def skip(self) -> None:
+        """
+        Skip the payload without reading it when the stream is seekable.
+        """
+        self._consume()
+        self.skip_remaining()
+
+    def skip_remaining(self) -> None:
+        """
+        Skip the bytes of the payload not read yet and the CRC.
+        """
+        size = self._remaining
+        self._remaining = 0
+        if size <= 0:
+            return
+        if self._stream.seekable():
+            self._stream.seek(size, os.SEEK_CUR)
+            return
+
+        while size > 0:
+            block = self._stream.read(min(size, READ_BLOCK_SIZE))
+            if not block:
+                break
+            size -= len(block)
+
+    @property
+    def consumed(self) -> bool:
+        return self._consumed
+
+    @property
+    def remaining(self) -> int:
+        """
+        Bytes of the payload and CRC still in the stream before the next chunk.
+        """
+        return self._remaining
+
+    def __repr__(self) -> str:
+        return f'ChunkEvent({self.type!r}, offset={self.offset}, length={self.length})'
+
+
+def iter_chunks(stream: IO[bytes]) -> Iterator[ChunkEvent]:
+    """
+    Yield one event per chunk of a PNG stream, until IEND or the end of the stream.
+
+    Nothing is buffered: the stream is only read forward, chunks can be skipped
+    and the iteration stopped at any time. Works on pipes and standard input.
+    """
+    if _read_exact(stream, len(PNG_MAGIC_NUMBER)) != PNG_MAGIC_NUMBER:
+        raise Exception('stream is not a PNG !')
+
+    offset = len(PNG_MAGIC_NUMBER)
+    while True:
+        header = _read_exact(stream, CHUNK_HEADER_SIZE)
+        if len(header) < CHUNK_HEADER_SIZE:
+            if header:
+                logging.error('truncated chunk header at %d', offset)
+            return
+
+        length = int.from_bytes(header[:CHUNK_LENGTH_SIZE], 'big')
+        event = ChunkEvent(stream, header[CHUNK_LENGTH_SIZE:], offset, length)
+        yield event
+
+        # payload not read or read partly
+        event.skip_remaining()
+        if event.type == TYPE_IEND:
+            return
+        offset = event.end
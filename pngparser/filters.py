@@ -0,0 +1,326 @@
+import logging
+import zlib
+from typing import Iterator, List, Optional, Tuple
+
+from .chunks import ChunkIHDR
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+FILTER_NONE = 0
+FILTER_SUB = 1
+FILTER_UP = 2
+FILTER_AVERAGE = 3
+FILTER_PAETH = 4
+
+HAS_NUMPY = np is not None
+
+
+def _pad_previous(raw: bytes, previous: Optional[bytes]) -> bytes:
+    # the previous row as long as `raw`, zeros on the first row of the image or pass
+    if not previous:
+        return bytes(len(raw))
+    if len(previous) < len(raw):
+        return bytes(previous) + bytes(len(raw) - len(previous))
+    return previous
+
+
+def _undo_average_row(raw, previous, fu: int) -> bytearray:
+    result = bytearray(raw)
+    end = len(result)
+    for i in range(min(fu, end)):
+        result[i] = (raw[i] + (previous[i] >> 1)) & 0xff
+    for i in range(fu, end):
+        result[i] = (raw[i] + ((result[i - fu] + previous[i]) >> 1)) & 0xff
+    return result
+
+
+def _undo_paeth_row(raw, previous, fu: int) -> bytearray:
+    result = bytearray(raw)
+    end = len(result)
+    # on the first pixel a = c = 0 so the predictor is always b
+    for i in range(min(fu, end)):
+        result[i] = (raw[i] + previous[i]) & 0xff
+    for i in range(fu, end):
+        a = result[i - fu]
+        b = previous[i]
+        c = previous[i - fu]
+        pa = b - c
+        pb = a - c
+        pc = pa + pb
+        if pa < 0:
+            pa = -pa
+        if pb < 0:
+            pb = -pb
+        if pc < 0:
+            pc = -pc
+        if pa <= pb and pa <= pc:
+            pr = a
+        elif pb <= pc:
+            pr = b
+        else:
+            pr = c
+        result[i] = (raw[i] + pr) & 0xff
+    return result
+
+
+def _split_rows(data: bytes, row_size: int) -> Iterator[Tuple[int, bytes]]:
+    cursor = 0
+    while cursor < len(data):
+        filter_type = data[cursor]
+        cursor += 1
+        yield filter_type, data[cursor:cursor+row_size]
+        cursor += row_size
+
+
+def unfilter_row(filter_type: int, raw: bytes, previous: Optional[bytes], fu: int) -> bytearray:
+    """
+    Undo the filter of a single scanline.
+
+    `previous` is the reconstructed previous row or None on the first row of the image or pass.
+    """
+    previous = _pad_previous(raw, previous)
+
+    if filter_type == FILTER_AVERAGE:
+        return _undo_average_row(raw, previous, fu)
+    if filter_type == FILTER_PAETH:
+        return _undo_paeth_row(raw, previous, fu)
+
+    if HAS_NUMPY and filter_type in (FILTER_SUB, FILTER_UP) and len(raw) % fu == 0:
+        x = np.frombuffer(raw, dtype=np.uint8)
+        if filter_type == FILTER_SUB:
+            return bytearray(np.cumsum(x.reshape((-1, fu)), axis=0, dtype=np.uint8).data)
+        return bytearray((x + np.frombuffer(previous, dtype=np.uint8)[:len(x)]).data)
+
+    result = bytearray(raw)
+    if filter_type == FILTER_SUB:
+        for i in range(fu, len(result)):
+            result[i] = (result[i] + result[i - fu]) & 0xff
+    elif filter_type == FILTER_UP:
+        result = bytearray((x + b) & 0xff for x, b in zip(raw, previous))
+    return result
+
+
+def _unfilter_python(data: bytes, row_size: int, fu: int) -> List[Tuple[int, bytearray]]:
+    rows = []
+    recon = None
+    for filter_type, raw in _split_rows(data, row_size):
+        recon = unfilter_row(filter_type, raw, recon, fu)
+        rows.append((filter_type, recon))
+    return rows
+
+
+def _unfilter_numpy(data: bytes, row_size: int, fu: int) -> Tuple[List[int], bytearray]:
+    stride = row_size + 1
+    count = -(-len(data) // stride)
+    if not count:
+        return [], bytearray()
+
+    # pad the last row: filters only look left and up so the padding
+    # never changes reconstructed bytes and is sliced away at the end
+    padded_width = max(fu, -(-row_size // fu) * fu)
+    buf = np.zeros((count, stride), dtype=np.uint8)
+    buf.reshape(-1)[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    filters = buf[:, 0]
+    raw = np.zeros((count, padded_width), dtype=np.uint8)
+    raw[:, :row_size] = buf[:, 1:]
+    out = np.empty_like(raw)
+
+    previous = np.zeros(padded_width, dtype=np.uint8)
+    # split the image in runs of rows sharing the same filter, None, Sub and Up
+    # runs are reconstructed at once, Average and Paeth row by row
+    boundaries = np.flatnonzero(np.diff(filters)) + 1
+    starts = [0] + boundaries.tolist()
+    ends = boundaries.tolist() + [count]
+    for start, end in zip(starts, ends):
+        filter_type = int(filters[start])
+        block = raw[start:end]
+
+        if filter_type == FILTER_SUB:
+            pixels = block.reshape(end - start, -1, fu)
+            np.cumsum(pixels, axis=1, dtype=np.uint8,
+                      out=out[start:end].reshape(pixels.shape))
+        elif filter_type == FILTER_UP:
+            np.cumsum(block, axis=0, dtype=np.uint8, out=out[start:end])
+            out[start:end] += previous
+        elif filter_type in (FILTER_AVERAGE, FILTER_PAETH):
+            undo_row = _undo_average_row if filter_type == FILTER_AVERAGE else _undo_paeth_row
+            prev_row = previous.tobytes()
+            for y in range(start, end):
+                recon = undo_row(raw[y].tobytes(), prev_row, fu)
+                out[y] = np.frombuffer(recon, dtype=np.uint8)
+                prev_row = recon
+        else:
+            out[start:end] = block
+
+        previous = out[end - 1]
+
+    # single copy of the rows without their padding, cut after the last byte of data
+    image = bytearray(count * row_size)
+    np.frombuffer(image, dtype=np.uint8).reshape((count, row_size))[:] = out[:, :row_size]
+    del image[len(data) - count:]
+    return filters.tolist(), image
+
+
+def unfilter_scanlines(header: ChunkIHDR, data: bytes, row_size: int) -> List[Tuple[int, bytearray]]:
+    """
+    Undo the filters of a block of consecutive scanlines.
+
+    `data` holds rows of `row_size` bytes each prefixed by its filter type,
+    the last row may be truncated. Return the list of (filter, reconstructed row).
+    Use NumPy when available, the pure Python loops otherwise.
+    """
+    fu = header.filter_unit
+    if HAS_NUMPY:
+        filters, image = _unfilter_numpy(data, row_size, fu)
+        return [(f, image[y * row_size:(y + 1) * row_size]) for y, f in enumerate(filters)]
+    logging.debug('numpy unavailable, unfilter with pure python')
+    return _unfilter_python(data, row_size, fu)
+
+
+def unfilter_image(header: ChunkIHDR, data: bytes, row_size: int) -> Tuple[List[int], bytearray]:
+    """
+    Undo the filters of a block of consecutive scanlines into one contiguous buffer.
+
+    Same input as `unfilter_scanlines`. Return the filter of each row and the
+    reconstructed rows back to back, the last one may be truncated.
+    """
+    fu = header.filter_unit
+    if HAS_NUMPY:
+        return _unfilter_numpy(data, row_size, fu)
+    logging.debug('numpy unavailable, unfilter with pure python')
+    rows = _unfilter_python(data, row_size, fu)
+    return [f for f, _ in rows], bytearray().join(recon for _, recon in rows)
+
+
+def _filter_row(filter_type: int, raw, previous, fu: int) -> bytearray:
+    result = bytearray(raw)
+    for i, x in enumerate(raw):
+        a = raw[i - fu] if i >= fu else 0
+        b = previous[i]
+        c = previous[i - fu] if i >= fu else 0
+
+        if filter_type == FILTER_SUB:
+            pr = a
+        elif filter_type == FILTER_UP:
+            pr = b
+        elif filter_type == FILTER_AVERAGE:
+            pr = (a + b) >> 1
+        elif filter_type == FILTER_PAETH:
+            pa = abs(b - c)
+            pb = abs(a - c)
+            pc = abs(a + b - 2 * c)
+            if pa <= pb and pa <= pc:
+                pr = a
+            elif pb <= pc:
+                pr = b
+            else:
+                pr = c
+        else:
+            pr = 0
+        result[i] = (x - pr) & 0xff
+    return result
+
+
+def _candidates_python(raw: bytes, previous: bytes, fu: int) -> List[bytes]:
+    return [bytes(_filter_row(f, raw, previous, fu)) for f in range(FILTER_PAETH + 1)]
+
+
+def _candidates_numpy(raw: bytes, previous: bytes, fu: int) -> List[bytes]:
+    x = np.frombuffer(raw, dtype=np.uint8).astype(np.int16)
+    b = np.frombuffer(previous, dtype=np.uint8)[:len(x)].astype(np.int16)
+    a = np.zeros_like(x)
+    a[fu:] = x[:-fu]
+    c = np.zeros_like(x)
+    c[fu:] = b[:-fu]
+
+    pa = np.abs(b - c)
+    pb = np.abs(a - c)
+    pc = np.abs(a + b - 2 * c)
+    paeth = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+    predictors = np.stack((np.zeros_like(x), a, b, (a + b) >> 1, paeth))
+    candidates = ((x - predictors) & 0xff).astype(np.uint8)
+    return [row.tobytes() for row in candidates]
+
+
+def filter_candidates(raw: bytes, previous: Optional[bytes], fu: int) -> List[bytes]:
+    """
+    Apply the five filter types to a scanline, the result is indexed by filter type.
+    """
+    previous = _pad_previous(raw, previous)
+
+    if HAS_NUMPY and len(raw) > fu:
+        return _candidates_numpy(raw, previous, fu)
+    return _candidates_python(raw, previous, fu)
+
+
+def filter_row(filter_type: int, raw: bytes, previous: Optional[bytes], fu: int) -> bytearray:
+    """
+    Apply a filter to a single scanline, the inverse of `unfilter_row`.
+
+    Unknown filter types leave the scanline unchanged.
+    """
+    if filter_type not in (FILTER_SUB, FILTER_UP, FILTER_AVERAGE, FILTER_PAETH):
+        return bytearray(raw)
+    previous = _pad_previous(raw, previous)
+
+    if HAS_NUMPY and len(raw) > fu:
+        return bytearray(_candidates_numpy(raw, previous, fu)[filter_type])
+    return _filter_row(filter_type, raw, previous, fu)
+
+
+def _sum_abs(row: bytes) -> int:
+    if HAS_NUMPY:
+        signed = np.frombuffer(row, dtype=np.int8).astype(np.int32)
+        return int(np.abs(signed).sum())
+    return sum(x if x < 128 else 256 - x for x in row)
+
+
+class FilterChooser:
+    """
+    Select the filter of each scanline when encoding.
+
+    Strategies:
+    - 'minsum' pick the filter with the minimum sum of absolute differences,
+      the heuristic recommended by the PNG specification
+    - 'deflate' compress every candidate and keep the smallest output
+    """
+
+    STRATEGIES = ('minsum', 'deflate')
+
+    def __init__(self, strategy: str, fu: int, level: int = zlib.Z_DEFAULT_COMPRESSION) -> None:
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown filter strategy {strategy!r}, must be one of {self.STRATEGIES}')
+        self.strategy = strategy
+        self.fu = fu
+        self._compressor = zlib.compressobj(level) if strategy == 'deflate' else None
+
+    def _deflate_size(self, row: bytes) -> int:
+        compressor = self._compressor.copy()
+        return len(compressor.compress(row)) + len(compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def choose(self, raw: bytes, previous: Optional[bytes]) -> Tuple[int, bytes]:
+        """
+        Return the selected filter type and the filtered scanline, without filter byte.
+        """
+        candidates = filter_candidates(raw, previous, self.fu)
+
+        if self._compressor is None:
+            scores = [_sum_abs(row) for row in candidates]
+        else:
+            scores = [self._deflate_size(bytes([f]) + row) for f, row in enumerate(candidates)]
+
+        filter_type = scores.index(min(scores))
+        row = candidates[filter_type]
+        self.update(filter_type, row)
+        return filter_type, row
+
+    def update(self, filter_type: int, row: bytes) -> None:
+        """
+        Account for a scanline stored with a filter chosen by the caller.
+        """
+        if self._compressor is not None:
+            self._compressor.compress(bytes([filter_type]) + row)
@@ -1,38 +1,95 @@
+from typing import Sequence, Tuple
+
 from PIL import Image as PilImage
 
 from .pixel import Pixel
+from .utils import pixel_type_to_length
+from .chunks.ihdr import COLOR_TYPE_PALETTE
 
 
 class Image:
+    """
+    8 bits image stored in one buffer of `height` rows of `width` pixels,
+    each pixel is `channels` consecutive bytes.
+    """
+
     def __init__(self, pixel_type, width, height) -> None:
         self.width = width
         self.height = height
         self.pixel_type = pixel_type
 
-        self.data = [Pixel(pixel_type)] * (width * height)
+        # palette pixels are stored as their RGB color
+        self.channels = 3 if pixel_type == COLOR_TYPE_PALETTE else pixel_type_to_length(pixel_type)
+        self.data = bytearray(width * height * self.channels)
 
-    def putpixel(self, position, pixel: Pixel):
-        # if not isinstance(pixel, Pixel):
-        #     raise Exception('Must be type Pixel')
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.height, self.width, self.channels
 
+    def _offset(self, position) -> int:
         x, y = position
-        if x < 0 or x > self.width:
+        if x < 0 or x >= self.width:
             raise IndexError('x outside image')
-        if y < 0 or y > self.height:
+        if y < 0 or y >= self.height:
             raise IndexError('y outside image')
 
-        pos = x + y * self.width
-        self.data[pos] = pixel
+        return (x + y * self.width) * self.channels
 
-    def getpixel(self, position):
-        x, y = position
-        if x < 0 or x > self.width:
-            raise IndexError('x outside image')
-        if y < 0 or y > self.height:
-            raise IndexError('y outside image')
+    def putpixel(self, position, pixel):
+        """
+        Set a pixel from a Pixel or a sequence of channel values.
+        """
+        if isinstance(pixel, Pixel):
+            pixel = pixel.values
+        # a slice assignment of another size would shift every next pixel
+        if len(pixel) != self.channels:
+            raise ValueError(f'pixel must have {self.channels} channels not {len(pixel)}')
+
+        pos = self._offset(position)
+        self.data[pos:pos + self.channels] = bytes(pixel)
+
+    def getpixel(self, position) -> Tuple[int, ...]:
+        pos = self._offset(position)
+        return tuple(self.data[pos:pos + self.channels])
+
+    def get_pixel_object(self, position) -> Pixel:
+        return Pixel(self.pixel_type, self.getpixel(position))
+
+    def _check_region(self, box) -> Tuple[int, int, int, int]:
+        x, y, width, height = box
+        if min(x, y, width, height) < 0 or x + width > self.width or y + height > self.height:
+            raise IndexError(f'region {box} outside image')
+        return x, y, width, height
+
+    def get_region(self, box) -> bytearray:
+        """
+        Get the pixels of the (x, y, width, height) region, rows are concatenated.
+        """
+        x, y, width, height = self._check_region(box)
+        stride = self.width * self.channels
+        row_size = width * self.channels
+
+        region = bytearray(row_size * height)
+        view = memoryview(self.data)
+        for row in range(height):
+            start = (y + row) * stride + x * self.channels
+            region[row * row_size:(row + 1) * row_size] = view[start:start + row_size]
+        return region
+
+    def set_region(self, box, data: Sequence[int]) -> None:
+        """
+        Set the pixels of the (x, y, width, height) region from concatenated rows.
+        """
+        x, y, width, height = self._check_region(box)
+        stride = self.width * self.channels
+        row_size = width * self.channels
+        if len(data) != row_size * height:
+            raise ValueError(f'region data must be {row_size * height} bytes not {len(data)}')
 
-        pos = x + y * self.width
-        return self.data[pos]
+        view = memoryview(bytes(data))
+        for row in range(height):
+            start = (y + row) * stride + x * self.channels
+            self.data[start:start + row_size] = view[row * row_size:(row + 1) * row_size]
 
     def show(self) -> None:
         pil_pixel_type = 'RGB'
@@ -45,6 +102,5 @@ class Image:
         elif self.pixel_type == 6:  # RGB + Alpha
             pil_pixel_type = 'RGBA'  # 4
 
-        pil_img = PilImage.new(pil_pixel_type, (self.width, self.height))
-        pil_img.putdata(list(map(lambda x: x.values, self.data)))
+        pil_img = PilImage.frombytes(pil_pixel_type, (self.width, self.height), bytes(self.data))
         pil_img.show()
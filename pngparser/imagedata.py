@@ -1,12 +1,28 @@
 import logging
 import math
-from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union
+import struct
+import zlib
+from itertools import islice
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from .chunks import ChunkIHDR
+from .filters import FilterChooser, filter_row, unfilter_image, unfilter_row
 # from .image import Image
 # from .pixel import Pixel
-from .utils import BitArray
+from .palette import expand_indices, inverse_palette, palette_colors, palette_table
+from .stats import Stats, measure
+from .samples import pack_rows, pack_samples, scale_to_8bit, unpack_rows, unpack_samples
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# rows between two saved decoder states for random row access
+DEFAULT_CHECKPOINT_INTERVAL = 256
+# compressed bytes given to the inflater at once, its unconsumed tail is copied for each row
+INFLATE_BLOCK_SIZE = 64 * 1024
 
 _adam7 = ((0, 0, 8, 8),
           (4, 0, 8, 8),
@@ -17,136 +33,12 @@ _adam7 = ((0, 0, 8, 8),
           (0, 1, 1, 2))
 
 
-def apply_filter(header: ChunkIHDR, filter_type: int, scanline: bytes, previous: Optional[bytes] = None) -> bytes:
-    result = bytearray(scanline)
-
-    if filter_type == 0:
-        return result
-
-    fu = max(1, header.pixel_len)
-
-    if not previous:
-        if filter_type == 2:  # up
-            return result
-        if filter_type == 3:  # average
-            previous = [0]*len(scanline)
-        elif filter_type == 4:  # "paeth"
-            filter_type = 1
-
-    elif len(previous) < len(scanline):
-        previous += b'\x00' * (len(scanline) - len(previous))
-
-    if filter_type == 1:  # sub
-        ai = -fu
-        for i, x in enumerate(scanline):
-            if ai >= 0:
-                x = (x - scanline[ai]) & 0xff
-            result[i] = x
-            ai += 1
-
-    elif filter_type == 2:  # up
-        for i, x in enumerate(scanline):
-            x = (x - previous[i]) & 0xff
-            result[i] = x
-
-    elif filter_type == 3:  # average
-        ai = -fu
-        for i, x in enumerate(scanline):
-            if ai >= 0:
-                x = (x - ((scanline[ai] + previous[i]) >> 1)) & 0xff
-            else:
-                x = (x - (previous[i] >> 1)) & 0xff
-            result[i] = x
-            ai += 1
-
-    elif filter_type == 4:  # paeth
-        # http://www.w3.org/TR/PNG/#9Filter-type-4-Paeth
-        ai = -fu  # also used for ci
-        for i, x in enumerate(scanline):
-            a = 0
-            b = previous[i]
-            c = 0
-
-            if ai >= 0:
-                a = scanline[ai]
-                c = previous[ai]
-            p = a + b - c
-            pa = abs(p - a)
-            pb = abs(p - b)
-            pc = abs(p - c)
-            if pa <= pb and pa <= pc:
-                pr = a
-            elif pb <= pc:
-                pr = b
-            else:
-                pr = c
-
-            x = (x - pr) & 0xff
-            result[i] = x
-            ai += 1
-    return result
+def apply_filter(header: ChunkIHDR, filter_type: int, scanline: bytes, previous: Optional[bytes] = None) -> bytearray:
+    return filter_row(filter_type, scanline, previous, header.filter_unit)
 
 
 def undo_filter(header: ChunkIHDR, filter_type: int, scanline: bytes, previous: Optional[bytes] = None) -> bytearray:
-    result = bytearray(scanline)
-
-    if filter_type == 0:
-        return result
-
-    fu = max(1, header.pixel_len)
-
-    if not previous:
-        previous = [0]*len(scanline)
-
-    if filter_type == 1:  # sub
-        ai = 0
-        for i in range(fu, len(result)):
-            x = scanline[i]
-            a = result[ai]
-            result[i] = (x + a) & 0xff
-            ai += 1
-
-    elif filter_type == 2:  # up
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            b = previous[i]
-            result[i] = (x + b) & 0xff
-
-    elif filter_type == 3:  # average
-        ai = -fu
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            if ai < 0:
-                a = 0
-            else:
-                a = result[ai]
-            b = previous[i]
-            result[i] = (x + ((a + b) >> 1)) & 0xff
-            ai += 1
-
-    elif filter_type == 4:  # paeth
-        ai = -fu
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            if ai < 0:
-                a = c = 0
-            else:
-                a = result[ai]
-                c = previous[ai]
-            b = previous[i]
-            p = a + b - c
-            pa = abs(p - a)
-            pb = abs(p - b)
-            pc = abs(p - c)
-            if pa <= pb and pa <= pc:
-                pr = a
-            elif pb <= pc:
-                pr = b
-            else:
-                pr = c
-            result[i] = (x + pr) & 0xff
-            ai += 1
-    return result
+    return unfilter_row(filter_type, scanline, previous, header.filter_unit)
 
     # def _setpixelfilter(self, x, y, image):
     #     leftPixel = self._getpixelSafe(image, x - 1, y)
@@ -175,6 +67,7 @@ def deinterlace(header: ChunkIHDR, raw):
     """
     Read raw pixel data, undo filters, deinterlace, and flatten.
     Return in flat row flat pixel format.
+    The data of each scanline is a memoryview into the reconstructed rows of its pass.
     """
 
     source_offset = 0
@@ -183,70 +76,455 @@ def deinterlace(header: ChunkIHDR, raw):
         if xstart >= header.width:
             continue
 
-        recon = None
         # Pixels per row (reduced pass image)
         ppr = int(math.ceil((header.width-xstart)/float(xstep)))
 
         # Row size in bytes for this pass.
-        row_size = int(math.ceil(header.pixel_len * ppr))
+        row_size = header.row_length(ppr)
+        rows_count = len(range(ystart, header.height, ystep))
 
-        for _ in range(ystart, header.height, ystep):
-            try:
-                filter_type = raw[source_offset]
-            except IndexError:
-                logging.error('missing scanlines for interlaced image')
-                return
+        pass_size = rows_count * (row_size + 1)
+        pass_data = raw[source_offset:source_offset+pass_size]
+        source_offset += pass_size
 
-            source_offset += 1
-            scanline = raw[source_offset:source_offset+row_size]
-            source_offset += row_size
-            recon = undo_filter(header, filter_type, scanline, recon)
-            # Convert so that there is one element per pixel value
+        filters, image = unfilter_image(header, pass_data, row_size)
+        view = memoryview(image)
+        for y, filter_type in enumerate(filters):
+            yield Scanline(filter_type, view[y * row_size:(y + 1) * row_size])
 
-            yield Scanline(filter_type, recon)
+        if len(filters) < rows_count:
+            logging.error('missing scanlines for interlaced image')
+            return
 
 
 @dataclass
 class Scanline:
     filter: int
-    data: bytes
+    # memoryview into the image buffer for the scanlines loaded by ImageData
+    data: Union[bytes, bytearray, memoryview]
+    # keep this filter when encoding with a filter strategy, set when filter is assigned
+    keep_filter: bool = field(default=False, compare=False)
+
+    def __setattr__(self, name, value) -> None:
+        if name == 'filter' and 'filter' in self.__dict__:
+            super().__setattr__('keep_filter', True)
+        super().__setattr__(name, value)
+
+
+def scanline_sizes(header: ChunkIHDR) -> Iterator[Tuple[int, bool]]:
+    """
+    Yield the size of each scanline in stream order, without filter byte,
+    and whether the scanline starts a new (reduced pass) image.
+    """
+    if header.interlace_method != 1:
+        row_size = header.row_length()
+        for y in range(header.height):
+            yield row_size, y == 0
+        return
+
+    for xstart, ystart, xstep, ystep in _adam7:
+        if xstart >= header.width:
+            continue
+
+        ppr = int(math.ceil((header.width-xstart)/float(xstep)))
+        row_size = header.row_length(ppr)
+        for y in range(ystart, header.height, ystep):
+            yield row_size, y == ystart
+
+
+class ScanlineDecoder:
+    """
+    Push decoder of compressed image data, each scanline is returned as soon
+    as the data needed to reconstruct it has been fed.
+
+    Only the current row, the previous row and the zlib window are kept in memory.
+    """
+
+    def __init__(self, header: ChunkIHDR) -> None:
+        self.inflater = zlib.decompressobj()
+        self._sizes = scanline_sizes(header)
+        self._row_size, self._new_image = next(self._sizes, (None, True))
+        self._fu = header.filter_unit
+
+        self._buffer = bytearray()
+        self._recon: Optional[bytearray] = None
+
+    @property
+    def done(self) -> bool:
+        """
+        Every scanline of the image has been decoded.
+        """
+        return self._row_size is None
+
+    def feed(self, data: bytes) -> Iterator[Scanline]:
+        """
+        Inflate the next compressed bytes and yield the completed scanlines.
+
+        Large chunks are inflated by blocks of INFLATE_BLOCK_SIZE bytes.
+        """
+        view = memoryview(data)
+        start = 0
+        while True:
+            yield from self._inflate(view[start:start + INFLATE_BLOCK_SIZE])
+            start += INFLATE_BLOCK_SIZE
+            if start >= len(view) or self._row_size is None:
+                return
+
+    def _inflate(self, pending) -> Iterator[Scanline]:
+        buffer = self._buffer
+        while self._row_size is not None:
+            out = self.inflater.decompress(pending, self._row_size + 1 - len(buffer))
+            pending = self.inflater.unconsumed_tail
+            if not out and not pending:
+                return
+            buffer.extend(out)
+
+            if len(buffer) == self._row_size + 1:
+                yield self._unfilter()
+                self._row_size, self._new_image = next(self._sizes, (None, True))
+
+    def finish(self) -> Iterator[Scanline]:
+        """
+        Flush the inflater once all the data has been fed, a truncated last row is padded.
+        """
+        if self._row_size is not None:
+            yield from self.feed(b'')
+
+        if self._buffer:
+            yield self._unfilter()
+
+        if self._row_size is not None:
+            logging.error('missing scanlines in image data')
+
+    def _unfilter(self) -> Scanline:
+        filter_type = self._buffer[0]
+        self._recon = unfilter_row(filter_type, self._buffer[1:],
+                                   None if self._new_image else self._recon, self._fu)
+        self._buffer.clear()
+        return Scanline(filter_type, self._recon)
+
+
+def stream_scanlines(header: ChunkIHDR, chunks: Iterable[bytes]) -> Iterator[Scanline]:
+    """
+    Inflate compressed image data chunk by chunk and yield each scanline
+    as soon as it is reconstructed.
+    """
+    decoder = ScanlineDecoder(header)
+    for data in chunks:
+        yield from decoder.feed(data)
+        if decoder.done:
+            break
+
+    yield from decoder.finish()
+
+
+def _pad(data: bytes, size: int) -> bytes:
+    if len(data) >= size:
+        return data[:size]
+    return bytes(data) + bytes(size - len(data))
+
+
+def _adam7_passes(header: ChunkIHDR, scanlines: List[Scanline]):
+    # yield (xstart, ystart, xstep, ystep, pixels per row, rows) of each pass
+    cursor = 0
+    for xstart, ystart, xstep, ystep in _adam7:
+        if xstart >= header.width:
+            continue
+        ppr = int(math.ceil((header.width-xstart)/float(xstep)))
+        rows_count = len(range(ystart, header.height, ystep))
+        rows = [sc.data for sc in scanlines[cursor:cursor+rows_count]]
+        cursor += rows_count
+        yield xstart, ystart, xstep, ystep, ppr, rows
+
+
+def _scatter_numpy(header: ChunkIHDR, scanlines: List[Scanline]) -> bytearray:
+    height, width = header.height, header.width
+    depth = header.bit_depth
+
+    if header.bits_per_pixel >= 8:
+        bpp = header.bits_per_pixel // 8
+        image = np.zeros((height, width, bpp), dtype=np.uint8)
+        for xstart, ystart, xstep, ystep, ppr, rows in _adam7_passes(header, scanlines):
+            if not rows:
+                continue
+            row_size = ppr * bpp
+            block = np.frombuffer(b''.join(_pad(r, row_size) for r in rows), dtype=np.uint8)
+            image[ystart::ystep, xstart::xstep][:len(rows)] = block.reshape(len(rows), ppr, bpp)
+        return bytearray(image.data)
+
+    image = np.zeros((height, width), dtype=np.uint8)
+    for xstart, ystart, xstep, ystep, ppr, rows in _adam7_passes(header, scanlines):
+        if not rows:
+            continue
+        row_size = header.row_length(ppr)
+        block = np.frombuffer(b''.join(_pad(r, row_size) for r in rows), dtype=np.uint8)
+        values = unpack_rows(block.reshape(len(rows), row_size), depth)[:, :ppr]
+        image[ystart::ystep, xstart::xstep][:len(rows)] = values
+    return bytearray(pack_rows(image, depth, header.row_length()).data)
+
+
+def _scatter_python(header: ChunkIHDR, scanlines: List[Scanline]) -> bytearray:
+    stride = header.row_length()
+    image = bytearray(stride * header.height)
+
+    if header.bits_per_pixel >= 8:
+        bpp = header.bits_per_pixel // 8
+        for xstart, ystart, xstep, ystep, ppr, rows in _adam7_passes(header, scanlines):
+            for y, row in zip(range(ystart, header.height, ystep), rows):
+                row = _pad(row, ppr * bpp)
+                base = y * stride
+                for c in range(bpp):
+                    image[base + xstart * bpp + c:base + stride:xstep * bpp] = row[c::bpp]
+        return image
+
+    depth = header.bit_depth
+    per_byte = 8 // depth
+    for xstart, ystart, xstep, ystep, ppr, rows in _adam7_passes(header, scanlines):
+        for y, row in zip(range(ystart, header.height, ystep), rows):
+            values = unpack_samples(_pad(row, header.row_length(ppr)), depth)
+            base = y * stride
+            for i in range(ppr):
+                value = values[i]
+                x = xstart + i * xstep
+                image[base + x // per_byte] |= value << (8 - depth * (x % per_byte + 1))
+    return image
+
+
+def adam7_scatter(header: ChunkIHDR, scanlines: List[Scanline]) -> bytearray:
+    """
+    Scatter the reduced images of an interlaced image to their place in the full image.
+
+    Return `height` rows of `header.row_length()` bytes, missing rows are left blank.
+    """
+    if np is not None:
+        return _scatter_numpy(header, scanlines)
+    return _scatter_python(header, scanlines)
+
+
+def reduced_images(header: ChunkIHDR) -> Iterator[Tuple[int, int, int, int, int, int]]:
+    """
+    Yield (xstart, ystart, xstep, ystep, pixels per row, rows) of each reduced
+    image in stream order, the whole image when not interlaced.
+    """
+    if header.interlace_method != 1:
+        yield 0, 0, 1, 1, header.width, header.height
+        return
+
+    for xstart, ystart, xstep, ystep in _adam7:
+        if xstart >= header.width:
+            continue
+        ppr = int(math.ceil((header.width-xstart)/float(xstep)))
+        yield xstart, ystart, xstep, ystep, ppr, len(range(ystart, header.height, ystep))
+
+
+def raw_size(header: ChunkIHDR) -> int:
+    """
+    Get the size of the inflated image data declared by the header, filter bytes included.
+    """
+    return sum(count * (header.row_length(ppr) + 1) for _, _, _, _, ppr, count in reduced_images(header))
+
+
+def pack_unpacked_rows(buffer: bytearray, width: int, height: int, depth: int) -> bytearray:
+    """
+    Pack `height` rows of `width` sub-byte samples stored one by byte.
+    """
+    view = memoryview(buffer)
+    return bytearray(b''.join(pack_samples(view[r * width:(r + 1) * width], depth) for r in range(height)))
+
+
+def unfilter_stream(header: ChunkIHDR, data: bytes) -> Iterator[Scanline]:
+    """
+    Unfilter inflated image data one scanline at a time in stream order.
+    """
+    fu = header.filter_unit
+    offset = 0
+    recon = None
+    for row_size, new_image in scanline_sizes(header):
+        raw = data[offset:offset + row_size + 1]
+        offset += row_size + 1
+        if not raw:
+            logging.error('missing scanlines in image data')
+            return
+        recon = unfilter_row(raw[0], raw[1:], None if new_image else recon, fu)
+        yield Scanline(raw[0], recon)
+
+
+def preview_header(header: ChunkIHDR, factor: int) -> ChunkIHDR:
+    """
+    Get the header of the image reduced by `factor`, not interlaced.
+    """
+    if factor < 1:
+        raise ValueError(f'Preview factor must be positive not {factor}')
+    data = struct.pack('>IIBBBBB', -(-header.width // factor), -(-header.height // factor),
+                       header.bit_depth, header.color_type,
+                       header.compression_method, header.filter_method, 0)
+    return ChunkIHDR(header.type, data, zlib.crc32(header.type + data).to_bytes(4, 'big'))
+
+
+def _kept(start: int, step: int, count: int, factor: int) -> Tuple[int, int]:
+    # first index and index step of the positions `start + i * step` multiple of `factor`
+    for first in range(min(factor, count)):
+        if (start + first * step) % factor == 0:
+            return first, factor // math.gcd(step, factor)
+    return count, 1
+
+
+def subsample_scanlines(header: ChunkIHDR, scanlines: Iterable[Scanline], factor: int) -> bytearray:
+    """
+    Keep the pixels of every `factor` row and column from scanlines in stream order.
+
+    Scanlines are consumed up to the last one holding a kept pixel, for interlaced
+    images with a factor of 8, 4 or 2 it is the end of the pass 1, 3 or 5.
+    Return the rows of the reduced image without filter byte.
+    """
+    reduced = preview_header(header, factor)
+    width, height = reduced.width, reduced.height
+    depth = header.bit_depth
+    sub_byte = header.bits_per_pixel < 8
+    # bytes of a pixel in the buffer, sub-byte samples are unpacked to one byte
+    unit = 1 if sub_byte else header.bits_per_pixel // 8
+    stride = width * unit
+    image = bytearray(stride * height)
+
+    plan: List[Tuple[int, ...]] = []
+    needed = 0
+    decoded = 0
+    for xstart, ystart, xstep, ystep, ppr, count in reduced_images(header):
+        i0, di = _kept(ystart, ystep, count, factor)
+        j0, dj = _kept(xstart, xstep, ppr, factor)
+        if j0 >= ppr:
+            i0 = count
+        if i0 < count:
+            needed = decoded + i0 + (count - 1 - i0) // di * di + 1
+        plan.append((xstart, ystart, xstep, ystep, ppr, count, i0, di, j0, dj))
+        decoded += count
+
+    scanlines = islice(scanlines, needed)
+    for xstart, ystart, xstep, ystep, ppr, count, i0, di, j0, dj in plan:
+        for i, scanline in zip(range(count), scanlines):  # pylint: disable=looping-through-iterator
+            if i < i0 or (i - i0) % di:
+                continue
+
+            if sub_byte:
+                row = bytes(unpack_samples(_pad(scanline.data, header.row_length(ppr)), depth))[:ppr]
+            else:
+                row = _pad(scanline.data, ppr * unit)
+
+            # kept pixels and the distance between them in the reduced image
+            n = len(range(j0, ppr, dj))
+            xs = dj * xstep // factor
+            base = (ystart + i * ystep) // factor * stride + (xstart + j0 * xstep) // factor * unit
+            end = base + (n - 1) * xs * unit + 1
+            for c in range(unit):
+                image[base + c:end + c:xs * unit] = row[j0 * unit + c::dj * unit]
+
+    if decoded and needed < decoded:
+        logging.debug('preview decoded from %d of %d scanlines', needed, decoded)
+
+    if sub_byte:
+        return pack_unpacked_rows(image, width, height, depth)
+    return image
+
+
+def _block_sums(samples, width: int, spp: int, factor: int):
+    # sum of the samples of each block of `factor` pixels
+    if np is not None:
+        values = np.zeros(width * factor * spp, dtype=np.uint32)
+        values[:len(samples)] = samples
+        return values.reshape((width, factor, spp)).sum(axis=1, dtype=np.uint32).reshape(-1)
+
+    sums = [0] * (width * spp)
+    block = factor * spp
+    for idx, value in enumerate(samples):
+        sums[idx // block * spp + idx % spp] += value
+    return sums
+
+
+def _block_averages(sums, counts: List[int], spp: int):
+    # rounded averages of the block sums over `counts` pixels
+    if np is not None:
+        total = np.repeat(np.asarray(counts, dtype=np.uint32), spp)
+        return (sums + total // 2) // total
+    return [(s + counts[idx // spp] // 2) // counts[idx // spp] for idx, s in enumerate(sums)]
+
+
+def box_average_scanlines(header: ChunkIHDR, scanlines: Iterable[Scanline], factor: int) -> bytearray:
+    """
+    Average the pixels of each `factor` x `factor` block of a non interlaced image.
+
+    Only the sums of the current row of blocks are kept while the scanlines are
+    consumed, blocks on the right and bottom edges average fewer pixels.
+    Return the rows of the reduced image without filter byte.
+    """
+    if header.interlace_method == 1:
+        raise ValueError('box average needs a non interlaced image')
+    if header.use_palette():
+        raise ValueError('palette indexes can\'t be averaged')
+
+    reduced = preview_header(header, factor)
+    width, spp, depth = reduced.width, header.pixel_len, header.bit_depth
+    row_size = header.row_length()
+    columns = [min(factor, header.width - x * factor) for x in range(width)]
+
+    image = bytearray()
+    sums = None
+    rows = 0
+    for y, scanline in enumerate(islice(scanlines, header.height)):
+        samples = unpack_samples(_pad(scanline.data, row_size), depth)[:header.width * spp]
+        block = _block_sums(samples, width, spp, factor)
+        sums = block if sums is None else (sums + block if np is not None else
+                                           [a + b for a, b in zip(sums, block)])
+        rows += 1
+        if rows == factor or y == header.height - 1:
+            image += pack_samples(_block_averages(sums, [c * rows for c in columns], spp), depth)
+            sums = None
+            rows = 0
+    return image
 
 
 class ImageData:
-    def __init__(self, header: ChunkIHDR, data: bytes, palette=None) -> None:
+    def __init__(self, header: ChunkIHDR, data: bytes, palette=None,
+                 transparency: Optional[bytes] = None, stats: Optional[Stats] = None) -> None:
         self.header = header
         self.data = data
+        # stage measures, disabled when None
+        self.stats = stats
 
         if palette:
             self.palette = palette
         else:
             self.palette = None
+        # content of the tRNS chunk
+        self.transparency = transparency
 
         self._scanlines: Optional[List[Scanline]] = None
+        self._palette_colors: Optional[List[Tuple[int, ...]]] = None
+        self._inverse_palette: Optional[Dict[Tuple[int, ...], int]] = None
+        self._exported: Optional[bytearray] = None
+        # reconstructed image of a non interlaced image, the loaded rows are views into it
+        self._buffer: Optional[bytearray] = None
+        self._buffer_rows: List[memoryview] = []
+        # interval -> {row: reconstructed row before it}
+        self._row_checkpoints: Dict[int, Dict[int, Optional[bytes]]] = {}
 
     def _load_scanlines(self) -> None:
+        with measure(self.stats, 'unfilter', len(self.data)) as m:
+            self._unfilter_scanlines()
+            m.bytes_out = len(self.data) - len(self._scanlines or [])
+
+    def _unfilter_scanlines(self) -> None:
         if self.header.interlace_method == 1:
             self._scanlines = list(deinterlace(self.header, self.data))
             logging.debug('%d interlaced scanlines loaded', len(self._scanlines))
         else:
             # line_width = pixel_count_in_line * bytes_count_by_pixel + the_filter_byte
-            line_width = self.header.width * self.header.pixel_len
+            line_width = self.header.row_length()
             logging.debug('%d bytes per scanline', line_width)
 
-            recon = None
-            self._scanlines = []
-
-            cursor = 0
-            while cursor < len(self.data):
-                filter_type = self.data[cursor]
-                cursor += 1
-                data = self.data[cursor:cursor+line_width]
-                cursor += line_width
-
-                recon = undo_filter(self.header, filter_type, data, recon)
-
-                scanline = Scanline(filter_type, recon)
-                self._scanlines.append(scanline)
+            filters, image = unfilter_image(self.header, self.data, line_width)
+            self._scanlines = [Scanline(filter_type, b'') for filter_type in filters]
+            self._share_buffer(image, [min(line_width, len(image) - y * line_width)
+                                       for y in range(len(filters))])
 
             logging.debug('%d scanlines loaded', len(self._scanlines))
 
@@ -264,6 +542,200 @@ class ImageData:
     @scanlines.setter
     def scanlines(self, value: List[Scanline]) -> None:
         self._scanlines = value
+        self._buffer = None
+        self._buffer_rows = []
+
+    def _share_buffer(self, image: bytearray, lengths: List[int]) -> bytearray:
+        # pad `image` to the full image and make the data of each loaded row a view into it
+        row_size = self.header.row_length()
+        image += bytes(max(0, self.header.height * row_size - len(image)))
+        view = memoryview(image)
+        self._buffer_rows = [view[y * row_size:y * row_size + length] for y, length in enumerate(lengths)]
+        for scanline, row in zip(self.scanlines, self._buffer_rows):
+            scanline.data = row
+        self._buffer = image
+        return image
+
+    def _buffer_shared(self) -> bool:
+        # no row was replaced since the buffer was built, edits in place go to the buffer
+        rows = self.scanlines
+        return (self._buffer is not None and len(rows) == len(self._buffer_rows) and
+                all(sc.data is row for sc, row in zip(rows, self._buffer_rows)))
+
+    def rows(self, y0: int, y1: int, interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> List[Scanline]:
+        """
+        Get the scanlines of the image rows from `y0` included to `y1` excluded.
+
+        Without loaded scanlines only the rows from the nearest checkpoint are
+        unfiltered, the row before every `interval` rows is kept for next calls.
+        Interlaced images are deinterlaced and their rows have no filter.
+        """
+        height = self.header.height
+        y0, y1 = max(0, y0), min(y1, height)
+        if y0 >= y1:
+            return []
+
+        if self.header.interlace_method == 1:
+            row_size = self.header.row_length()
+            buffer = self.get_image_buffer()
+            return [Scanline(0, buffer[y * row_size:(y + 1) * row_size]) for y in range(y0, y1)]
+        if self._scanlines is not None:
+            return self._scanlines[y0:y1]
+
+        checkpoints = self._row_checkpoints.setdefault(interval, {0: None})
+        start = max(y for y in checkpoints if y <= y0)
+        previous = checkpoints[start]
+        stride = self.header.row_length() + 1
+        fu = self.header.filter_unit
+
+        rows = []
+        for y in range(start, y1):
+            raw = self.data[y * stride:(y + 1) * stride]
+            if not raw:
+                logging.error('missing scanlines in image data')
+                break
+            previous = unfilter_row(raw[0], raw[1:], previous, fu)
+            if (y + 1) % interval == 0:
+                checkpoints[y + 1] = bytes(previous)
+            if y >= y0:
+                rows.append(Scanline(raw[0], previous))
+        return rows
+
+    def get_image_buffer(self) -> bytearray:
+        """
+        Get the reconstructed image as one contiguous buffer, deinterlaced if needed.
+
+        The buffer holds `height` rows of `header.row_length()` bytes without filter byte.
+        The scanlines of a non interlaced image are views into this buffer, it is
+        only built again when a scanline data is replaced.
+        """
+        if self.header.interlace_method == 1:
+            return adam7_scatter(self.header, self.scanlines)
+
+        row_size = self.header.row_length()
+        buffer = self._buffer
+        if buffer is None or not self._buffer_shared():
+            rows = self.scanlines
+            buffer = self._share_buffer(bytearray().join(_pad(sc.data, row_size) for sc in rows),
+                                        [min(row_size, len(sc.data)) for sc in rows])
+
+        size = self.header.height * row_size
+        # rows past the height of the image are not part of it
+        return buffer if len(buffer) == size else buffer[:size]
+
+    def preview(self, factor: int, box: bool = False) -> 'ImageData':
+        """
+        Get the image reduced by `factor`, see `preview_image`.
+
+        Without loaded scanlines only the scanlines up to the last kept pixel are unfiltered.
+        """
+        scanlines = self._scanlines if self._scanlines is not None else unfilter_stream(self.header, self.data)
+        return preview_image(self.header, scanlines, factor, box=box,
+                             palette=self.palette, transparency=self.transparency, stats=self.stats)
+
+    def expand_palette(self, alpha: bool = True) -> bytes:
+        """
+        Get the colors of an indexed image as `height` rows of `width` pixels.
+
+        Pixels are RGBA when the image has a tRNS chunk and `alpha` is set, RGB otherwise.
+        """
+        if not self.palette:
+            raise ValueError('image has no palette')
+
+        transparency = self.transparency if alpha else None
+        channels = 3 if transparency is None else 4
+        table = palette_table(getattr(self.palette, 'palette', self.palette), transparency)
+
+        width, depth = self.header.width, self.header.bit_depth
+        buffer = self.get_image_buffer()
+        if depth == 8:
+            return expand_indices(buffer, table, channels)
+
+        stride = self.header.row_length()
+        if np is not None:
+            packed = np.frombuffer(buffer, dtype=np.uint8).reshape(self.header.height, stride)
+            indices = unpack_rows(packed, depth)[:, :width]
+        else:
+            indices = [i for y in range(self.header.height)
+                       for i in unpack_samples(buffer[y * stride:(y + 1) * stride], depth)[:width]]
+        return expand_indices(indices, table, channels)
+
+    def _array_layout(self) -> Tuple[bytearray, Tuple[int, int, int], str]:
+        # buffer of one value per sample with its shape and NumPy type string
+        header = self.header
+        shape = (header.height, header.width, header.pixel_len)
+        buffer = self.get_image_buffer()
+
+        if header.bit_depth == 16:
+            return buffer, shape, '>u2'
+        if header.bit_depth == 8:
+            return buffer, shape, '|u1'
+
+        stride = header.row_length()
+        samples = bytearray()
+        for y in range(header.height):
+            samples += bytes(unpack_samples(buffer[y * stride:(y + 1) * stride], header.bit_depth)[:header.width])
+        return samples, shape, '|u1'
+
+    @property
+    def __array_interface__(self) -> Dict[str, object]:
+        """
+        Let NumPy view the decoded samples without copy, see `to_numpy`.
+        """
+        buffer, shape, typestr = self._array_layout()
+        # keep the buffer alive as long as this object
+        self._exported = buffer
+        return {'version': 3, 'shape': shape, 'typestr': typestr, 'data': buffer}
+
+    def to_numpy(self):
+        """
+        Get the decoded samples as a (height, width, samples per pixel) NumPy array.
+
+        Sub-byte samples are unpacked to one byte each, 16 bits samples are big endian,
+        indexed images give their palette indexes.
+        """
+        if np is None:
+            raise ImportError('to_numpy requires numpy')
+
+        buffer, shape, typestr = self._array_layout()
+        return np.frombuffer(buffer, dtype=np.dtype(typestr)).reshape(shape)
+
+    def to_pil(self):
+        """
+        Get the decoded image as a PIL image built straight from the image buffer.
+
+        16 bits greyscale images are kept in mode I;16, other 16 bits images are
+        reduced to 8 bits. Indexed images are in mode P with their palette and tRNS.
+        """
+        from PIL import Image as PilImage
+
+        header = self.header
+        buffer = self.get_image_buffer()
+        size = (header.width, header.height)
+        stride = header.row_length()
+        depth = header.bit_depth
+
+        if header.use_palette():
+            rawmode = 'P' if depth == 8 else f'P;{depth}'
+            pil_img = PilImage.frombuffer('P', size, buffer, 'raw', rawmode, stride, 1)
+            if self.palette:
+                colors = getattr(self.palette, 'palette', self.palette)
+                pil_img.putpalette(b''.join(bytes(c) for c in colors))
+            if self.transparency is not None:
+                pil_img.info['transparency'] = self.transparency
+            return pil_img
+
+        mode = {0: 'L', 2: 'RGB', 4: 'LA', 6: 'RGBA'}[header.color_type]
+        if depth == 16:
+            if mode == 'L':
+                return PilImage.frombytes('I;16', size, bytes(buffer), 'raw', 'I;16B', stride, 1)
+            # keep the most significant byte of each sample
+            return PilImage.frombuffer(mode, size, buffer[::2], 'raw', mode, stride // 2, 1)
+        if depth == 1:
+            return PilImage.frombuffer('1', size, buffer, 'raw', '1', stride, 1)
+        if depth < 8:
+            return PilImage.frombuffer('L', size, buffer, 'raw', f'L;{depth}', stride, 1)
+        return PilImage.frombuffer(mode, size, buffer, 'raw', mode, stride, 1)
 
     def show(self) -> None:
         from PIL import Image as PilImage
@@ -310,58 +782,106 @@ class ImageData:
         pil_img.putdata(data)
         pil_img.show()
 
-    def to_bytes(self) -> bytes:
+    def to_bytes(self, filter_strategy: Optional[str] = None, level: int = zlib.Z_DEFAULT_COMPRESSION) -> bytes:
+        """
+        Filter scanlines and return the uncompressed image data.
+
+        Without `filter_strategy` each scanline is stored with its own filter.
+        With 'minsum' or 'deflate' the best filter of each row is selected,
+        except for scanlines whose filter was explicitly assigned.
+        'deflate' compares the rows compressed at `level`, the level the data is compressed with.
+        """
+        with measure(self.stats, 'filter') as m:
+            data = self._filter_scanlines(filter_strategy, level)
+            # without the filter byte of each row
+            m.bytes_in = len(data) - len(self.scanlines)
+            m.bytes_out = len(data)
+        return data
+
+    def _filter_scanlines(self, filter_strategy: Optional[str], level: int) -> bytearray:
+        chooser = None
+        if filter_strategy is not None:
+            chooser = FilterChooser(filter_strategy, self.header.filter_unit, level)
+
+        starts = [new_image for _, new_image in scanline_sizes(self.header)]
+
         data = bytearray()
         recon = None
-        for scanline in self.scanlines:
+        for idx, scanline in enumerate(self.scanlines):
+            if idx < len(starts) and starts[idx]:
+                recon = None
+
+            filter_type = scanline.filter
             try:
-                raw = apply_filter(
-                    self.header, scanline.filter, scanline.data, recon)
+                if chooser is None or scanline.keep_filter:
+                    raw = apply_filter(
+                        self.header, scanline.filter, scanline.data, recon)
+                    if chooser is not None:
+                        chooser.update(filter_type, raw)
+                else:
+                    filter_type, raw = chooser.choose(scanline.data, recon)
             except IndexError:
                 logging.exception('error on scanline %r', scanline.data)
                 raise
             recon = scanline.data
-            data.append(scanline.filter)
+            data.append(filter_type)
             data += raw
         return data
 
     def _get_pixels(self, row):
-        pixels = []
-        px_len = self.header.pixel_len
+        bit_depth = self.header.bit_depth
+        samples = unpack_samples(row, bit_depth)
 
         if self.palette:
-            pixels = [self.palette[i] for i in row]
+            if self._palette_colors is None:
+                self._palette_colors = palette_colors(getattr(self.palette, 'palette', self.palette))
+            colors = self._palette_colors
+            pixels = [colors[i] for i in samples[:self.header.width].tolist()]
         else:
-            px = []
-            bit_depth = self.header.bit_depth
-            for val in BitArray(row, bit_depth):
-                if bit_depth != 8:
-                    # shrink value between 0 and 255
-                    val = val * (2**bit_depth - 1)
-                px.append(val)
-                if len(px) == px_len:
-                    pixels.append(tuple(px))
-                    px = []
-        return pixels
+            # scale values between 0 and 255
+            samples = scale_to_8bit(samples, bit_depth).tolist()
+            px_len = self.header.pixel_len
+            pixels = list(zip(*[iter(samples)] * px_len))
+        # drop the pixels unpacked from the padding bits of the last byte
+        return pixels[:self.header.width]
 
     def _save_pixels(self, row_data) -> bytes:
-        # bit_depth
-        row_ret = b''
-        # px_ok = 0
-        # px_ko = 0
         if self.palette:
+            if self._inverse_palette is None:
+                self._inverse_palette = inverse_palette(getattr(self.palette, 'palette', self.palette))
+            inverse = self._inverse_palette
+
+            # pixels missing from the palette are stored as their first channel
+            indices = []
             for px in row_data.pixels:
-                if px in self.palette:
-                    idx = self.palette.index(px)
-                    row_ret += idx.to_bytes(1, 'big')
-                    # px_ok += 1
-                else:
-                    # print("Missing pixel %s in palette" % px)
-                    # px_ko += 1
-                    row_ret += px[0].to_bytes(1, 'big')
-            # print("ok:%d ko:%d sum:%d" % (px_ok, px_ko, px_ok+px_ko))
+                px = tuple(getattr(px, 'values', px))
+                idx = inverse.get(px[:3])
+                indices.append(px[0] if idx is None else idx)
+            row_ret = pack_samples(indices, self.header.bit_depth)
 
         else:
-            for px in row_data.pixels:
-                row_ret += px.to_bytes()
+            samples = [value for px in row_data.pixels for value in getattr(px, 'values', px)]
+            row_ret = pack_samples(samples, self.header.bit_depth)
         return row_ret
+
+
+def preview_image(header: ChunkIHDR, scanlines: Iterable[Scanline], factor: int, *, box: bool = False,
+                  palette=None, transparency: Optional[bytes] = None,
+                  stats: Optional[Stats] = None) -> ImageData:
+    """
+    Build the image reduced by `factor` from its scanlines in stream order.
+
+    The pixel of every `factor` row and column is kept, interlaced images with a factor
+    of 8, 4 or 2 only need the first 1, 3 or 5 passes. With `box` each block of
+    `factor` x `factor` pixels of a non interlaced image is averaged instead.
+    """
+    reduced = preview_header(header, factor)
+    if box:
+        buffer = box_average_scanlines(header, scanlines, factor)
+    else:
+        buffer = subsample_scanlines(header, scanlines, factor)
+
+    stride = reduced.row_length()
+    # rows stored without filter, loaded as views into the image buffer like any image
+    data = b''.join(b'\x00' + buffer[y * stride:(y + 1) * stride] for y in range(reduced.height))
+    return ImageData(reduced, data, palette=palette, transparency=transparency, stats=stats)
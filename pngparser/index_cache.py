@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import struct
+from typing import Dict, List, Optional, Tuple
+
+INDEX_MAGIC = b'PNGIDX\x00\x01'
+# file size, mtime in ns, content digest, path length
+_KEY = struct.Struct('>QQ32sH')
+# offset, length, type, crc verdict
+_RECORD = struct.Struct('>QI4sB')
+_COUNT = struct.Struct('>I')
+
+CRC_BAD = 0
+CRC_OK = 1
+CRC_UNKNOWN = 0xff
+
+# bytes of the head and the tail hashed by check_content
+CONTENT_SAMPLE_SIZE = 4096
+
+Index = List[Tuple[int, int, bytes]]
+
+
+def default_directory() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'pngparser', 'index')
+
+
+class IndexCache:
+    """
+    On disk cache of the chunk table of files: offset, length, type and crc verdict of each chunk.
+
+    Entries are stored in `directory`, or next to each file as `<file>.pngidx` with
+    `sidecar`. An entry is only used while the path, size and mtime of the file
+    are unchanged, `check_content` also compares a hash of its head and tail.
+    """
+
+    def __init__(self, directory: Optional[str] = None, sidecar: bool = False,
+                 check_content: bool = False) -> None:
+        self.directory = directory or default_directory()
+        self.sidecar = sidecar
+        self.check_content = check_content
+
+    def entry_path(self, path: str) -> str:
+        if self.sidecar:
+            return f'{path}.pngidx'
+        name = hashlib.sha1(os.path.realpath(path).encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(self.directory, f'{name}.idx')
+
+    def _key(self, path: str, stat: os.stat_result) -> bytes:
+        digest = bytes(32)
+        if self.check_content:
+            with open(path, 'rb') as f:
+                head = f.read(CONTENT_SAMPLE_SIZE)
+                f.seek(max(0, stat.st_size - CONTENT_SAMPLE_SIZE), os.SEEK_SET)
+                digest = hashlib.sha256(head + f.read(CONTENT_SAMPLE_SIZE)).digest()
+
+        real_path = os.path.realpath(path).encode('utf-8', 'surrogateescape')
+        return INDEX_MAGIC + _KEY.pack(stat.st_size, stat.st_mtime_ns, digest, len(real_path)) + real_path
+
+    def load(self, path: str, stat: os.stat_result) -> Optional[Tuple[Index, Dict[int, bool]]]:
+        """
+        Get the chunk table and the known crc verdicts of a file, None when not cached or stale.
+        """
+        try:
+            with open(self.entry_path(path), 'rb') as f:
+                content = f.read()
+            key = self._key(path, stat)
+        except OSError:
+            return None
+
+        if not content.startswith(key) or len(content) < len(key) + _COUNT.size:
+            logging.debug('no valid index cached for %s', path)
+            return None
+
+        position = len(key)
+        count, = _COUNT.unpack_from(content, position)
+        position += _COUNT.size
+        if len(content) != position + count * _RECORD.size:
+            logging.debug('truncated index cached for %s', path)
+            return None
+
+        index: Index = []
+        verdicts: Dict[int, bool] = {}
+        for idx, (offset, length, type_, crc) in enumerate(_RECORD.iter_unpack(content[position:])):
+            index.append((offset, length, type_))
+            if crc != CRC_UNKNOWN:
+                verdicts[idx] = crc == CRC_OK
+        return index, verdicts
+
+    def store(self, path: str, stat: os.stat_result, index: Index, verdicts: Dict[int, bool]) -> None:
+        """
+        Save the chunk table of a file as it was when `stat` was taken, errors are ignored.
+        """
+        records = b''.join(
+            _RECORD.pack(offset, length, type_,
+                         CRC_UNKNOWN if idx not in verdicts else CRC_OK if verdicts[idx] else CRC_BAD)
+            for idx, (offset, length, type_) in enumerate(index))
+
+        entry_path = self.entry_path(path)
+        tmp_path = f'{entry_path}.tmp{os.getpid()}'
+        try:
+            os.makedirs(os.path.dirname(entry_path) or '.', exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(self._key(path, stat) + _COUNT.pack(len(index)) + records)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logging.debug('can\'t store index of %s: %s', path, e)
@@ -0,0 +1,184 @@
+import logging
+import os
+from typing import IO, Any, Callable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+JOURNAL_MAGIC = b'PNGJRNL\x01'
+JOURNAL_COMMIT = b'COMMITED'
+JOURNAL_INT_SIZE = 8
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def journal_path(path: str) -> str:
+    return f'{path}.journal'
+
+
+def _int(value: int) -> bytes:
+    return value.to_bytes(JOURNAL_INT_SIZE, 'big')
+
+
+def _fsync_dir(path: str) -> None:
+    # make the creation or the removal of the journal next to `path` durable
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        # directories can't be opened on every platform
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logging.debug('directory fsync failed: %s', e)
+    finally:
+        os.close(fd)
+
+
+def _open_locked(jpath: str, create: bool) -> Optional[IO[bytes]]:
+    # open the journal with an exclusive lock, held by its writer until it is applied.
+    # Without `create` None is returned when there is no journal or another process holds it.
+    while True:
+        try:
+            fd = os.open(jpath, os.O_RDWR | os.O_CREAT if create else os.O_RDONLY)
+        except FileNotFoundError:
+            return None
+        journal = open(fd, 'r+b' if create else 'rb')  # pylint: disable=consider-using-with
+
+        if fcntl is not None:
+            try:
+                fcntl.flock(journal.fileno(), fcntl.LOCK_EX if create else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                journal.close()
+                return None
+
+        # the journal may have been applied and removed while waiting for the lock
+        try:
+            same = os.path.samestat(os.fstat(journal.fileno()), os.stat(jpath))
+        except FileNotFoundError:
+            same = False
+        if same:
+            return journal
+        journal.close()
+        if not create:
+            return None
+
+
+def write_journal(path: str, new_size: int, records: List[Tuple[int, int, Any]],
+                  write_piece: Callable[[Any, Any], None]) -> IO[bytes]:
+    """
+    Write the journal of an in place update of `path`, return it still open and locked.
+
+    Each record is (offset in the file, size, piece), `write_piece(f, piece)` must
+    write exactly `size` bytes to `f`. The journal is only valid once the commit
+    marker is written after everything else is on disk. Apply it with `commit_journal`.
+    """
+    journal = _open_locked(journal_path(path), create=True)
+    try:
+        journal.truncate(0)
+        journal.write(JOURNAL_MAGIC + _int(new_size) + _int(len(records)))
+        for offset, size, piece in records:
+            journal.write(_int(offset) + _int(size))
+            write_piece(journal, piece)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+        journal.write(JOURNAL_COMMIT)
+        journal.flush()
+        os.fsync(journal.fileno())
+        _fsync_dir(path)
+    except BaseException:
+        journal.close()
+        raise
+    return journal
+
+
+def _read_records(journal) -> Tuple[int, List[Tuple[int, int, int]]]:
+    header = journal.read(len(JOURNAL_MAGIC) + 2 * JOURNAL_INT_SIZE)
+    if len(header) != len(JOURNAL_MAGIC) + 2 * JOURNAL_INT_SIZE or not header.startswith(JOURNAL_MAGIC):
+        raise ValueError('bad journal header')
+
+    new_size = int.from_bytes(header[-2 * JOURNAL_INT_SIZE:-JOURNAL_INT_SIZE], 'big')
+    count = int.from_bytes(header[-JOURNAL_INT_SIZE:], 'big')
+
+    # (offset in file, size, position of the data in the journal)
+    records = []
+    for _ in range(count):
+        record = journal.read(2 * JOURNAL_INT_SIZE)
+        if len(record) != 2 * JOURNAL_INT_SIZE:
+            raise ValueError('truncated journal')
+        offset = int.from_bytes(record[:JOURNAL_INT_SIZE], 'big')
+        size = int.from_bytes(record[JOURNAL_INT_SIZE:], 'big')
+        records.append((offset, size, journal.tell()))
+        journal.seek(size, os.SEEK_CUR)
+
+    if journal.read(len(JOURNAL_COMMIT)) != JOURNAL_COMMIT:
+        raise ValueError('journal not committed')
+    return new_size, records
+
+
+def _apply(path: str, journal: IO[bytes], new_size: int, records: List[Tuple[int, int, int]]) -> None:
+    # copy the records of a committed journal to `path` then remove the journal,
+    # the caller holds the journal lock
+    logging.debug('replay journal of %s', path)
+    with open(path, 'r+b') as f:
+        for offset, size, position in records:
+            journal.seek(position, os.SEEK_SET)
+            f.seek(offset, os.SEEK_SET)
+            while size > 0:
+                block = journal.read(min(size, COPY_BLOCK_SIZE))
+                f.write(block)
+                size -= len(block)
+        f.truncate(new_size)
+        f.flush()
+        os.fsync(f.fileno())
+
+    try:
+        os.remove(journal_path(path))
+    except FileNotFoundError:
+        # applied at the same time by another process without lock support
+        pass
+    _fsync_dir(path)
+
+
+def commit_journal(path: str, journal: IO[bytes]) -> None:
+    """
+    Apply the journal returned by `write_journal` to `path`, remove it and release it.
+
+    Raise when the journal can't be applied, the file is then left to the next replay.
+    """
+    with journal:
+        journal.seek(0, os.SEEK_SET)
+        new_size, records = _read_records(journal)
+        _apply(path, journal, new_size, records)
+
+
+def replay_journal(path: str) -> bool:
+    """
+    Apply the journal of `path` left by an interrupted save, if any, and remove it.
+
+    A journal still locked by the process writing or applying it is left alone.
+    One left incomplete by a process that died before its commit marker was never
+    applied, it is dropped when locks are supported and the file is untouched.
+    Replaying a committed journal twice is harmless. Return True when the file was updated.
+    """
+    jpath = journal_path(path)
+    journal = _open_locked(jpath, create=False)
+    if journal is None:
+        return False
+
+    with journal:
+        try:
+            new_size, records = _read_records(journal)
+        except ValueError as e:
+            if fcntl is None:
+                # its writer may still be running
+                logging.warning('ignore invalid journal %s: %s', jpath, e)
+            else:
+                logging.warning('drop invalid journal %s: %s', jpath, e)
+                os.remove(jpath)
+                _fsync_dir(path)
+            return False
+        _apply(path, journal, new_size, records)
+    return True
@@ -0,0 +1,55 @@
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+
+class LimitExceeded(ValueError):
+    """
+    A file goes over one of the resource limits given to the parser.
+    """
+
+
+@dataclass
+class Limits:
+    """
+    Resource budgets checked before buffers are allocated, None disables a limit.
+
+    Give it to PngParser(limits=...) or AsyncPngParser(limits=...) to parse untrusted files.
+    """
+    max_file_size: Optional[int] = 1024 * 1024 * 1024
+    max_chunks: Optional[int] = 100_000
+    # largest length allowed by the specification
+    max_chunk_length: Optional[int] = 2 ** 31 - 1
+    max_pixels: Optional[int] = 128 * 1024 * 1024
+    max_inflated_bytes: Optional[int] = 1024 * 1024 * 1024
+    # inflated size of one compressed text chunk
+    max_text_inflate: Optional[int] = 8 * 1024 * 1024
+
+    def check(self, name: str, value: int) -> None:
+        """
+        Raise LimitExceeded when `value` is over the limit `name`.
+        """
+        limit = getattr(self, name)
+        if limit is not None and value > limit:
+            raise LimitExceeded(f'{name} exceeded: {value} > {limit}')
+
+
+def inflate_limited(chunks: Iterable[bytes], max_length: int, name: str) -> bytearray:
+    """
+    Decompress a zlib stream split over several buffers, at most `max_length` bytes.
+
+    Inflating stops as soon as the output would go over, LimitExceeded is raised
+    with the name of the limit.
+    """
+    inflater = zlib.decompressobj()
+    data = bytearray()
+    for chunk in chunks:
+        data += inflater.decompress(chunk, max_length + 1 - len(data))
+        if len(data) > max_length:
+            raise LimitExceeded(f'{name} exceeded: more than {max_length} bytes inflated')
+    data += inflater.flush()
+    if len(data) > max_length:
+        raise LimitExceeded(f'{name} exceeded: more than {max_length} bytes inflated')
+    if not inflater.eof:
+        raise zlib.error('incomplete or truncated stream')
+    return data
@@ -0,0 +1,58 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+PALETTE_SIZE = 256
+
+
+def palette_colors(palette: Sequence[Tuple[int, ...]],
+                   alpha: Optional[bytes] = None) -> List[Tuple[int, ...]]:
+    """
+    Get the color of every index as RGB, or RGBA when `alpha` is given.
+
+    `alpha` is the content of the tRNS chunk, entries it does not cover are opaque.
+    """
+    colors = [tuple(color[:3]) for color in palette]
+    if alpha is not None:
+        colors = [color + (alpha[i] if i < len(alpha) else 255,) for i, color in enumerate(colors)]
+    return colors
+
+
+def palette_table(palette: Sequence[Tuple[int, ...]], alpha: Optional[bytes] = None) -> bytes:
+    """
+    Get the lookup table of the 256 indexes, one RGB or RGBA entry per index.
+
+    Indexes outside the palette are black, and transparent with `alpha`.
+    """
+    colors = palette_colors(palette, alpha)
+    channels = 3 if alpha is None else 4
+    return b''.join(bytes(c) for c in colors[:PALETTE_SIZE]) \
+        + bytes(channels * max(0, PALETTE_SIZE - len(colors)))
+
+
+def expand_indices(indices: Sequence[int], table: bytes, channels: int) -> bytes:
+    """
+    Replace each index by its `channels` bytes entry of `table` in one gather.
+    """
+    if np is not None:
+        lut = np.frombuffer(table, dtype=np.uint8).reshape(PALETTE_SIZE, channels)
+        return lut[np.asarray(indices, dtype=np.uint8)].tobytes()
+
+    entries = [table[i * channels:(i + 1) * channels] for i in range(PALETTE_SIZE)]
+    return b''.join([entries[i] for i in indices])
+
+
+def inverse_palette(palette: Sequence[Tuple[int, ...]],
+                    alpha: Optional[bytes] = None) -> Dict[Tuple[int, ...], int]:
+    """
+    Map each color to its index, the first index wins for duplicated colors.
+
+    Colors are RGB tuples, or RGBA when `alpha` is given.
+    """
+    inverse: Dict[Tuple[int, ...], int] = {}
+    for idx, color in enumerate(palette_colors(palette, alpha)):
+        inverse.setdefault(color, idx)
+    return inverse
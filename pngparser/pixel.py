@@ -3,6 +3,8 @@ from .chunks.ihdr import COLOR_TYPE_PALETTE
 
 
 class Pixel:
+    __slots__ = ('type', 'px_len', 'values')
+
     def __init__(self, type_, values=None) -> None:
         values = values or []
         self.type = type_
@@ -27,35 +29,25 @@ class Pixel:
         if self.type != other.type:
             raise Exception(f'Invalid {self.type=} + {other.type=}')
 
-        px = []
-        for i, _ in enumerate(other):
-            px.append((self[i] + other[i]) % 256)
-        return Pixel(self.type, px)
+        return Pixel(self.type, tuple((a + b) & 0xff for a, b in zip(self.values, other.values)))
 
     def __sub__(self, other):
         if self.type != other.type:
             raise Exception(f'Invalid {self.type=} - {other.type=}')
 
-        px = []
-        for i, _ in enumerate(other):
-            px.append((self[i] - other[i]) % 256)
-        return Pixel(self.type, px)
+        return Pixel(self.type, tuple((a - b) & 0xff for a, b in zip(self.values, other.values)))
 
     def add_mean(self, a, b):
         if not(self.type == a.type and a.type == b.type):
             raise Exception(f'Invalid {self.type=} {a.type=} {b.type=}')
-        px = []
-        for i, _ in enumerate(self):
-            px.append((self[i] + ((a[i] + b[i]) // 2)) % 256)
-        return Pixel(self.type, px)
+        return Pixel(self.type, tuple((x + ((y + z) >> 1)) & 0xff
+                                      for x, y, z in zip(self.values, a.values, b.values)))
 
     def sub_mean(self, a, b):
         if not(self.type == a.type and a.type == b.type):
             raise Exception(f'Invalid type {self.type}, {a.type}, {b.type}')
-        px = []
-        for i, _ in enumerate(self):
-            px.append((self[i] - ((a[i] + b[i]) // 2)) % 256)
-        return Pixel(self.type, px)
+        return Pixel(self.type, tuple((x - ((y + z) >> 1)) & 0xff
+                                      for x, y, z in zip(self.values, a.values, b.values)))
 
     # def get_tuple(self):
     #     return self.values
@@ -67,12 +59,7 @@ class Pixel:
         return self.values[key]
 
     def __eq__(self, other) -> bool:
-        if self.type != other.type:
-            return False
-        ret = True
-        for a, b in zip(self.values, other.values):
-            ret &= a == b
-        return ret
+        return self.type == other.type and self.values == other.values
 
     def __len__(self) -> int:
         return self.px_len
@@ -86,14 +73,13 @@ class Pixel:
             raise Exception(f'Invalid type {a.type=} {b.type=} {c.type=}')
 
         ret = []
-
-        pxs = [a, b, c]
-        for i, _ in enumerate(a):
-            tmp = a[i] + b[i] - c[i]
-
-            proximity = [abs(tmp - px[i]) for px in pxs]
-            minval = min(*proximity)
-            px_index = proximity.index(minval)
-
-            ret.append(pxs[px_index][i])
+        for x, y, z in zip(a.values, b.values, c.values):
+            tmp = x + y - z
+            pa, pb, pc = abs(tmp - x), abs(tmp - y), abs(tmp - z)
+            if pa <= pb and pa <= pc:
+                ret.append(x)
+            elif pb <= pc:
+                ret.append(y)
+            else:
+                ret.append(z)
         return Pixel(a.type, ret)
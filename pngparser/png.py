@@ -1,48 +1,162 @@
+import hashlib
 import logging
 import os
 import zlib
 import io
 from mmap import ACCESS_READ, mmap
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-from .chunks import ChunkRaw, create_chunk
+from .cache import get_image_cache
+from .checkpoints import RowIndex
+from .chunks import ChunkRaw, create_chunk, is_raw_chunk
 from .chunktypes import (CHUNK_CRC_SIZE, CHUNK_LENGTH_SIZE, CHUNK_TYPE_SIZE,
-                         TYPE_IDAT, TYPE_IHDR, TYPE_PLTE, is_text_chunk)
-from .imagedata import ImageData
+                         TYPE_IDAT, TYPE_IEND, TYPE_IHDR, TYPE_PLTE, TYPE_tRNS,
+                         is_text_chunk)
+from .compress import DEFAULT_BLOCK_SIZE, parallel_compress, split_data
+from .imagedata import (DEFAULT_CHECKPOINT_INTERVAL, ImageData, Scanline, preview_image, raw_size,
+                        stream_scanlines)
+from .index_cache import IndexCache
+from .journal import commit_journal, replay_journal, write_journal
+from .limits import Limits, inflate_limited
+from .region import decode_region
+from .stats import Stats, measure
 
 PNG_MAGIC_NUMBER = b'\x89PNG\r\n\x1a\n'
 PNG_MAGIC_NUMBER_SIZE = len(PNG_MAGIC_NUMBER)
 
 
+def _open_file(path: str):
+    # kept open by the parser until close()
+    return open(path, 'rb')  # pylint: disable=consider-using-with
+
+
+def inflate(chunks: Iterable[bytes]) -> bytearray:
+    """
+    Decompress a zlib stream split over several buffers without joining them.
+    """
+    inflater = zlib.decompressobj()
+    data = bytearray()
+    for chunk in chunks:
+        data += inflater.decompress(chunk)
+    data += inflater.flush()
+    if not inflater.eof:
+        raise zlib.error('incomplete or truncated stream')
+    return data
+
+
+def _read_range(reader, start: int, end: int):
+    # slice a mapped file without moving its position, seek and read other files
+    if isinstance(reader, (mmap, memoryview)):
+        return reader[start:end]
+    reader.seek(start, os.SEEK_SET)
+    return reader.read(max(0, end - start))
+
+
+def stored_crc(reader, entry: Tuple[int, int, bytes]) -> bytes:
+    """
+    Get the crc stored in the file for the chunk of the index `entry`, without reading its payload.
+
+    `reader` is the file, its mmap or a memoryview of it, like `PngParser.reader`.
+    """
+    offset, chunk_length, _ = entry
+    end = offset + CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE + chunk_length
+    return bytes(_read_range(reader, end, end + CHUNK_CRC_SIZE))
+
+
+def computed_crc(reader, entry: Tuple[int, int, bytes]) -> bytes:
+    """
+    Compute the crc of the type and data in the file of the chunk of the index `entry`.
+    """
+    offset, chunk_length, _ = entry
+    start = offset + CHUNK_LENGTH_SIZE
+    data = _read_range(reader, start, start + CHUNK_TYPE_SIZE + chunk_length)
+    return zlib.crc32(data).to_bytes(CHUNK_CRC_SIZE, 'big')
+
+
+class ChunkRef(NamedTuple):
+    """
+    Chunk of the source file not read yet.
+    """
+    index: int
+
+
 class PngParser:
-    def __init__(self, file):
+    def __init__(self, file, *, lazy: bool = False, zero_copy: bool = False,
+                 stats: Optional[Stats] = None, index_cache: Optional[IndexCache] = None,
+                 limits: Optional[Limits] = None):
+        # stage measures, disabled when None
+        self.stats = stats
+        # resource budgets of untrusted files, unlimited when None
+        self.limits = limits
+        # chunk tables saved on disk, disabled when None
+        self.index_cache = index_cache
+
         if isinstance(file, str):
+            # finish an in place save interrupted by a crash
+            replay_journal(file)
+
             logging.debug('opening file %s', file)
-            self.file = open(file, 'rb')
+            self.file = _open_file(file)
         else:
             logging.debug('read data')
             self.file = file
 
+        self._zero_copy = zero_copy
+        self._open_reader()
+
+        self._reset_chunks()
+        with measure(self.stats, 'read', self.file_size) as m:
+            if not self._load_index(lazy):
+                self._read_chunk(lazy)
+                self._store_index()
+            m.bytes_out = self.reader.tell()
+        if TYPE_IHDR not in self._types():
+            logging.warning('found no header chunk')
+
+    def _open_reader(self) -> None:
         # check file header
         if self.file.read(PNG_MAGIC_NUMBER_SIZE) != PNG_MAGIC_NUMBER:
             raise Exception(f'"{self.file.name}" file is not a PNG !')
 
+        # view over the mmap used to slice raw chunk data without copy
+        self._view: Optional[memoryview] = None
+        # identity of the file content in the image cache
+        self._cache_key: Optional[Tuple[Any, ...]] = None
+        # file state the chunk table is read from, for the index cache
+        self._index_stat: Optional[os.stat_result] = None
+        if self.index_cache is not None and self._file_path() is not None:
+            self._index_stat = os.fstat(self.file.fileno())
+
         try:
             # optimized load the picture to memory
             self.reader = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+            if self._zero_copy:
+                self._view = memoryview(self.reader)
         except io.UnsupportedOperation:
             logging.debug('can\'t use mmap fallback to standard reader')
             self.reader = self.file
 
+        self.reader.seek(0, os.SEEK_END)
+        self.file_size = self.reader.tell()
+        if self.limits is not None:
+            self.limits.check('max_file_size', self.file_size)
+
         # skip file header
         self.reader.seek(PNG_MAGIC_NUMBER_SIZE, os.SEEK_SET)
 
-        self.chunks: List[Any] = []
+    def _reset_chunks(self) -> None:
+        # chunks not read yet are ChunkRef when lazy
+        self._chunks: List[Any] = []
+        # (offset, length, type) of each chunk in the file
+        self.chunks_index: List[Tuple[int, int, bytes]] = []
+        # unmodified chunks read from the file, id -> (chunk, index in file)
+        self._sources: Dict[int, Tuple[Any, int]] = {}
         self.chunks_pos: List[Tuple[int, int]] = []
-
-        self._read_chunk()
-        if all(c.type != TYPE_IHDR for c in self.chunks):
-            logging.warning('found no header chunk')
+        # crc verdict of chunks of the file already checked
+        self._crc_verdicts: Dict[int, bool] = {}
+        self._verdicts_changed = False
+        # checkpoint index of the image rows by interval
+        self._row_indexes: Dict[int, RowIndex] = {}
 
     def __enter__(self):
         return self
@@ -53,13 +167,98 @@ class PngParser:
 
         self.close()
 
+    def _file_path(self) -> Optional[str]:
+        name = getattr(self.file, 'name', None)
+        if isinstance(name, str) and os.path.isfile(name):
+            return name
+        return None
+
+    def _load_index(self, lazy: bool) -> bool:
+        # build the chunk table from the index cache without reading the file
+        if self._index_stat is None:
+            return False
+        cached = self.index_cache.load(self.file.name, self._index_stat)
+        if cached is None:
+            return False
+
+        logging.debug('chunk index of %s from cache', self.file.name)
+        self.chunks_index, self._crc_verdicts = cached
+        for idx, (_, chunk_length, _) in enumerate(self.chunks_index):
+            self._check_chunk(idx + 1, chunk_length)
+        position = 0
+        for idx, (offset, _, _) in enumerate(self.chunks_index):
+            self._chunks.append(ChunkRef(idx))
+            end = min(offset + self._chunk_size(idx), self.file_size)
+            self.chunks_pos.append((position, end - 1))
+            position = end
+
+        if not lazy:
+            for idx in range(len(self._chunks)):
+                self._load_chunk(idx)
+        self.reader.seek(position, os.SEEK_SET)
+        return True
+
+    def _store_index(self) -> None:
+        if self._index_stat is not None:
+            self.index_cache.store(self.file.name, self._index_stat,
+                                   self.chunks_index, self._crc_verdicts)
+            self._verdicts_changed = False
+
     def close(self) -> None:
         logging.debug('closing file')
+        if self._verdicts_changed and not self.file.closed:
+            self._store_index()
+
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+        if isinstance(self.reader, mmap):
+            try:
+                self.reader.close()
+            except BufferError:
+                # chunk data views are still in use, they keep the mmap
+                # alive and it is unmapped when the last one is released
+                logging.debug('mmap still referenced by chunk data')
         self.file.close()
 
-    def _read_chunk(self) -> None:
+    def _check_chunk(self, count: int, chunk_length: int) -> None:
+        if self.limits is not None:
+            self.limits.check('max_chunks', count)
+            self.limits.check('max_chunk_length', chunk_length)
+
+    def _check_header(self, header: Any) -> None:
+        # checked before the image data is inflated or buffers are allocated
+        if self.limits is not None:
+            self.limits.check('max_pixels', header.width * header.height)
+            self.limits.check('max_inflated_bytes', raw_size(header))
+
+    def _read_data(self, chunk_type: bytes, chunk_length: int) -> Any:
+        start = self.reader.tell()
+        # the length read from the file is never trusted for an allocation
+        end = min(start + chunk_length, self.file_size)
+        if self._view is None or not is_raw_chunk(chunk_type):
+            return self.reader.read(end - start)
+
+        self.reader.seek(end, os.SEEK_SET)
+        return self._view[start:end]
+
+    @property
+    def chunks(self) -> List[Any]:
+        for idx, chunk in enumerate(self._chunks):
+            if isinstance(chunk, ChunkRef):
+                self._load_chunk(idx)
+        return self._chunks
+
+    @chunks.setter
+    def chunks(self, value: List[Any]) -> None:
+        self._chunks = value
+
+    def _read_chunk(self, lazy: bool = False) -> None:
         position = 0
         while True:
+            offset = self.reader.tell()
+
             # read data length
             length_byte = self.reader.read(CHUNK_LENGTH_SIZE)
 
@@ -67,35 +266,183 @@ class PngParser:
                 break
 
             chunk_length = int.from_bytes(length_byte, byteorder='big')
+            self._check_chunk(len(self.chunks_index) + 1, chunk_length)
 
             chunk_type = self.reader.read(CHUNK_TYPE_SIZE)
-            data = self.reader.read(chunk_length)
-            crc = self.reader.read(CHUNK_CRC_SIZE)
+            current_chunk: Any = ChunkRef(len(self.chunks_index))
+            if lazy:
+                # skip payload and crc, never past the end of file
+                end = self.reader.tell() + chunk_length + CHUNK_CRC_SIZE
+                self.reader.seek(min(end, self.file_size), os.SEEK_SET)
+            else:
+                data = self._read_data(chunk_type, chunk_length)
+                crc = self.reader.read(CHUNK_CRC_SIZE)
+                current_chunk = create_chunk(chunk_type, data, crc, self.limits)
 
             self.chunks_pos.append((position, self.reader.tell()-1))
             position = self.reader.tell()
 
-            current_chunk = create_chunk(chunk_type, data, crc)
-            logging.debug('found chunk %s', current_chunk.type)
-            self.chunks.append(current_chunk)
+            logging.debug('found chunk %s', chunk_type)
+            self.chunks_index.append((offset, chunk_length, chunk_type))
+            self._chunks.append(current_chunk)
+            if not lazy:
+                self._track(len(self.chunks_index) - 1, current_chunk)
+
+    def _load_chunk(self, idx: int) -> Any:
+        source_idx = self._chunks[idx].index
+        offset, chunk_length, chunk_type = self.chunks_index[source_idx]
+        logging.debug('load chunk %s at %d', chunk_type, offset)
+
+        self.reader.seek(offset + CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE, os.SEEK_SET)
+        data = self._read_data(chunk_type, chunk_length)
+        crc = self.reader.read(CHUNK_CRC_SIZE)
+
+        chunk = create_chunk(chunk_type, data, crc, self.limits)
+        self._chunks[idx] = chunk
+        self._track(source_idx, chunk)
+        return chunk
+
+    def _chunk_size(self, idx: int) -> int:
+        return CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE + self.chunks_index[idx][1] + CHUNK_CRC_SIZE
+
+    def _track(self, idx: int, chunk: Any) -> None:
+        # remember where an unmodified chunk comes from, truncated chunks
+        # can't be copied from the file and are always written from data
+        offset = self.chunks_index[idx][0]
+        if offset + self._chunk_size(idx) <= self.file_size:
+            chunk.dirty = False
+            self._sources[id(chunk)] = (chunk, idx)
+
+    def _source_index(self, chunk: Any) -> Optional[int]:
+        if isinstance(chunk, ChunkRef):
+            return chunk.index
+        if self.file.closed:
+            return None
+        source = self._sources.get(id(chunk))
+        if source is None or source[0] is not chunk or chunk.dirty:
+            return None
+        return source[1]
+
+    def _get_chunk(self, idx: int) -> Any:
+        chunk = self._chunks[idx]
+        if isinstance(chunk, ChunkRef):
+            chunk = self._load_chunk(idx)
+        return chunk
+
+    def verify_crc(self, idx: int) -> bool:
+        """
+        Check the crc stored in the file for a chunk against its type and data in the file.
+
+        The chunk is not parsed, work on lazy parsers too. Verdicts are
+        kept in the index cache when enabled.
+        """
+        if idx in self._crc_verdicts:
+            return self._crc_verdicts[idx]
+
+        source = self._view if self._view is not None else self.reader
+        entry = self.chunks_index[idx]
+        verdict = computed_crc(source, entry) == stored_crc(source, entry)
+        self._crc_verdicts[idx] = verdict
+        self._verdicts_changed = self._index_stat is not None
+        return verdict
+
+    def _types(self) -> List[bytes]:
+        return [self.chunks_index[c.index][2] if isinstance(c, ChunkRef) else c.type
+                for c in self._chunks]
+
+    def _iter_data(self, chunk_type: bytes) -> Iterator[Any]:
+        # payloads of the chunks of a type, chunks not loaded yet are read
+        # from the file when needed and not kept by the parser
+        for chunk in list(self._chunks):
+            if isinstance(chunk, ChunkRef):
+                offset, chunk_length, type_ = self.chunks_index[chunk.index]
+                if type_ == chunk_type:
+                    self.reader.seek(offset + CHUNK_LENGTH_SIZE + CHUNK_TYPE_SIZE, os.SEEK_SET)
+                    yield self._read_data(type_, chunk_length)
+            elif chunk.type == chunk_type:
+                yield chunk.data
+
+    def _get_chunks(self, predicate) -> List[Any]:
+        return [self._get_chunk(idx) for idx, type_ in enumerate(self._types())
+                if predicate(type_)]
 
     def show_image(self) -> None:
         img = self.get_image_data()
         img.show()
 
     def get_header(self):
-        return next(c for c in self.chunks if c.type == TYPE_IHDR)
+        return self._get_chunk(self._types().index(TYPE_IHDR))
+
+    def _image_cache_key(self) -> Tuple[Any, ...]:
+        if self._cache_key is None:
+            name = getattr(self.file, 'name', None)
+            if isinstance(name, str) and os.path.isfile(name):
+                stat = os.fstat(self.file.fileno())
+                self._cache_key = ('file', os.path.realpath(name), stat.st_mtime_ns, stat.st_size)
+            else:
+                self._cache_key = ('content', self._content_hash())
+        return self._cache_key
+
+    def _content_hash(self) -> bytes:
+        if isinstance(self.reader, mmap):
+            return hashlib.sha256(self.reader).digest()
+
+        position = self.reader.tell()
+        self.reader.seek(0, os.SEEK_SET)
+        digest = hashlib.sha256()
+        for block in iter(lambda: self.reader.read(1024 * 1024), b''):
+            digest.update(block)
+        self.reader.seek(position, os.SEEK_SET)
+        return digest.digest()
+
+    def _image_chunks_unchanged(self) -> bool:
+        # the image chunks are the ones of the file, not modified, added or removed
+        image_types = (TYPE_IHDR, TYPE_PLTE, TYPE_tRNS, TYPE_IDAT)
+        current = [self._source_index(chunk) for chunk, type_ in zip(self._chunks, self._types())
+                   if type_ in image_types]
+        source = [idx for idx, (_, _, type_) in enumerate(self.chunks_index) if type_ in image_types]
+        return current == source
+
+    def _invalidate_image_cache(self) -> None:
+        cache = get_image_cache()
+        if cache is not None and not self.file.closed:
+            cache.invalidate(self._image_cache_key())
 
     def get_image_data(self) -> Optional[ImageData]:
+        """
+        Decode the image data, from the shared image cache when enabled.
+        """
+        cache = get_image_cache()
+        cache_key = None
+        if cache is not None and self._image_chunks_unchanged():
+            cache_key = self._image_cache_key()
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logging.debug('image data from cache')
+                return cached
+
+        img = self._decode_image_data()
+        if cache_key is not None and img is not None:
+            cache.put(cache_key, img)
+        return img
+
+    def _decode_image_data(self) -> Optional[ImageData]:
         header_chunk = self.get_header()
 
-        data = b''.join(c.data for c in self.chunks if c.type == TYPE_IDAT)
-        if not data:
+        idats = list(self._iter_data(TYPE_IDAT))
+        if not any(idats):
             return None
+        self._check_header(header_chunk)
 
         try:
             logging.debug('deflate all data')
-            data = zlib.decompress(data)
+            with measure(self.stats, 'inflate', sum(len(d) for d in idats)) as m:
+                if self.limits is None:
+                    data = inflate(idats)
+                else:
+                    # never more than the size declared by the header
+                    data = inflate_limited(idats, raw_size(header_chunk), 'max_inflated_bytes')
+                m.bytes_out = len(data)
         except Exception:
             logging.exception('error in data decompression')
             raise
@@ -105,63 +452,343 @@ class PngParser:
             data_length = len(data)
             logging.debug('%d decompressed byte data loaded', data_length)
 
-            # If palette
-            palette = None
-            if header.use_palette():
-                logging.debug('use palette')
-                palette = next(c for c in self.chunks if c.type == TYPE_PLTE)
-
-            img = ImageData(header, data, palette=palette)
+            palette, transparency = self._palette()
+            img = ImageData(header, data, palette=palette, transparency=transparency,
+                            stats=self.stats)
             return img
 
-    def set_image_data(self, img: ImageData) -> None:
-        data = img.to_bytes()
-
-        compressed_data = zlib.compress(data)
-        # new_chunk_size = len(compressed_data)
-
-        new_idat = ChunkRaw(TYPE_IDAT, compressed_data, None)
+    def _palette(self) -> Tuple[Any, Optional[bytes]]:
+        # PLTE chunk and tRNS data of an indexed image
+        palette = None
+        transparency = None
+        if self.get_header().use_palette():
+            logging.debug('use palette')
+            palette = self._get_chunks(lambda t: t == TYPE_PLTE)[0]
+
+            trns = self._get_chunks(lambda t: t == TYPE_tRNS)
+            if trns:
+                transparency = bytes(trns[0].data)
+        return palette, transparency
+
+    def preview(self, factor: int, box: bool = False) -> Optional[ImageData]:
+        """
+        Decode the image reduced by `factor` for thumbnails.
+
+        The pixel of every `factor` row and column is kept and decoding stops after the
+        last scanline holding one, interlaced images with a factor of 8, 4 or 2 only
+        inflate and unfilter their first 1, 3 or 5 passes. With `box` the blocks of
+        `factor` x `factor` pixels of a non interlaced image are averaged instead.
+        Scanlines are streamed, only the reduced image is kept in memory.
+        """
+        if TYPE_IDAT not in self._types():
+            return None
 
+        palette, transparency = self._palette()
+        return preview_image(self.get_header(), self.iter_scanlines(), factor, box=box,
+                             palette=palette, transparency=transparency, stats=self.stats)
+
+    def iter_scanlines(self) -> Iterator[Scanline]:
+        """
+        Decode the image data row by row.
+
+        IDAT chunks are inflated one at a time and each scanline is yielded
+        as soon as it is reconstructed, the full image is never held in memory.
+        """
+        header = self.get_header()
+        self._check_header(header)
+        idats = self._iter_data(TYPE_IDAT)
+        return stream_scanlines(header, idats)
+
+    def row_index(self, interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> RowIndex:
+        """
+        Get the checkpoint index of the rows of a non interlaced image.
+
+        The index is built on first use and kept by the parser while its image chunks are unchanged.
+        """
+        unchanged = self._image_chunks_unchanged()
+        if unchanged and interval in self._row_indexes:
+            return self._row_indexes[interval]
+
+        self._check_header(self.get_header())
+        idats = list(self._iter_data(TYPE_IDAT))
+        index = RowIndex(self.get_header(), idats, interval)
+        if unchanged:
+            self._row_indexes[interval] = index
+        return index
+
+    def rows(self, y0: int, y1: int, interval: int = DEFAULT_CHECKPOINT_INTERVAL) -> List[Scanline]:
+        """
+        Decode the rows from `y0` included to `y1` excluded of a non interlaced image.
+
+        The first call decodes the image once to record a checkpoint every `interval`
+        rows, next calls resume inflating and unfiltering from the nearest checkpoint.
+        """
+        return self.row_index(interval).rows(y0, y1)
+
+    def decode_region(self, x: int, y: int, width: int, height: int) -> bytearray:
+        """
+        Decode only the `width` x `height` rectangle at `x`, `y` of the image.
+
+        IDAT chunks are read and inflated until the last scanline holding a pixel of the
+        rectangle, only its columns are kept. For interlaced images only the pixels of each
+        pass inside the rectangle are kept. Return `height` rows of `header.row_length(width)` bytes.
+        """
+        header = self.get_header()
+        self._check_header(header)
+        idats = self._iter_data(TYPE_IDAT)
+        return decode_region(header, idats, (x, y, width, height))
+
+    def set_image_data(self, img: ImageData, filter_strategy: Optional[str] = None,
+                       level: int = zlib.Z_DEFAULT_COMPRESSION, *, threads: Optional[int] = 1,
+                       block_size: int = DEFAULT_BLOCK_SIZE, idat_size: Optional[int] = None) -> None:
+        """
+        Replace the IDAT chunks with the compressed image data.
+
+        With `threads` other than 1 the data is compressed by blocks of `block_size`
+        bytes on a thread pool, None uses one thread per core.
+        The result is split in IDAT chunks of `idat_size` bytes, one chunk by default.
+        """
+        # cached images of this file must not be taken for the new data
+        self._invalidate_image_cache()
+        self._row_indexes.clear()
+        data = img.to_bytes(filter_strategy, level)
+
+        with measure(self.stats, 'deflate', len(data)) as m:
+            compressed_data = parallel_compress(data, level, threads, block_size)
+            m.bytes_out = len(compressed_data)
+        logging.debug('%d bytes compressed to %d', len(data), len(compressed_data))
+
+        new_idats = [ChunkRaw(TYPE_IDAT, part, None)
+                     for part in split_data(compressed_data, idat_size)]
+
+        # other chunks are kept as they are, not read yet on a lazy parser
         new_inserted = False
         new_chunks = []
-        for chunk in self.chunks:
-            if chunk.type == TYPE_IDAT:
+        for chunk, type_ in zip(self._chunks, self._types()):
+            if type_ == TYPE_IDAT:
                 if not new_inserted:
                     new_inserted = True
-                    new_chunks.append(new_idat)
+                    new_chunks += new_idats
             else:
                 new_chunks.append(chunk)
 
-        self.chunks = new_chunks
-        for c in self.chunks:
-            logging.debug('new chunks: %s', c.type)
+        self._chunks = new_chunks
+        logging.debug('new chunks: %s', self._types())
 
-    def save_file(self, path) -> None:
-        with open(path, 'wb') as f:
+    def save_file(self, path, fix_crc: bool = False) -> None:
+        """
+        Write the PNG to `path`.
+
+        Unmodified chunks are copied byte for byte from the source file, only
+        new or modified chunks are serialized with a new crc. With `fix_crc`
+        unmodified chunks with a wrong crc are rewritten too.
+        """
+        target = path
+        if self._is_source(path):
+            # never truncate the file we are copying from
+            target = f'{path}.tmp{os.getpid()}'
+
+        with open(target, 'wb') as f, measure(self.stats, 'write') as m:
             f.write(PNG_MAGIC_NUMBER)
 
-            for chunk in self.chunks:
-                # update chunk crc
-                chunk.crc = zlib.crc32(
-                    chunk.type + chunk.data).to_bytes(CHUNK_CRC_SIZE, 'big')
-                f.write(chunk.to_bytes())
+            for idx, chunk in enumerate(self._chunks):
+                source_idx = self._source_index(chunk)
+                if source_idx is not None and fix_crc and not self.verify_crc(source_idx):
+                    logging.debug('fix crc of chunk %d', idx)
+                    chunk = self._get_chunk(idx)
+                    source_idx = None
+
+                if source_idx is not None:
+                    offset = self.chunks_index[source_idx][0]
+                    self._copy_range(f, offset, self._chunk_size(source_idx))
+                else:
+                    self._write_chunk(f, chunk)
+            m.bytes_in = m.bytes_out = f.tell()
+
+        if target != path:
+            self._invalidate_image_cache()
+            os.replace(target, path)
+
+    def _is_source(self, path) -> bool:
+        try:
+            return os.path.samefile(path, self.file.name)
+        except (OSError, AttributeError, TypeError):
+            return False
+
+    @staticmethod
+    def _serialize_chunk(chunk) -> bytes:
+        if not chunk.crc:
+            # new chunk, crc is computed below
+            chunk.crc = bytes(CHUNK_CRC_SIZE)
+        data = chunk.to_bytes()
+        # update chunk crc
+        crc = zlib.crc32(memoryview(data)[CHUNK_LENGTH_SIZE:-CHUNK_CRC_SIZE])
+        chunk.crc = crc.to_bytes(CHUNK_CRC_SIZE, 'big')
+        return data[:-CHUNK_CRC_SIZE] + chunk.crc
+
+    def _write_chunk(self, f, chunk) -> None:
+        f.write(self._serialize_chunk(chunk))
+
+    def add_chunk(self, chunk, idx: Optional[int] = None) -> None:
+        """
+        Insert a chunk at position `idx`, before IEND by default.
+        """
+        if idx is None:
+            types = self._types()
+            idx = types.index(TYPE_IEND) if TYPE_IEND in types else len(types)
+        self._chunks.insert(idx, chunk)
+
+    def _plan_in_place(self) -> Tuple[List[Tuple[int, int, Any]], int, int]:
+        # records of (offset, size, bytes or source chunk index) to write over
+        # the file, the new file size and the number of bytes of the rewritten tail
+        records: List[Tuple[int, int, Any]] = []
+        position = PNG_MAGIC_NUMBER_SIZE
+        tail_size = 0
+        in_tail = False
+
+        for idx, chunk in enumerate(self._chunks):
+            source_idx = self._source_index(chunk)
+            if not in_tail and source_idx == idx:
+                # untouched, same place
+                position += self._chunk_size(idx)
+                continue
+
+            data = None if source_idx is not None else self._serialize_chunk(chunk)
+            if not in_tail and data is not None and idx < len(self.chunks_index) \
+                    and len(data) == self._chunk_size(idx) \
+                    and self.chunks_index[idx][0] + len(data) <= self.file_size:
+                # same size, patch in place
+                records.append((position, len(data), data))
+                position += len(data)
+                continue
+
+            in_tail = True
+            if data is None:
+                size = self._chunk_size(source_idx)
+                records.append((position, size, source_idx))
+            else:
+                size = len(data)
+                records.append((position, size, data))
+            position += size
+            tail_size += size
+
+        if in_tail or len(self._chunks) < len(self.chunks_index):
+            new_size = position
+        else:
+            new_size = self.file_size
+        return records, new_size, tail_size
+
+    def save_in_place(self) -> None:
+        """
+        Write the changes back to the source file touching as few bytes as possible.
+
+        Modified chunks keeping their size are patched in place. From the first chunk
+        inserted, removed, moved or resized the rest of the file is rewritten.
+        Changes are written to a journal first, replayed on next open if the
+        process dies while patching. When most of the file would be rewritten
+        it is saved to a copy renamed over the original instead.
+        """
+        path = self.file.name
+        if not isinstance(path, str) or not os.path.isfile(path):
+            raise Exception('in place save needs a parser opened on a file path')
+
+        records, new_size, tail_size = self._plan_in_place()
+        if not records and new_size == self.file_size:
+            logging.debug('nothing to save')
+            return
+        self._invalidate_image_cache()
+
+        if tail_size > self.file_size // 2:
+            logging.debug('rewrite the whole file')
+            self.save_file(path)
+        else:
+            logging.debug('patch %d records, rewrite %d tail bytes', len(records), tail_size)
+
+            def write_piece(f, piece) -> None:
+                if isinstance(piece, int):
+                    offset = self.chunks_index[piece][0]
+                    self._copy_range(f, offset, self._chunk_size(piece))
+                else:
+                    f.write(piece)
+
+            journal = write_journal(path, new_size, records, write_piece)
+            self._detach_views()
+            # the file must not be mapped while it is written and truncated
+            self.close()
+            commit_journal(path, journal)
+
+        self._reload()
+
+    def _detach_views(self) -> None:
+        # data views would show the file bytes written over them
+        for chunk in self._chunks:
+            if isinstance(getattr(chunk, 'data', None), memoryview):
+                dirty = chunk.dirty
+                chunk.data = bytes(chunk.data)
+                chunk.dirty = dirty
+
+    def _reload(self) -> None:
+        path = self.file.name
+        chunks = self._chunks
+        self.close()
+
+        self.file = _open_file(path)
+        self._open_reader()
+        self._reset_chunks()
+        self._read_chunk(lazy=True)
+        self._store_index()
+
+        # the file now holds the chunks in the list order
+        for idx, chunk in enumerate(chunks[:len(self._chunks)]):
+            if not isinstance(chunk, ChunkRef):
+                self._chunks[idx] = chunk
+                self._track(idx, chunk)
+
+    def _copy_range(self, f, offset: int, size: int) -> None:
+        try:
+            src_fd = self.file.fileno()
+            dst_fd = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            src_fd = None
+
+        if src_fd is not None:
+            f.flush()
+            try:
+                copy = getattr(os, 'copy_file_range', None)
+                while size > 0:
+                    if copy is not None:
+                        sent = copy(src_fd, dst_fd, size, offset)
+                    else:
+                        sent = os.sendfile(dst_fd, src_fd, offset, size)
+                    if not sent:
+                        break
+                    offset += sent
+                    size -= sent
+            except (AttributeError, OSError) as e:
+                logging.debug('kernel copy failed, fallback to read: %s', e)
+            else:
+                if not size:
+                    return
+
+        self.reader.seek(offset, os.SEEK_SET)
+        f.write(self.reader.read(size))
 
     def get_by_index(self, idx) -> list:
-        if idx >= len(self.chunks):
+        if idx >= len(self._chunks):
             raise Exception(f'index {idx} too big')
-        return self.chunks[idx]
+        return self._get_chunk(idx)
 
     def get_by_type(self, type_chunk) -> list:
-        return [item for item in self.chunks if item.type == type_chunk]
+        return self._get_chunks(lambda t: t == type_chunk)
 
     def get_all(self) -> list:
         return self.chunks
 
     def get_text_chunks(self) -> list:
-        return [i for i in self.chunks if is_text_chunk(i.type)]
+        return self._get_chunks(is_text_chunk)
 
     def get_pos(self, chunk: ChunkRaw) -> Tuple[int, int]:
         try:
-            return self.chunks_pos[self.chunks.index(chunk)]
+            return self.chunks_pos[self._chunks.index(chunk)]
         except ValueError:
             return 0, 0
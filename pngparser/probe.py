@@ -0,0 +1,117 @@
+import os
+import struct
+from typing import IO, NamedTuple, Optional, Tuple, Union
+
+from .chunks import create_chunk
+from .chunktypes import CHUNK_CRC_SIZE, CHUNK_HEADER_SIZE, TYPE_IEND, TYPE_IHDR, is_text_chunk
+from .events import READ_BLOCK_SIZE
+from .limits import Limits
+from .png import PNG_MAGIC_NUMBER
+
+IHDR_SIZE = 13
+# signature, IHDR header, data and CRC
+PROBE_PREFIX_SIZE = len(PNG_MAGIC_NUMBER) + CHUNK_HEADER_SIZE + IHDR_SIZE + CHUNK_CRC_SIZE
+
+
+class ProbeResult(NamedTuple):
+    width: int
+    height: int
+    bit_depth: int
+    color_type: int
+    compression_method: int
+    filter_method: int
+    interlace_method: int
+    # type of every chunk in file order
+    chunk_types: Tuple[bytes, ...]
+    # (chunk type, key, text) of text chunks, None when not requested
+    text: Optional[Tuple[Tuple[bytes, Optional[str], str], ...]]
+    # the chunk list stops before IEND
+    truncated: bool
+
+
+def _discard(file: IO[bytes], size: int) -> None:
+    while size > 0:
+        block = file.read(min(size, READ_BLOCK_SIZE))
+        if not block:
+            break
+        size -= len(block)
+
+
+def _read_blocks(file: IO[bytes], size: int) -> bytes:
+    # a declared length past the end of the file only allocates the bytes present
+    blocks = []
+    while size > 0:
+        block = file.read(min(size, READ_BLOCK_SIZE))
+        if not block:
+            break
+        blocks.append(block)
+        size -= len(block)
+    return b''.join(blocks)
+
+
+def _text_entry(chunk_type: bytes, data: bytes,
+                limits: Optional[Limits]) -> Tuple[bytes, Optional[str], str]:
+    chunk = create_chunk(chunk_type, data, b'', limits)
+    if hasattr(chunk, 'text'):
+        return chunk_type, chunk.key, chunk.text
+    return chunk_type, None, data.decode('utf-8', 'replace')
+
+
+def _probe_stream(file: IO[bytes], text: bool, limits: Optional[Limits]) -> ProbeResult:
+    prefix = file.read(PROBE_PREFIX_SIZE)
+    if not prefix.startswith(PNG_MAGIC_NUMBER):
+        raise Exception(f'"{getattr(file, "name", file)}" file is not a PNG !')
+
+    pos = len(PNG_MAGIC_NUMBER)
+    length, chunk_type = struct.unpack('>I4s', prefix[pos:pos + CHUNK_HEADER_SIZE])
+    if chunk_type != TYPE_IHDR or length != IHDR_SIZE or len(prefix) < PROBE_PREFIX_SIZE:
+        raise Exception('missing IHDR chunk')
+    fields = struct.unpack('>IIBBBBB', prefix[pos + CHUNK_HEADER_SIZE:pos + CHUNK_HEADER_SIZE + IHDR_SIZE])
+
+    chunk_types = [TYPE_IHDR]
+    texts = []
+    truncated = True
+    seekable = file.seekable()
+    while True:
+        header = file.read(CHUNK_HEADER_SIZE)
+        if len(header) < CHUNK_HEADER_SIZE:
+            break
+        length, chunk_type = struct.unpack('>I4s', header)
+        chunk_types.append(chunk_type)
+        if limits is not None:
+            limits.check('max_chunks', len(chunk_types))
+            limits.check('max_chunk_length', length)
+
+        if chunk_type == TYPE_IEND:
+            truncated = False
+            break
+        if text and is_text_chunk(chunk_type):
+            data = _read_blocks(file, length)
+            if len(data) < length:
+                break
+            texts.append(_text_entry(chunk_type, data, limits))
+            length = 0
+
+        if seekable:
+            file.seek(length + CHUNK_CRC_SIZE, os.SEEK_CUR)
+        else:
+            _discard(file, length + CHUNK_CRC_SIZE)
+
+    return ProbeResult(*fields, chunk_types=tuple(chunk_types),
+                       text=tuple(texts) if text else None, truncated=truncated)
+
+
+def probe(file: Union[str, IO[bytes]], text: bool = False,
+          limits: Optional[Limits] = None) -> ProbeResult:
+    """
+    Read the header of a PNG and the type of its chunks without decoding it.
+
+    Chunk payloads are skipped, only text chunks are read when `text` is set.
+    `file` is a path or a binary file object positioned at the signature.
+    With `limits` the chunk count, chunk lengths and inflated text are checked.
+    """
+    if isinstance(file, str):
+        # unbuffered, a buffered reader would refill its buffer after every seek
+        with open(file, 'rb', buffering=0) as f:
+            return _probe_stream(f, text, limits)
+    return _probe_stream(file, text, limits)
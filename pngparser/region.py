@@ -0,0 +1,82 @@
+import logging
+from itertools import islice
+from typing import Iterable, List, Tuple
+
+from .chunks import ChunkIHDR
+from .imagedata import _pad, pack_unpacked_rows, reduced_images, stream_scanlines
+from .samples import unpack_samples
+
+
+def _span(start: int, step: int, count: int, lo: int, hi: int) -> Tuple[int, int]:
+    # indexes i of `start + i * step` in [lo, hi) for i in [0, count)
+    first = max(0, -(-(lo - start) // step))
+    last = min(count, -(-(hi - start) // step))
+    return first, max(first, last)
+
+
+def check_region(header: ChunkIHDR, x: int, y: int, width: int, height: int) -> None:
+    if width <= 0 or height <= 0:
+        raise ValueError(f'Region size must be positive not {width}x{height}')
+    if x < 0 or y < 0 or x + width > header.width or y + height > header.height:
+        raise ValueError(f'Region {width}x{height}+{x}+{y} outside of the '
+                         f'{header.width}x{header.height} image')
+
+
+def decode_region(header: ChunkIHDR, chunks: Iterable[bytes], box: Tuple[int, int, int, int]) -> bytearray:
+    """
+    Decode the (x, y, width, height) rectangle `box` of the compressed image data.
+
+    Scanlines are decoded one at a time and only the pixels of the rectangle are kept,
+    decoding stops after the last scanline holding one of them and the remaining
+    chunks are not read. Return `height` rows of `header.row_length(width)` bytes.
+    """
+    x, y, width, height = box
+    check_region(header, x, y, width, height)
+
+    depth = header.bit_depth
+    sub_byte = header.bits_per_pixel < 8
+    # bytes of a pixel in the region buffer, sub-byte samples are unpacked to one byte
+    unit = 1 if sub_byte else header.bits_per_pixel // 8
+    stride = width * unit
+    region = bytearray(stride * height)
+
+    # rows and columns of each reduced image inside the region
+    plan: List[Tuple[int, ...]] = []
+    needed = 0
+    decoded = 0
+    for xstart, ystart, xstep, ystep, ppr, count in reduced_images(header):
+        i0, i1 = _span(ystart, ystep, count, y, y + height)
+        j0, j1 = _span(xstart, xstep, ppr, x, x + width)
+        plan.append((xstart, ystart, xstep, ystep, ppr, count, i0, i1 if j0 < j1 else i0, j0, j1))
+        if i0 < i1 and j0 < j1:
+            needed = decoded + i1
+        decoded += count
+
+    scanlines = islice(stream_scanlines(header, chunks), needed)
+    for xstart, ystart, xstep, ystep, ppr, count, i0, i1, j0, j1 in plan:
+        # rows before the region still have to be unfiltered for the next ones
+        for i, scanline in zip(range(count), scanlines):  # pylint: disable=looping-through-iterator
+            if i < i0 or i >= i1:
+                continue
+
+            if sub_byte:
+                b0, b1 = j0 * depth // 8, -(-j1 * depth // 8)
+                skip = j0 - b0 * 8 // depth
+                row = bytes(unpack_samples(_pad(scanline.data[b0:b1], b1 - b0), depth))[skip:skip + j1 - j0]
+            else:
+                row = _pad(scanline.data[j0 * unit:j1 * unit], (j1 - j0) * unit)
+
+            base = (ystart + i * ystep - y) * stride + (xstart + j0 * xstep - x) * unit
+            if xstep == 1:
+                region[base:base + len(row)] = row
+                continue
+            end = base + ((j1 - j0 - 1) * xstep) * unit + 1
+            for c in range(unit):
+                region[base + c:end + c:xstep * unit] = row[c::unit]
+
+    if decoded and needed < decoded:
+        logging.debug('region decoded from %d of %d scanlines', needed, decoded)
+
+    if sub_byte:
+        return pack_unpacked_rows(region, width, height, depth)
+    return region
@@ -0,0 +1,122 @@
+import sys
+from array import array
+from typing import Dict, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+SUB_BYTE_DEPTHS = (1, 2, 4)
+
+
+def _byte_samples(byte: int, depth: int) -> bytes:
+    mask = (1 << depth) - 1
+    return bytes((byte >> shift) & mask for shift in range(8 - depth, -1, -depth))
+
+
+# samples of each byte value for sub-byte depths, most significant bits first
+_LUT: Dict[int, List[bytes]] = {
+    depth: [_byte_samples(byte, depth) for byte in range(256)] for depth in SUB_BYTE_DEPTHS
+}
+_LUT_NP = {depth: np.frombuffer(b''.join(table), dtype=np.uint8).reshape(256, -1)
+           for depth, table in _LUT.items()} if np is not None else {}
+
+
+def _check_depth(depth: int) -> None:
+    if depth not in (1, 2, 4, 8, 16):
+        raise ValueError(f'Depth must be 16, 8, 4, 2, 1 not {depth}')
+
+
+def unpack_samples(data: bytes, depth: int) -> Sequence[int]:
+    """
+    Unpack a buffer to one value per sample.
+
+    Padding bits of the last byte are unpacked too for sub-byte depths.
+    Return a NumPy array when available, an array.array otherwise.
+    """
+    _check_depth(depth)
+
+    if np is not None:
+        if depth == 16:
+            # byte swapped view of big endian samples
+            return np.frombuffer(data, dtype='>u2', count=len(data) // 2).astype(np.uint16)
+        packed = np.frombuffer(data, dtype=np.uint8)
+        if depth == 8:
+            return packed
+        return _LUT_NP[depth][packed].reshape(-1)
+
+    if depth == 16:
+        samples = array('H', bytes(data[:len(data) - len(data) % 2]))
+        if sys.byteorder == 'little':
+            samples.byteswap()
+        return samples
+    if depth == 8:
+        return array('B', data)
+    table = _LUT[depth]
+    return array('B', b''.join(table[byte] for byte in data))
+
+
+def pack_samples(samples: Sequence[int], depth: int) -> bytes:
+    """
+    Pack one value per sample to a buffer, the last byte is padded with zero bits.
+    """
+    _check_depth(depth)
+
+    if np is not None:
+        values = np.asarray(samples)
+        if depth == 16:
+            return values.astype('>u2').tobytes()
+        if depth == 8:
+            return values.astype(np.uint8).tobytes()
+        return pack_rows(values.reshape(1, -1), depth, -(-len(values) * depth // 8)).tobytes()
+
+    if depth == 16:
+        packed = array('H', samples)
+        if sys.byteorder == 'little':
+            packed.byteswap()
+        return packed.tobytes()
+    if depth == 8:
+        return bytes(samples)
+
+    per_byte = 8 // depth
+    result = bytearray(-(-len(samples) // per_byte))
+    for i, value in enumerate(samples):
+        result[i // per_byte] |= value << (8 - depth * (i % per_byte + 1))
+    return bytes(result)
+
+
+def unpack_rows(packed, depth: int):
+    """
+    Unpack a 2D NumPy array of sub-byte packed rows to one sample per byte.
+    """
+    return _LUT_NP[depth][packed].reshape(packed.shape[0], -1)
+
+
+def pack_rows(values, depth: int, row_size: int):
+    """
+    Pack a 2D NumPy array of sub-byte samples to rows of `row_size` bytes.
+    """
+    per_byte = 8 // depth
+    padded = np.zeros((values.shape[0], row_size * per_byte), dtype=np.uint8)
+    padded[:, :values.shape[1]] = values
+    shifts = np.arange(8 - depth, -1, -depth, dtype=np.uint8)
+    packed = padded.reshape((values.shape[0], row_size, per_byte)) << shifts
+    return np.bitwise_or.reduce(packed, axis=2)
+
+
+def scale_to_8bit(samples: Sequence[int], depth: int) -> Sequence[int]:
+    """
+    Scale samples of any depth to the 0-255 range.
+    """
+    if depth == 8:
+        return samples
+    if depth == 16:
+        if np is not None:
+            return (np.asarray(samples) >> 8).astype(np.uint8)
+        return array('B', (v >> 8 for v in samples))
+
+    factor = 255 // ((1 << depth) - 1)
+    if np is not None:
+        return np.asarray(samples, dtype=np.uint8) * np.uint8(factor)
+    return array('B', (v * factor for v in samples))
@@ -0,0 +1,148 @@
+import json
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# stages in pipeline order
+STAGES = ('read', 'inflate', 'unfilter', 'filter', 'deflate', 'write')
+
+
+@dataclass
+class StageRecord:
+    """
+    One run of a stage, given to the hooks.
+    """
+    name: str
+    seconds: float
+    bytes_in: int
+    bytes_out: int
+    # bytes allocated at the peak of the stage, None when memory is not traced
+    peak_memory: Optional[int] = None
+
+
+@dataclass
+class StageStats:
+    calls: int = 0
+    seconds: float = 0.0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    peak_memory: Optional[int] = None
+
+    def add(self, record: StageRecord) -> None:
+        self.calls += 1
+        self.seconds += record.seconds
+        self.bytes_in += record.bytes_in
+        self.bytes_out += record.bytes_out
+        if record.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, record.peak_memory)
+
+
+class _Measure:
+    # context of one stage run, set `bytes_out` before leaving
+    __slots__ = ('stats', 'name', 'bytes_in', 'bytes_out', '_start', '_memory')
+
+    def __init__(self, stats: 'Stats', name: str, bytes_in: int) -> None:
+        self.stats = stats
+        self.name = name
+        self.bytes_in = bytes_in
+        self.bytes_out = 0
+        self._start = 0.0
+        self._memory = 0
+
+    def __enter__(self) -> '_Measure':
+        if self.stats.trace_memory:
+            # python 3.9+, older versions report the peak since tracing started
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, type_, value, traceback) -> None:
+        seconds = time.perf_counter() - self._start
+        peak = None
+        if self.stats.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1] - self._memory
+        self.stats.record(StageRecord(self.name, seconds, self.bytes_in, self.bytes_out, peak))
+
+
+class _NoMeasure:
+    # shared do nothing context used when stats are disabled
+    __slots__ = ('bytes_in', 'bytes_out')
+
+    def __enter__(self) -> '_NoMeasure':
+        return self
+
+    def __exit__(self, type_, value, traceback) -> None:
+        pass
+
+
+_NO_MEASURE = _NoMeasure()
+
+
+class Stats:
+    """
+    Wall time, bytes in and out and optionally allocation peaks of each stage.
+
+    Give it to PngParser(stats=...), hooks are called with a StageRecord after
+    each stage run. Memory tracing uses tracemalloc and slows the stages down.
+    """
+
+    def __init__(self, trace_memory: bool = False,
+                 hooks: Optional[List[Callable[[StageRecord], None]]] = None) -> None:
+        self.stages: Dict[str, StageStats] = {}
+        self.hooks: List[Callable[[StageRecord], None]] = list(hooks or [])
+
+        self.trace_memory = trace_memory
+        self._tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._tracing:
+            tracemalloc.start()
+
+    def close(self) -> None:
+        """
+        Stop tracing memory if it was started here.
+        """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+        self.trace_memory = False
+
+    def add_hook(self, hook: Callable[[StageRecord], None]) -> None:
+        self.hooks.append(hook)
+
+    def stage(self, name: str, bytes_in: int = 0) -> _Measure:
+        return _Measure(self, name, bytes_in)
+
+    def record(self, record: StageRecord) -> None:
+        self.stages.setdefault(record.name, StageStats()).add(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: asdict(stage) for name, stage in self._ordered()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_dict())
+
+    def _ordered(self):
+        order = {name: idx for idx, name in enumerate(STAGES)}
+        return sorted(self.stages.items(), key=lambda item: order.get(item[0], len(order)))
+
+    def report(self) -> str:
+        lines = [f'{"stage":<10} {"calls":>5} {"ms":>10} {"in MB":>9} {"out MB":>9} {"MB/s":>9} {"peak MB":>9}']
+        for name, stage in self._ordered():
+            rate = max(stage.bytes_in, stage.bytes_out) / 1e6 / stage.seconds if stage.seconds else 0.0
+            peak = f'{stage.peak_memory / 1e6:9.2f}' if stage.peak_memory is not None else f'{"-":>9}'
+            lines.append(f'{name:<10} {stage.calls:>5} {stage.seconds * 1000:10.2f} '
+                         f'{stage.bytes_in / 1e6:9.2f} {stage.bytes_out / 1e6:9.2f} {rate:9.1f} {peak}')
+        return '\n'.join(lines)
+
+
+def measure(stats: Optional[Stats], name: str, bytes_in: int = 0):
+    """
+    Context measuring a stage, costs nothing when `stats` is None.
+    """
+    if stats is None:
+        return _NO_MEASURE
+    return stats.stage(name, bytes_in)
@@ -20,11 +20,14 @@ setup(
     author_email='contact@nathanryd.in',
     description='Parser PNG',
     long_description=__doc__,
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     include_package_data=True,
     zip_safe=False,
     platforms='any',
     install_requires=dependencies,
+    extras_require={
+        'numpy': ['numpy'],
+    },
     python_requires=">=3.6",
     entry_points={
         'console_scripts': [
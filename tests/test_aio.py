@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+import pngparser
+from pngparser import AsyncPngParser
+
+from .test_functional import SIMPLE_PNG
+
+
+async def iter_blocks(data, size):
+    for i in range(0, len(data), size):
+        await asyncio.sleep(0)
+        yield data[i:i + size]
+
+
+def read_example(name):
+    with open(f'example/{name}', 'rb') as f:
+        return f.read()
+
+
+class TestCaseAsync(unittest.TestCase):
+
+    def test_scanlines_from_iterator(self):
+        for name in ('grayscale.png', 'interlaced.png'):
+            with self.subTest(name=name):
+                data = read_example(name)
+                with pngparser.PngParser(f'example/{name}') as png:
+                    expected = [(s.filter, bytes(s.data)) for s in png.iter_scanlines()]
+                    types = [c.type for c in png.chunks if c.type != b'IDAT']
+
+                async def decode():
+                    parser = AsyncPngParser(iter_blocks(data, 1000), read_size=4096)
+                    rows = [(s.filter, bytes(s.data)) async for s in parser.iter_scanlines()]
+                    return parser, rows
+
+                parser, rows = asyncio.run(decode())
+                self.assertEqual(rows, expected)
+                self.assertEqual([c.type for c in parser.chunks], types)
+                self.assertTrue(parser.ended)
+
+    def test_header_before_data(self):
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(SIMPLE_PNG[:40])
+            parser = AsyncPngParser(reader)
+            header = await parser.read_header()
+
+            reader.feed_data(SIMPLE_PNG[40:])
+            reader.feed_eof()
+            chunks = [c.type async for c in parser.iter_chunks()]
+            return header, chunks
+
+        header, chunks = asyncio.run(run())
+        self.assertEqual(header.type, b'IHDR')
+        self.assertEqual(chunks, [b'IDAT', b'IEND'])
+
+    def test_not_png(self):
+        async def run():
+            await AsyncPngParser(iter_blocks(b'GIF89a' + bytes(40), 8)).read_header()
+
+        with self.assertRaises(Exception):
+            asyncio.run(run())
+
+    def test_truncated(self):
+        async def run():
+            parser = AsyncPngParser(iter_blocks(SIMPLE_PNG[:-20], 8))
+            return [s async for s in parser.iter_scanlines()]
+
+        with self.assertRaises(EOFError):
+            asyncio.run(run())
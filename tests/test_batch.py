@@ -0,0 +1,56 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from pngparser.batch import analyse_file, run_batch
+from pngparser.cli import batch_main
+
+from .test_functional import SIMPLE_PNG
+
+
+class TestCaseBatch(unittest.TestCase):
+
+    def test_record(self):
+        record = analyse_file('example/grayscale.png')
+
+        self.assertEqual(record['header']['width'], 393)
+        self.assertEqual(len(record['chunks']), 12)
+        self.assertTrue(all(c['crc_ok'] for c in record['chunks']))
+        self.assertEqual(len(record['text']), 2)
+        json.dumps(record)
+
+    def test_bad_crc_and_errors(self):
+        broken = bytearray(SIMPLE_PNG)
+        broken[30] ^= 0xff  # IHDR crc
+        with tempfile.NamedTemporaryFile(suffix='.png') as tmp_file:
+            tmp_file.write(broken)
+            tmp_file.flush()
+            record = analyse_file(tmp_file.name)
+        self.assertEqual([c['crc_ok'] for c in record['chunks']], [False, True, True])
+
+        self.assertIn('error', analyse_file('README.md'))
+
+    def test_run_batch(self):
+        output = io.StringIO()
+        summary = run_batch(['example', 'missing.png'], output, workers=2)
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(len(records), 7)
+        self.assertEqual(summary['files'], 7)
+        self.assertEqual(summary['errors'], 1)
+
+    def test_file_list_and_output(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            list_path = os.path.join(tmp_dir, 'files.txt')
+            output_path = os.path.join(tmp_dir, 'records.jsonl')
+            with open(list_path, 'w', encoding='utf-8') as list_file:
+                list_file.write('example/grayscale.png\n\nmissing.png\n')
+
+            with redirect_stdout(io.StringIO()):
+                batch_main(['--file-list', list_path, '--output', output_path])
+            with open(output_path, encoding='utf-8') as output:
+                records = [json.loads(line) for line in output]
+        self.assertEqual(len(records), 2)
@@ -0,0 +1,35 @@
+import io
+import tempfile
+import unittest
+
+from PIL import Image as PilImage
+
+import pngparser
+from benchmarks import corpus
+from benchmarks.run import STAGES, bench_file, compare
+
+
+class TestCaseBenchmarks(unittest.TestCase):
+
+    def test_corpus_is_valid(self):
+        for case in corpus.iter_cases(('icon',)):
+            with self.subTest(case=case.name):
+                data = corpus.make_png(case)
+                PilImage.open(io.BytesIO(data)).load()
+
+                img = pngparser.PngParser(io.BytesIO(data)).get_image_data()
+                self.assertEqual(len(img.get_image_buffer()), img.header.row_length() * 16)
+                self.assertEqual(data, corpus.make_png(case))
+
+    def test_bench_and_compare(self):
+        case = corpus.Case('icon', 2, 8, 1, 'split')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            [(_, path)] = corpus.generate(tmp_dir, [case])
+            stages = bench_file(path, 1)
+        self.assertEqual(tuple(stages), STAGES)
+
+        report = {'results': [{'case': case.name, 'stages': stages}]}
+        slower = {'results': [{'case': case.name, 'stages': {
+            s: {'min': v['min'] * 2, 'median': v['median'] * 2} for s, v in stages.items()}}]}
+        self.assertEqual(compare(report, report, 1.2), [])
+        self.assertEqual(len(compare(slower, report, 1.2)), len(STAGES))
@@ -0,0 +1,82 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import pngparser
+from pngparser.cache import ImageCache, image_size
+
+from .test_functional import SIMPLE_PNG
+
+
+class TestCaseImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = pngparser.enable_image_cache(max_entries=4)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'image.png')
+        shutil.copy('example/grayscale.png', self.path)
+
+    def tearDown(self):
+        pngparser.disable_image_cache()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_shared_between_parsers(self):
+        with pngparser.PngParser(self.path) as png:
+            first = png.get_image_data()
+        with pngparser.PngParser(self.path, lazy=True) as png:
+            self.assertIs(png.get_image_data(), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_streams_by_content(self):
+        first = pngparser.PngParser(io.BytesIO(SIMPLE_PNG)).get_image_data()
+        self.assertIs(pngparser.PngParser(io.BytesIO(SIMPLE_PNG)).get_image_data(), first)
+
+        other = bytearray(SIMPLE_PNG)
+        other[-13] ^= 1  # IEND crc
+        self.assertIsNot(pngparser.PngParser(io.BytesIO(bytes(other))).get_image_data(), first)
+
+    def test_invalidate_on_change(self):
+        with pngparser.PngParser(self.path) as png:
+            img = png.get_image_data()
+            png.set_image_data(img, filter_strategy='minsum')
+            self.assertEqual(len(self.cache), 0)
+            # the parser image is no longer the file one
+            self.assertIsNot(png.get_image_data(), img)
+            self.assertEqual(len(self.cache), 0)
+            png.save_file(self.path)
+
+        with pngparser.PngParser(self.path) as png:
+            self.assertIsNot(png.get_image_data(), img)
+
+    def test_disabled(self):
+        pngparser.disable_image_cache()
+        with pngparser.PngParser(self.path) as png:
+            self.assertIsNot(png.get_image_data(), png.get_image_data())
+
+
+class TestCaseLru(unittest.TestCase):
+
+    class Image:
+        def __init__(self, size):
+            self.data = bytes(size)
+
+    def test_limits(self):
+        cache = ImageCache(max_entries=2, max_bytes=100)
+        a, b, c = self.Image(10), self.Image(10), self.Image(10)
+        cache.put('a', a)
+        cache.put('b', b)
+        self.assertIs(cache.get('a'), a)
+        cache.put('c', c)
+        # b is the least recently used
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(len(cache), 2)
+
+        cache.put('big', self.Image(40))
+        self.assertIsNone(cache.get('a'))
+        self.assertLessEqual(cache.size, 100)
+
+        cache.put('huge', self.Image(60))
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(cache.size, image_size(c) + 80)
@@ -0,0 +1,44 @@
+import os
+import random
+import unittest
+import zlib
+from unittest import mock
+
+import pngparser
+from pngparser import TYPE_IDAT, compress
+from pngparser.compress import adler32_combine, parallel_compress
+
+
+class TestCaseParallelCompress(unittest.TestCase):
+
+    def test_adler32_combine(self):
+        a, b = os.urandom(1000), os.urandom(777)
+        self.assertEqual(adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b)), zlib.adler32(a + b))
+
+    def test_valid_zlib_stream(self):
+        rng = random.Random(5)
+        data = bytes(rng.randrange(8) for _ in range(300000))
+        for level in (1, 6, 9, zlib.Z_DEFAULT_COMPRESSION):
+            with self.subTest(level=level):
+                compressed = parallel_compress(data, level, threads=4, block_size=50000)
+                self.assertEqual(zlib.decompress(compressed), data)
+
+    def test_one_thread_per_core(self):
+        data = bytes(100000)
+        with mock.patch.object(compress.os, 'cpu_count', return_value=3), \
+                mock.patch.object(compress, 'ThreadPoolExecutor', wraps=compress.ThreadPoolExecutor) as executor:
+            self.assertEqual(zlib.decompress(parallel_compress(data, block_size=10000)), data)
+            # no more threads than blocks
+            parallel_compress(data, threads=16, block_size=50000)
+        self.assertEqual([c.kwargs['max_workers'] for c in executor.call_args_list], [3, 2])
+
+    def test_set_image_data_multiple_idats(self):
+        with pngparser.PngParser('example/normal.png') as png:
+            img = png.get_image_data()
+            expected = img.data
+            png.set_image_data(img, threads=4, block_size=64 * 1024, idat_size=8192)
+
+            idats = png.get_by_type(TYPE_IDAT)
+            self.assertGreater(len(idats), 1)
+            self.assertTrue(all(len(c.data) <= 8192 for c in idats))
+            self.assertEqual(png.get_image_data().data, expected)
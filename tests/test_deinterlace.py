@@ -0,0 +1,79 @@
+import random
+import struct
+import unittest
+import zlib
+from io import BytesIO
+
+import pngparser
+from pngparser import imagedata
+
+ADAM7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+
+def chunk(type_, data):
+    return struct.pack('>I', len(data)) + type_ + data + struct.pack('>I', zlib.crc32(type_ + data))
+
+
+def pack_row(pixels, depth, samples):
+    if depth >= 8:
+        size = depth // 8
+        return b''.join(v.to_bytes(size, 'big') for px in pixels for v in px)
+    bits = ''.join(format(px[0], f'0{depth}b') for px in pixels)
+    bits += '0' * (-len(bits) % 8)
+    return bytes(int(bits[i:i+8], 2) for i in range(0, len(bits), 8))
+
+
+def make_png(width, height, depth, color_type, interlace, seed=0):
+    """
+    Build a PNG of random pixels, return its bytes and the expected image buffer.
+    """
+    rng = random.Random(seed)
+    samples = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    image = [[tuple(rng.randrange(1 << depth) for _ in range(samples)) for _ in range(width)]
+             for _ in range(height)]
+
+    raw = bytearray()
+    if interlace:
+        for xstart, ystart, xstep, ystep in ADAM7:
+            if xstart >= width:
+                continue
+            for y in range(ystart, height, ystep):
+                raw += b'\x00' + pack_row(image[y][xstart::xstep], depth, samples)
+    else:
+        for row in image:
+            raw += b'\x00' + pack_row(row, depth, samples)
+
+    ihdr = struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, interlace)
+    data = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr)
+    if color_type == 3:
+        data += chunk(b'PLTE', bytes(range(256)) * 3)
+    data += chunk(b'IDAT', zlib.compress(bytes(raw))) + chunk(b'IEND', b'')
+
+    expected = b''.join(pack_row(row, depth, samples) for row in image)
+    return data, expected
+
+
+class TestCaseDeinterlace(unittest.TestCase):
+
+    def check(self, width, height, depth, color_type):
+        data, expected = make_png(width, height, depth, color_type, 1)
+        img = pngparser.PngParser(BytesIO(data)).get_image_data()
+
+        self.assertEqual(img.get_image_buffer(), expected)
+        self.assertEqual(imagedata._scatter_python(img.header, img.scanlines), expected)
+
+    def test_sub_byte_depths(self):
+        for depth in (1, 2, 4):
+            for width, height in ((1, 1), (3, 5), (13, 9), (17, 17)):
+                with self.subTest(depth=depth, width=width, height=height):
+                    self.check(width, height, depth, 0)
+
+    def test_byte_depths(self):
+        for depth, color_type in ((8, 2), (8, 6), (16, 0), (16, 6), (8, 3)):
+            with self.subTest(depth=depth, color_type=color_type):
+                self.check(11, 7, depth, color_type)
+
+    def test_non_interlaced(self):
+        data, expected = make_png(9, 4, 2, 0, 0)
+        img = pngparser.PngParser(BytesIO(data)).get_image_data()
+        self.assertEqual(img.get_image_buffer(), expected)
@@ -0,0 +1,62 @@
+import io
+import unittest
+
+import pngparser
+from pngparser.events import iter_chunks
+
+from .test_functional import SIMPLE_PNG
+from .test_probe import NoSeekStream
+
+
+class TestCaseEvents(unittest.TestCase):
+
+    def test_matches_parser(self):
+        with pngparser.PngParser('example/grayscale.png') as png:
+            expected = [(c.type, bytes(c.data), png.get_pos(c)[0]) for c in png.chunks]
+
+        for seekable in (True, False):
+            with self.subTest(seekable=seekable), open('example/grayscale.png', 'rb') as f:
+                stream = f if seekable else NoSeekStream(f.read())
+                events = []
+                for event in iter_chunks(stream):
+                    events.append((event.type, event.read(), event.offset))
+                    self.assertTrue(event.crc_ok)
+                # the first position of the parser includes the signature
+                self.assertEqual(events[1:], expected[1:])
+                self.assertEqual(events[0][:2], expected[0][:2])
+
+    def test_skip_and_stop(self):
+        stream = NoSeekStream(SIMPLE_PNG)
+        events = iter_chunks(stream)
+        ihdr = next(events)
+        self.assertIsNone(ihdr.crc_ok)
+
+        idat = next(events)
+        self.assertEqual(idat.type, b'IDAT')
+        self.assertEqual(idat.offset, ihdr.end)
+        self.assertEqual(b''.join(idat.iter_payload(3)), SIMPLE_PNG[idat.offset + 8:idat.end - 4])
+        self.assertEqual([e.type for e in events], [b'IEND'])
+
+    def test_partial_read(self):
+        for seekable in (True, False):
+            with self.subTest(seekable=seekable):
+                stream = io.BytesIO(SIMPLE_PNG) if seekable else NoSeekStream(SIMPLE_PNG)
+                types = []
+                for event in iter_chunks(stream):
+                    types.append((event.type, event.length))
+                    if event.type == b'IDAT':
+                        payload = event.iter_payload(4)
+                        self.assertEqual(next(payload), SIMPLE_PNG[event.offset + 8:event.offset + 12])
+                        self.assertEqual(event.remaining, event.length - 4 + 4)
+                        # stop reading the payload and move on
+                self.assertEqual(types, [(b'IHDR', 13), (b'IDAT', 21), (b'IEND', 0)])
+
+    def test_bad_crc_and_truncated(self):
+        broken = bytearray(SIMPLE_PNG)
+        broken[30] ^= 0xff  # IHDR crc
+        events = [(e.type, e.read(), e.crc_ok) for e in iter_chunks(io.BytesIO(bytes(broken[:-6])))]
+        self.assertEqual([(t, ok) for t, _, ok in events], [(b'IHDR', False), (b'IDAT', True)])
+
+    def test_not_png(self):
+        with self.assertRaises(Exception):
+            next(iter_chunks(io.BytesIO(b'not a png')))
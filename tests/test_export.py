@@ -0,0 +1,105 @@
+import unittest
+from io import BytesIO
+
+from PIL import Image as PilImage
+
+import pngparser
+from pngparser import samples
+
+from .test_deinterlace import make_png
+from .test_palette import ALPHA, PALETTE, make_indexed_png
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+class TestCaseExport(unittest.TestCase):
+
+    def test_to_numpy(self):
+        if np is None:
+            self.skipTest('numpy not installed')
+
+        for depth, color_type, interlace in ((8, 2, 0), (16, 6, 0), (2, 0, 1), (8, 4, 1)):
+            with self.subTest(depth=depth, color_type=color_type, interlace=interlace):
+                data, expected = make_png(10, 7, depth, color_type, interlace)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+                pixel_len = img.header.pixel_len
+
+                array = img.to_numpy()
+                self.assertEqual(array.shape, (7, 10, pixel_len))
+
+                stride = img.header.row_length()
+                values = []
+                for y in range(7):
+                    row = samples.unpack_samples(expected[y * stride:(y + 1) * stride], depth)
+                    values += list(row[:10 * pixel_len])
+                self.assertEqual(array.reshape(-1).tolist(), values)
+                self.assertEqual(np.asarray(img).tolist(), array.tolist())
+
+    def test_array_interface_no_copy(self):
+        if np is None:
+            self.skipTest('numpy not installed')
+
+        data, _ = make_png(4, 3, 8, 2, 0)
+        img = pngparser.PngParser(BytesIO(data)).get_image_data()
+        array = np.asarray(img)
+        self.assertFalse(array.flags.owndata)
+
+    def test_buffer_shared_with_scanlines(self):
+        data, expected = make_png(4, 3, 8, 2, 0)
+        img = pngparser.PngParser(BytesIO(data)).get_image_data()
+        buffer = img.get_image_buffer()
+        self.assertEqual(bytes(buffer), expected)
+        self.assertIs(img.get_image_buffer(), buffer)
+
+        # edits in place are seen from both sides
+        img.scanlines[1].data[0] = 255
+        self.assertEqual(buffer[12], 255)
+        buffer[0] = 7
+        self.assertEqual(img.scanlines[0].data[0], 7)
+
+        # a replaced row gives a new buffer
+        img.scanlines[2].data = bytes(12)
+        rebuilt = img.get_image_buffer()
+        self.assertIsNot(rebuilt, buffer)
+        self.assertEqual(bytes(rebuilt), b'\x07' + expected[1:12] + b'\xff' + expected[13:24] + bytes(12))
+        self.assertIs(img.get_image_buffer(), rebuilt)
+
+    def test_scanlines_are_views(self):
+        for interlace in (0, 1):
+            with self.subTest(interlace=interlace):
+                data, _ = make_png(5, 4, 8, 2, interlace)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+                self.assertTrue(all(isinstance(sc.data, memoryview) for sc in img.scanlines))
+                self.assertTrue(all(isinstance(sc.data, memoryview) for sc in img.preview(2).scanlines))
+
+                # the first pixel is in the first scanline of both layouts
+                img.scanlines[0].data[0] = 255
+                self.assertEqual(img.get_image_buffer()[0], 255)
+                # re-encoded with a previous row shorter than the scanline
+                img.scanlines[0].data = img.scanlines[0].data[:2]
+                self.assertEqual(img.to_bytes()[0], img.scanlines[0].filter)
+
+    def test_to_pil(self):
+        for depth, color_type in ((8, 2), (8, 6), (16, 0), (16, 2), (1, 0), (4, 0)):
+            with self.subTest(depth=depth, color_type=color_type):
+                data, _ = make_png(10, 7, depth, color_type, 0)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+                pil_ref = PilImage.open(BytesIO(data))
+                pil_img = img.to_pil()
+                self.assertEqual(pil_img.size, (10, 7))
+                if depth == 16 and color_type != 0:
+                    pil_ref = pil_ref.convert(pil_img.mode)
+                else:
+                    self.assertEqual(pil_img.mode, pil_ref.mode)
+                self.assertEqual(pil_img.tobytes(), pil_ref.tobytes())
+
+    def test_to_pil_palette(self):
+        data, indices = make_indexed_png(9, 4, 4, ALPHA)
+        pil_img = pngparser.PngParser(BytesIO(data)).get_image_data().to_pil()
+        self.assertEqual(pil_img.mode, 'P')
+        self.assertEqual(pil_img.getpixel((3, 2)), indices[2][3])
+        self.assertEqual(pil_img.convert('RGBA').getpixel((3, 2)),
+                         PALETTE[indices[2][3]] + (ALPHA[indices[2][3]] if indices[2][3] < len(ALPHA) else 255,))
@@ -0,0 +1,163 @@
+import random
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from pngparser import filters, imagedata
+import pngparser
+from pngparser.imagedata import apply_filter, undo_filter
+
+
+def predictor(filter_type, a, b, c):
+    # predictor of a byte from its left, up and upper left neighbours, PNG specification 9.2
+    if filter_type == 4:
+        p = a + b - c
+        pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+        if pa <= pb and pa <= pc:
+            return a
+        return b if pb <= pc else c
+    return (0, a, b, (a + b) >> 1)[filter_type] if filter_type < 4 else 0
+
+
+def reference_filter(filter_type, raw, previous, fu):
+    previous = previous or bytes(len(raw))
+    return bytes((x - predictor(filter_type, raw[i - fu] if i >= fu else 0, previous[i],
+                                previous[i - fu] if i >= fu else 0)) & 0xff
+                 for i, x in enumerate(raw))
+
+
+def reference_unfilter(header, data, row_size):
+    fu = header.filter_unit
+    rows = []
+    recon = None
+    for cursor in range(0, len(data), row_size + 1):
+        filter_type = data[cursor]
+        raw = data[cursor + 1:cursor + 1 + row_size]
+        previous = recon or bytes(len(raw))
+        row = bytearray(raw)
+        for i, x in enumerate(raw):
+            a, c = (row[i - fu], previous[i - fu]) if i >= fu else (0, 0)
+            row[i] = (x + predictor(filter_type, a, previous[i], c)) & 0xff
+        recon = row
+        rows.append((filter_type, recon))
+    return rows
+
+
+def random_filtered_data(rng, rows, row_size, filters_choice=(0, 1, 2, 3, 4)):
+    data = bytearray()
+    for _ in range(rows):
+        data.append(rng.choice(filters_choice))
+        data += bytes(rng.randrange(256) for _ in range(row_size))
+    return bytes(data)
+
+
+class TestCaseUnfilter(unittest.TestCase):
+
+    def check_engines(self, data, row_size, pixel_len):
+        fu = max(1, pixel_len)
+        header = SimpleNamespace(filter_unit=fu)
+        expected = reference_unfilter(header, data, row_size)
+
+        self.assertEqual(filters._unfilter_python(data, row_size, fu), expected)
+        image = ([f for f, _ in expected], bytearray().join(recon for _, recon in expected))
+        with mock.patch.object(filters, 'HAS_NUMPY', False):
+            self.assertEqual(filters.unfilter_image(header, data, row_size), image)
+        if filters.HAS_NUMPY:
+            self.assertEqual(filters._unfilter_numpy(data, row_size, fu), image)
+            self.assertEqual(filters.unfilter_scanlines(header, data, row_size), expected)
+
+    def test_all_filters_and_pixel_sizes(self):
+        rng = random.Random(1)
+        for pixel_len in (1, 2, 3, 4):
+            for width in (1, 2, 7, 33):
+                row_size = width * pixel_len
+                data = random_filtered_data(rng, 20, row_size)
+                with self.subTest(pixel_len=pixel_len, width=width):
+                    self.check_engines(data, row_size, pixel_len)
+
+    def test_runs_of_same_filter(self):
+        rng = random.Random(2)
+        for filter_type in range(5):
+            data = random_filtered_data(rng, 12, 15, (filter_type,))
+            with self.subTest(filter_type=filter_type):
+                self.check_engines(data, 15, 3)
+
+    def test_truncated_last_row(self):
+        rng = random.Random(3)
+        data = random_filtered_data(rng, 6, 12)
+        for cut in (1, 5, 13):
+            with self.subTest(cut=cut):
+                self.check_engines(data[:-cut], 12, 4)
+
+    def test_unknown_filter_is_kept(self):
+        data = bytes([7, 1, 2, 3, 2, 1, 1, 1])
+        self.check_engines(data, 3, 1)
+
+    def test_unfilter_row(self):
+        rng = random.Random(6)
+        for fu in (1, 2, 3, 4):
+            for size in (0, fu, 12, 13):
+                raw = rng.randbytes(size)
+                for previous in (None, rng.randbytes(size), rng.randbytes(size // 2)):
+                    for filter_type in range(5):
+                        with self.subTest(fu=fu, size=size, filter_type=filter_type):
+                            row = filters.unfilter_row(filter_type, raw, previous, fu)
+                            with mock.patch.object(filters, 'HAS_NUMPY', False):
+                                self.assertEqual(row, filters.unfilter_row(filter_type, raw, previous, fu))
+
+
+class TestCaseFilterSelection(unittest.TestCase):
+
+    def test_candidates_match_apply_filter(self):
+        rng = random.Random(4)
+        header = SimpleNamespace(filter_unit=3)
+        raw = bytes(rng.randrange(256) for _ in range(30))
+        previous = bytes(rng.randrange(256) for _ in range(30))
+
+        expected = [reference_filter(f, raw, previous, 3) for f in range(5)]
+        self.assertEqual(filters._candidates_python(raw, previous, 3), expected)
+        if filters.HAS_NUMPY:
+            self.assertEqual(filters._candidates_numpy(raw, previous, 3), expected)
+
+    def test_apply_and_undo_filter(self):
+        rng = random.Random(5)
+        header = SimpleNamespace(filter_unit=2)
+        raw = rng.randbytes(14)
+        for previous in (None, rng.randbytes(14), memoryview(rng.randbytes(9))):
+            padded = bytes(previous or b'') + bytes(14 - len(previous or b''))
+            for filter_type in range(6):
+                with self.subTest(previous=previous, filter_type=filter_type):
+                    filtered = apply_filter(header, filter_type, raw, previous)
+                    self.assertEqual(bytes(filtered), reference_filter(filter_type, raw, padded, 2))
+                    self.assertEqual(undo_filter(header, filter_type, filtered, previous), raw)
+
+    def test_strategies_round_trip(self):
+        with pngparser.PngParser('example/grayscale.png') as png:
+            img = png.get_image_data()
+        expected = [bytes(s.data) for s in img.scanlines]
+
+        for strategy in ('minsum', 'deflate'):
+            with self.subTest(strategy=strategy):
+                encoded = pngparser.ImageData(img.header, img.to_bytes(strategy))
+                self.assertEqual([bytes(s.data) for s in encoded.scanlines], expected)
+
+    def test_deflate_uses_compression_level(self):
+        with pngparser.PngParser('example/grayscale.png') as png:
+            img = png.get_image_data()
+            with mock.patch.object(imagedata, 'FilterChooser', wraps=filters.FilterChooser) as chooser:
+                png.set_image_data(img, filter_strategy='deflate', level=3)
+        chooser.assert_called_once_with('deflate', img.header.filter_unit, 3)
+
+    def test_assigned_filter_is_kept(self):
+        with pngparser.PngParser('example/grayscale.png') as png:
+            img = png.get_image_data()
+        img.scanlines[3].filter = 0
+        img.scanlines[5].filter = 3
+
+        encoded = pngparser.ImageData(img.header, img.to_bytes('minsum'))
+        self.assertEqual(encoded.scanlines[3].filter, 0)
+        self.assertEqual(encoded.scanlines[5].filter, 3)
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            filters.FilterChooser('fastest', 1)
@@ -0,0 +1,53 @@
+import unittest
+
+from pngparser.image import Image
+from pngparser.pixel import Pixel
+
+
+class TestCaseImage(unittest.TestCase):
+
+    def test_pixels(self):
+        img = Image(6, 4, 3)
+        self.assertEqual(img.shape, (3, 4, 4))
+        self.assertEqual(len(img.data), 48)
+
+        img.putpixel((3, 2), (1, 2, 3, 4))
+        img.putpixel((0, 1), Pixel(6, [5, 6, 7, 8]))
+        self.assertEqual(img.getpixel((3, 2)), (1, 2, 3, 4))
+        self.assertEqual(img.getpixel((0, 1)), (5, 6, 7, 8))
+        self.assertEqual(img.get_pixel_object((0, 1)), Pixel(6, [5, 6, 7, 8]))
+        self.assertEqual(img.getpixel((1, 1)), (0, 0, 0, 0))
+
+        with self.assertRaises(IndexError):
+            img.getpixel((4, 0))
+
+    def test_pixel_size(self):
+        img = Image(2, 3, 2)
+        for pixel in ((1, 2), (1, 2, 3, 4), Pixel(6, [1, 2, 3, 4])):
+            with self.subTest(pixel=pixel):
+                with self.assertRaises(ValueError):
+                    img.putpixel((1, 1), pixel)
+        self.assertEqual(img.data, bytearray(18))
+
+    def test_regions(self):
+        img = Image(0, 5, 4)
+        img.set_region((1, 1, 3, 2), bytes(range(6)))
+
+        self.assertEqual(img.get_region((1, 1, 3, 2)), bytes(range(6)))
+        self.assertEqual(img.get_region((0, 2, 5, 1)), b'\x00\x03\x04\x05\x00')
+        with self.assertRaises(IndexError):
+            img.get_region((3, 0, 3, 1))
+        for data in (b'\x00', bytes(5)):
+            with self.assertRaises(ValueError):
+                img.set_region((0, 0, 2, 2), data)
+        self.assertEqual(len(img.data), 20)
+
+    def test_pixel_operations(self):
+        a, b, c = Pixel(2, [10, 200, 30]), Pixel(2, [250, 100, 40]), Pixel(2, [5, 5, 5])
+
+        self.assertEqual((a + b).values, (4, 44, 70))
+        self.assertEqual((a - b).values, (16, 100, 246))
+        self.assertEqual(c.add_mean(a, b).values, (135, 155, 40))
+        self.assertEqual(Pixel.peath(a, b, c).values, (250, 200, 40))
+        with self.assertRaises(AttributeError):
+            a.extra = 1
@@ -0,0 +1,131 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pngparser
+from pngparser import TYPE_IDAT, TYPE_IEND, TYPE_tEXt, TYPE_tIME, ChunkRaw, journal, png as png_module
+from pngparser.journal import commit_journal, journal_path, replay_journal, write_journal
+
+
+class TestCaseInPlace(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'image.png')
+        shutil.copy('example/grayscale.png', self.path)
+        with open(self.path, 'rb') as f:
+            self.content = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def assert_valid(self):
+        with pngparser.PngParser(self.path) as png:
+            self.assertTrue(all(png.verify_crc(i) for i in range(len(png.chunks_index))))
+            self.assertEqual(png.get_all()[-1].type, TYPE_IEND)
+            return [(c.type, bytes(c.data) if c.type == TYPE_IDAT else None) for c in png.get_all()]
+
+    def test_patch_same_size(self):
+        with pngparser.PngParser(self.path, lazy=True) as png:
+            time_chunk = png.get_by_type(TYPE_tIME)[0]
+            time_chunk.datetime = datetime.datetime(2020, 1, 2, 3, 4, 5)
+            text = png.get_by_type(TYPE_tEXt)[0]
+            text.text = text.text[::-1]
+
+            pos = list(png.chunks_index)
+            png.save_in_place()
+            self.assertFalse(time_chunk.dirty)
+
+        content = self.read()
+        self.assertEqual(len(content), len(self.content))
+        changed = [i for i, (a, b) in enumerate(zip(content, self.content)) if a != b]
+        time_idx = [c[2] for c in pos].index(TYPE_tIME)
+        self.assertGreaterEqual(changed[0], pos[time_idx][0])
+        self.assertFalse(os.path.exists(journal_path(self.path)))
+
+        with pngparser.PngParser(self.path) as png:
+            self.assertEqual(png.get_by_type(TYPE_tIME)[0].datetime.year, 2020)
+        self.assert_valid()
+
+    def test_append_chunk_rewrites_tail(self):
+        with pngparser.PngParser(self.path, lazy=True) as png:
+            png.add_chunk(pngparser.ChunkText(TYPE_tEXt, b'Tag\x00value', None))
+            png.save_in_place()
+
+            self.assertEqual(png.get_by_type(TYPE_tEXt)[-1].text, 'value')
+
+        content = self.read()
+        iend = len(self.content) - 12
+        self.assertEqual(content[:iend], self.content[:iend])
+        self.assertEqual(content[-12:], self.content[-12:])
+        self.assert_valid()
+
+    def test_insert_before_image_data(self):
+        with pngparser.PngParser(self.path) as png:
+            expected = [(c.type, bytes(c.data) if c.type == TYPE_IDAT else None) for c in png.get_all()]
+            png.add_chunk(ChunkRaw(b'teSt', b'data'), 1)
+            png.save_in_place()
+
+        expected.insert(1, (b'teSt', None))
+        self.assertEqual(self.assert_valid(), expected)
+
+    def test_replay_committed_journal(self):
+        write_journal(self.path, len(self.content) - 12, [(0, 4, b'\x00PNG')], lambda f, p: f.write(p)).close()
+        with open(journal_path(self.path), 'rb') as f:
+            content = f.read()
+
+        # interrupted before the commit marker
+        with open(journal_path(self.path), 'wb') as f:
+            f.write(content[:-4])
+        self.assertFalse(replay_journal(self.path))
+        self.assertEqual(self.read(), self.content)
+        if journal.fcntl is not None:
+            # its writer is gone since nothing holds its lock
+            self.assertFalse(os.path.exists(journal_path(self.path)))
+
+        with open(journal_path(self.path), 'wb') as f:
+            f.write(content)
+        with self.assertRaises(Exception):
+            pngparser.PngParser(self.path)
+        self.assertEqual(self.read(), b'\x00PNG' + self.content[4:-12])
+        self.assertFalse(os.path.exists(journal_path(self.path)))
+
+    @unittest.skipIf(journal.fcntl is None, 'needs file locks')
+    def test_reader_leaves_journal_in_progress(self):
+        locked = write_journal(self.path, len(self.content), [(0, 4, b'\x00PNG')], lambda f, p: f.write(p))
+        # another parser opened while the journal is written or applied
+        self.assertFalse(replay_journal(self.path))
+        with pngparser.PngParser(self.path) as png:
+            self.assertEqual(png.get_all()[-1].type, TYPE_IEND)
+        self.assertTrue(os.path.exists(journal_path(self.path)))
+        self.assertEqual(self.read(), self.content)
+
+        commit_journal(self.path, locked)
+        self.assertEqual(self.read(), b'\x00PNG' + self.content[4:])
+        self.assertFalse(os.path.exists(journal_path(self.path)))
+
+    def test_failed_commit_raises(self):
+        def fail(path, locked):
+            # nothing maps the file written and truncated
+            self.assertTrue(png.reader.closed)
+            locked.close()
+            raise OSError('disk full')
+
+        with pngparser.PngParser(self.path, lazy=True) as png:
+            png.get_by_type(TYPE_tIME)[0].datetime = datetime.datetime(2020, 1, 2, 3, 4, 5)
+            with mock.patch.object(png_module, 'commit_journal', side_effect=fail):
+                with self.assertRaises(OSError):
+                    png.save_in_place()
+        self.assertEqual(self.read(), self.content)
+
+        # replayed on next open
+        with pngparser.PngParser(self.path) as png:
+            self.assertEqual(png.get_by_type(TYPE_tIME)[0].datetime.year, 2020)
+        self.assertFalse(os.path.exists(journal_path(self.path)))
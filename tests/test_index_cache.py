@@ -0,0 +1,93 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pngparser
+from pngparser import cli, png as png_module
+from pngparser.index_cache import IndexCache
+
+
+class TestCaseIndexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'image.png')
+        shutil.copy('example/grayscale.png', self.path)
+        self.cache = IndexCache(os.path.join(self.tmp_dir, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def open(self, **kwargs):
+        return pngparser.PngParser(self.path, index_cache=self.cache, **kwargs)
+
+    def test_reuse_index(self):
+        with pngparser.PngParser(self.path) as png:
+            expected_index = list(png.chunks_index)
+            expected_pos = list(png.chunks_pos)
+            expected_types = [c.type for c in png.chunks]
+
+        with self.open():
+            pass
+        self.assertTrue(os.path.exists(self.cache.entry_path(self.path)))
+
+        with mock.patch.object(pngparser.PngParser, '_read_chunk', side_effect=AssertionError('scan')):
+            for lazy in (True, False):
+                with self.subTest(lazy=lazy), self.open(lazy=lazy) as png:
+                    self.assertEqual(png.chunks_index, expected_index)
+                    self.assertEqual(png.chunks_pos, expected_pos)
+                    self.assertEqual([c.type for c in png.chunks], expected_types)
+                    self.assertIsNotNone(png.get_image_data())
+
+    def test_crc_verdicts(self):
+        with self.open(lazy=True) as png:
+            verdicts = [png.verify_crc(idx) for idx in range(len(png.chunks_index))]
+
+        with self.open(lazy=True) as png, \
+                mock.patch('pngparser.png.zlib.crc32', side_effect=AssertionError('crc')):
+            self.assertEqual([png.verify_crc(idx) for idx in range(len(verdicts))], verdicts)
+
+    def test_cli_crc_from_cache(self):
+        argv = ['png-parser', self.path, '--crc', '--index-cache', self.cache.directory]
+        with mock.patch('sys.argv', argv), mock.patch('sys.stdout', io.StringIO()) as first:
+            cli.main()
+        self.assertIn('CRC :', first.getvalue())
+
+        # verdicts and chunk table come from the cache, no payload is read
+        with mock.patch('sys.argv', argv), mock.patch('sys.stdout', io.StringIO()) as second, \
+                mock.patch.object(pngparser.PngParser, '_load_chunk', side_effect=AssertionError('load')), \
+                mock.patch.object(cli, 'computed_crc', side_effect=AssertionError('crc')), \
+                mock.patch.object(png_module, 'computed_crc', side_effect=AssertionError('crc')):
+            cli.main()
+        # the banner has random colors
+        self.assertEqual(second.getvalue().split('Filename')[1], first.getvalue().split('Filename')[1])
+
+    def test_stale_entry(self):
+        with self.open():
+            pass
+
+        with open(self.path, 'ab') as f:
+            f.write(b'garbage')
+        os.utime(self.path, ns=(0, 0))
+
+        with pngparser.PngParser(self.path) as png:
+            expected_index = list(png.chunks_index)
+        with self.open() as png:
+            self.assertEqual(png.chunks_index, expected_index)
+
+    def test_sidecar_and_content_check(self):
+        cache = IndexCache(sidecar=True, check_content=True)
+        stat = os.stat(self.path)
+        cache.store(self.path, stat, [(8, 13, b'IHDR')], {0: True})
+        self.assertTrue(os.path.exists(f'{self.path}.pngidx'))
+        self.assertEqual(cache.load(self.path, stat), ([(8, 13, b'IHDR')], {0: True}))
+
+        # same size and mtime, different content
+        with open(self.path, 'r+b') as f:
+            f.seek(100)
+            f.write(b'\x00')
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertIsNone(cache.load(self.path, os.stat(self.path)))
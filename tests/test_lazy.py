@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from io import BytesIO
+
+import pngparser
+from pngparser import TYPE_IDAT, TYPE_IHDR, TYPE_tEXt
+from pngparser.png import ChunkRef
+
+from .test_functional import SIMPLE_PNG
+
+
+class TestCaseLazy(unittest.TestCase):
+
+    def test_open_reads_no_payload(self):
+        with pngparser.PngParser('example/grayscale.png', lazy=True) as png:
+            self.assertTrue(all(isinstance(c, ChunkRef) for c in png._chunks))
+            self.assertEqual(png.get_header().width, 393)
+
+            loaded = [c.type for c in png._chunks if not isinstance(c, ChunkRef)]
+            self.assertEqual(loaded, [TYPE_IHDR])
+
+    def test_same_chunks_as_eager(self):
+        with pngparser.PngParser('example/grayscale.png') as eager, \
+                pngparser.PngParser('example/grayscale.png', lazy=True) as lazy:
+            texts = [(c.key, c.text) for c in lazy.get_by_type(TYPE_tEXt)]
+            self.assertEqual(texts, [(c.key, c.text) for c in eager.get_by_type(TYPE_tEXt)])
+            self.assertEqual(lazy.chunks_pos, eager.chunks_pos)
+            self.assertEqual(lazy.get_by_index(4).data, eager.get_by_index(4).data)
+
+            self.assertEqual([c.type for c in lazy.get_all()], [c.type for c in eager.get_all()])
+
+    def test_lazy_save(self):
+        png = pngparser.PngParser(BytesIO(SIMPLE_PNG), lazy=True)
+
+        with tempfile.NamedTemporaryFile() as tmp_file:
+            png.save_file(tmp_file.name)
+            content = tmp_file.read()
+
+        self.assertEqual(content, SIMPLE_PNG)
+
+    def test_set_image_data_reads_no_payload(self):
+        with pngparser.PngParser('example/grayscale.png') as eager:
+            expected = eager.get_image_data().get_image_buffer()
+            types = [c.type for c in eager.chunks if c.type != TYPE_IDAT]
+
+        with pngparser.PngParser('example/grayscale.png', lazy=True) as png, \
+                tempfile.NamedTemporaryFile() as tmp_file:
+            png.set_image_data(png.get_image_data())
+            loaded = [c.type for c in png._chunks if not isinstance(c, ChunkRef)]
+            self.assertEqual(loaded, [TYPE_IHDR, TYPE_IDAT])
+
+            png.save_file(tmp_file.name)
+            with pngparser.PngParser(tmp_file.name) as saved:
+                self.assertEqual([c.type for c in saved.chunks if c.type != TYPE_IDAT], types)
+                self.assertEqual(saved.get_image_data().get_image_buffer(), expected)
+
+    def test_truncated_file(self):
+        png = pngparser.PngParser(BytesIO(SIMPLE_PNG[:40]), lazy=True)
+        self.assertEqual(len(png.get_all()), 2)
+
+
+class TestCaseZeroCopy(unittest.TestCase):
+
+    def test_idat_data_is_view(self):
+        with pngparser.PngParser('example/grayscale.png', zero_copy=True) as png:
+            idat = png.get_by_type(TYPE_IDAT)[0]
+            self.assertIsInstance(idat.data, memoryview)
+            self.assertIsInstance(png.get_header().width, int)
+
+            with pngparser.PngParser('example/grayscale.png') as copy:
+                expected = copy.get_image_data().data
+            self.assertEqual(png.get_image_data().data, expected)
+
+    def test_view_outlives_close(self):
+        png = pngparser.PngParser('example/grayscale.png', zero_copy=True)
+        idat = png.get_by_type(TYPE_IDAT)[0]
+        expected = bytes(idat.data)
+        png.close()
+
+        self.assertEqual(bytes(idat.data), expected)
+
+    def test_save_from_views(self):
+        with pngparser.PngParser('example/grayscale.png', zero_copy=True, lazy=True) as png, \
+                tempfile.NamedTemporaryFile() as tmp_file:
+            png.save_file(tmp_file.name)
+            content = tmp_file.read()
+
+        with open('example/grayscale.png', 'rb') as f:
+            self.assertEqual(content, f.read())
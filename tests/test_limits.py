@@ -0,0 +1,114 @@
+import asyncio
+import io
+import struct
+import unittest
+import zlib
+from unittest import mock
+
+import pngparser
+from pngparser import AsyncPngParser, LimitExceeded, Limits, png as png_module
+
+from .test_aio import iter_blocks
+from .test_deinterlace import chunk, make_png
+from .test_functional import SIMPLE_PNG
+
+
+def build(width, height, idat, *extra, depth=8, color_type=0):
+    ihdr = struct.pack('>IIBBBBB', width, height, depth, color_type, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + b''.join(extra) +
+            chunk(b'IDAT', idat) + chunk(b'IEND', b''))
+
+
+class TestCaseLimits(unittest.TestCase):
+
+    def test_valid_file(self):
+        for interlace in (0, 1):
+            data, expected = make_png(13, 11, 8, 2, interlace)
+            png = pngparser.PngParser(io.BytesIO(data), limits=Limits())
+            self.assertEqual(bytes(png.get_image_data().get_image_buffer()), expected)
+            self.assertEqual(len(list(png.iter_scanlines())), 11 if not interlace else 22)
+            self.assertEqual(png.preview(2).header.width, 7)
+
+    def test_file_size(self):
+        with self.assertRaises(LimitExceeded):
+            pngparser.PngParser(io.BytesIO(SIMPLE_PNG), limits=Limits(max_file_size=len(SIMPLE_PNG) - 1))
+        pngparser.PngParser(io.BytesIO(SIMPLE_PNG), limits=Limits(max_file_size=len(SIMPLE_PNG)))
+
+    def test_chunks(self):
+        texts = [chunk(b'tEXt', b'key\x00value')] * 10
+        data = build(1, 1, zlib.compress(b'\x00\x00'), *texts)
+        for lazy in (False, True):
+            with self.assertRaises(LimitExceeded):
+                pngparser.PngParser(io.BytesIO(data), lazy=lazy, limits=Limits(max_chunks=12))
+        self.assertEqual(len(pngparser.PngParser(io.BytesIO(data), limits=Limits(max_chunks=13)).chunks), 13)
+
+    def test_chunk_length(self):
+        # declared length far past the end of the file
+        data = SIMPLE_PNG[:-12] + struct.pack('>I', 2 ** 31 - 1) + b'tEXt' + b'key\x00value'
+        with self.assertRaises(LimitExceeded):
+            pngparser.PngParser(io.BytesIO(data), limits=Limits(max_chunk_length=1 << 20))
+
+        # only the bytes present are read
+        png = pngparser.PngParser(io.BytesIO(data))
+        self.assertEqual(png.chunks[-1].data, b'key\x00value')
+
+    def test_pixels_checked_before_inflate(self):
+        data = build(100000, 100000, zlib.compress(b'\x00' * 100))
+        png = pngparser.PngParser(io.BytesIO(data), limits=Limits())
+        with mock.patch.object(png_module, 'inflate_limited') as inflate:
+            with self.assertRaises(LimitExceeded):
+                png.get_image_data()
+        inflate.assert_not_called()
+
+        for decode in (png.iter_scanlines, lambda: png.preview(8), lambda: png.decode_region(0, 0, 1, 1)):
+            with self.assertRaises(LimitExceeded):
+                decode()
+
+    def test_inflated_bytes(self):
+        # 16 MB declared by the header
+        data = build(2048, 2048, zlib.compress(b'\x00'), color_type=6)
+        png = pngparser.PngParser(io.BytesIO(data), limits=Limits(max_inflated_bytes=1 << 20))
+        with self.assertRaises(LimitExceeded):
+            png.get_image_data()
+
+    def test_decompression_bomb(self):
+        # 16x16 grey image whose data inflates to 16 MB
+        data = build(16, 16, zlib.compress(bytes(16 << 20), 9))
+        png = pngparser.PngParser(io.BytesIO(data), limits=Limits())
+        with mock.patch.object(png_module, 'inflate_limited', wraps=png_module.inflate_limited) as inflate:
+            with self.assertRaises(LimitExceeded):
+                png.get_image_data()
+        self.assertEqual(inflate.call_args[0][1], 16 * 17)
+
+        # streaming stops after the last row
+        self.assertEqual(len(list(png.iter_scanlines())), 16)
+
+    def test_text_inflate(self):
+        ztxt = chunk(b'zTXt', b'Comment\x00\x00' + zlib.compress(b'a' * 100000))
+        data = build(1, 1, zlib.compress(b'\x00\x00'), ztxt)
+        with self.assertRaises(LimitExceeded):
+            pngparser.PngParser(io.BytesIO(data), limits=Limits(max_text_inflate=1000))
+        png = pngparser.PngParser(io.BytesIO(data), lazy=True, limits=Limits(max_text_inflate=1000))
+        with self.assertRaises(LimitExceeded):
+            png.get_text_chunks()
+
+        png = pngparser.PngParser(io.BytesIO(data), limits=Limits(max_text_inflate=100000))
+        self.assertEqual(len(png.get_text_chunks()[0].text), 100000)
+
+    def test_async(self):
+        async def decode(data, limits):
+            parser = AsyncPngParser(iter_blocks(data, 100), limits=limits)
+            return [s async for s in parser.iter_scanlines()]
+
+        self.assertEqual(len(asyncio.run(decode(SIMPLE_PNG, Limits()))), 1)
+        for data, limits in ((build(100000, 100000, b''), Limits()),
+                             (SIMPLE_PNG, Limits(max_chunk_length=20)),
+                             (SIMPLE_PNG, Limits(max_chunks=2)),
+                             (SIMPLE_PNG, Limits(max_file_size=50))):
+            with self.subTest(limits=limits):
+                with self.assertRaises(LimitExceeded):
+                    asyncio.run(decode(data, limits))
+
+
+if __name__ == '__main__':
+    unittest.main()
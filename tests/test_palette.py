@@ -0,0 +1,79 @@
+import random
+import struct
+import unittest
+import zlib
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+import pngparser
+from pngparser import palette as palette_module
+
+from .test_deinterlace import chunk, pack_row
+
+PALETTE = [(i, 255 - i, (i * 7) % 256) for i in range(16)]
+ALPHA = bytes(range(0, 160, 20))
+
+
+def make_indexed_png(width, height, depth, alpha=None, seed=0):
+    rng = random.Random(seed)
+    indices = [[rng.randrange(min(1 << depth, len(PALETTE))) for _ in range(width)] for _ in range(height)]
+    raw = b''.join(b'\x00' + pack_row([(i,) for i in row], depth, 1) for row in indices)
+
+    ihdr = struct.pack('>IIBBBBB', width, height, depth, 3, 0, 0, 0)
+    data = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr)
+    data += chunk(b'PLTE', b''.join(bytes(c) for c in PALETTE))
+    if alpha is not None:
+        data += chunk(b'tRNS', alpha)
+    data += chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+    return data, indices
+
+
+class TestCasePalette(unittest.TestCase):
+
+    def check_expand(self):
+        for depth in (1, 2, 4, 8):
+            with self.subTest(depth=depth):
+                data, indices = make_indexed_png(13, 5, depth, ALPHA)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+
+                rgba = img.expand_palette()
+                colors = palette_module.palette_colors(PALETTE, ALPHA)
+                self.assertEqual(rgba, b''.join(bytes(colors[i]) for row in indices for i in row))
+
+                rgb = img.expand_palette(alpha=False)
+                self.assertEqual(rgb, b''.join(bytes(PALETTE[i]) for row in indices for i in row))
+
+    def test_expand_numpy(self):
+        if palette_module.np is None:
+            self.skipTest('numpy not installed')
+        self.check_expand()
+
+    def test_expand_python(self):
+        with mock.patch.object(palette_module, 'np', None), \
+                mock.patch('pngparser.imagedata.np', None), \
+                mock.patch('pngparser.samples.np', None):
+            self.check_expand()
+
+    def test_table(self):
+        table = palette_module.palette_table(PALETTE, ALPHA)
+        self.assertEqual(len(table), 256 * 4)
+        # entries not covered by tRNS are opaque
+        self.assertEqual(table[15 * 4:16 * 4], bytes(PALETTE[15]) + b'\xff')
+        self.assertEqual(table[16 * 4:], bytes(240 * 4))
+
+    def test_inverse(self):
+        inverse = palette_module.inverse_palette(PALETTE + [PALETTE[3]])
+        self.assertEqual(inverse[PALETTE[3]], 3)
+        self.assertEqual(len(inverse), len(PALETTE))
+
+    def test_save_pixels(self):
+        for depth in (2, 8):
+            with self.subTest(depth=depth):
+                data, indices = make_indexed_png(9, 2, depth)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+                row = img.scanlines[0].data
+
+                pixels = img._get_pixels(row)
+                self.assertEqual(pixels, [PALETTE[i] for i in indices[0]])
+                self.assertEqual(img._save_pixels(SimpleNamespace(pixels=pixels)), bytes(row))
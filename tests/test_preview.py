@@ -0,0 +1,123 @@
+import io
+import unittest
+from unittest import mock
+
+import pngparser
+from pngparser import imagedata, samples
+from pngparser.samples import pack_samples, unpack_samples
+
+from .test_deinterlace import make_png
+
+SAMPLES = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def pixels(buffer, width, height, depth, spp):
+    # rows of pixels of a full image buffer
+    row_size = -(-width * depth * spp // 8)
+    rows = []
+    for y in range(height):
+        samples = [int(v) for v in unpack_samples(buffer[y * row_size:(y + 1) * row_size], depth)][:width * spp]
+        rows.append([tuple(samples[x * spp:(x + 1) * spp]) for x in range(width)])
+    return rows
+
+
+def pack(rows, depth):
+    return b''.join(pack_samples([v for px in row for v in px], depth) for row in rows)
+
+
+def nearest(rows, factor):
+    return [row[::factor] for row in rows[::factor]]
+
+
+def box(rows, factor):
+    result = []
+    for y in range(0, len(rows), factor):
+        block_rows = rows[y:y + factor]
+        line = []
+        for x in range(0, len(rows[0]), factor):
+            block = [px for row in block_rows for px in row[x:x + factor]]
+            line.append(tuple((sum(v) + len(block) // 2) // len(block) for v in zip(*block)))
+        result.append(line)
+    return result
+
+
+class TestCasePreview(unittest.TestCase):
+
+    def test_nearest(self):
+        for interlace in (0, 1):
+            for depth, color_type in ((1, 0), (2, 3), (4, 0), (8, 2), (16, 6), (8, 4)):
+                data, expected = make_png(21, 19, depth, color_type, interlace)
+                rows = pixels(expected, 21, 19, depth, SAMPLES[color_type])
+                png = pngparser.PngParser(io.BytesIO(data))
+                for factor in (1, 2, 3, 4, 8, 32):
+                    with self.subTest(interlace=interlace, depth=depth, color_type=color_type, factor=factor):
+                        img = png.preview(factor)
+                        reduced = nearest(rows, factor)
+                        self.assertEqual((img.header.width, img.header.height), (len(reduced[0]), len(reduced)))
+                        self.assertEqual(img.header.interlace_method, 0)
+                        self.assertEqual(bytes(img.get_image_buffer()), pack(reduced, depth))
+
+    def test_interlaced_passes(self):
+        data, _ = make_png(64, 64, 8, 2, 1)
+        png = pngparser.PngParser(io.BytesIO(data))
+        for factor, scanlines in ((8, 8), (4, 8 + 8 + 8), (2, 8 + 8 + 8 + 16 + 16)):
+            with self.subTest(factor=factor):
+                with mock.patch.object(imagedata, 'unfilter_row', wraps=imagedata.unfilter_row) as unfilter:
+                    png.preview(factor)
+                self.assertEqual(unfilter.call_count, scanlines)
+
+    def test_box(self):
+        for depth, color_type in ((2, 0), (8, 2), (16, 4), (8, 6)):
+            data, expected = make_png(21, 19, depth, color_type, 0)
+            rows = pixels(expected, 21, 19, depth, SAMPLES[color_type])
+            png = pngparser.PngParser(io.BytesIO(data))
+            for factor in (1, 2, 4, 5):
+                with self.subTest(depth=depth, color_type=color_type, factor=factor):
+                    img = png.preview(factor, box=True)
+                    self.assertEqual(bytes(img.get_image_buffer()), pack(box(rows, factor), depth))
+
+    def test_without_numpy(self):
+        data, expected = make_png(21, 19, 16, 2, 0)
+        rows = pixels(expected, 21, 19, 16, 3)
+        png = pngparser.PngParser(io.BytesIO(data))
+        with mock.patch.object(imagedata, 'np', None), mock.patch.object(samples, 'np', None):
+            self.assertEqual(bytes(png.preview(4, box=True).get_image_buffer()), pack(box(rows, 4), 16))
+            self.assertEqual(bytes(png.preview(3).get_image_buffer()), pack(nearest(rows, 3), 16))
+
+    def test_single_large_idat(self):
+        # one IDAT inflated by many blocks, blocks end inside rows
+        data, expected = make_png(64, 48, 8, 6, 0)
+        rows = pixels(expected, 64, 48, 8, 4)
+        png = pngparser.PngParser(io.BytesIO(data))
+        with mock.patch.object(imagedata, 'INFLATE_BLOCK_SIZE', 4096):
+            self.assertEqual(bytes(png.preview(3).get_image_buffer()), pack(nearest(rows, 3), 8))
+            self.assertEqual(bytes(png.preview(4, box=True).get_image_buffer()), pack(box(rows, 4), 8))
+
+    def test_box_not_allowed(self):
+        for color_type, interlace in ((3, 0), (2, 1)):
+            data, _ = make_png(8, 8, 8, color_type, interlace)
+            with self.assertRaises(ValueError):
+                pngparser.PngParser(io.BytesIO(data)).preview(2, box=True)
+
+    def test_image_data_preview(self):
+        data, _ = make_png(21, 19, 4, 3, 1)
+        png = pngparser.PngParser(io.BytesIO(data))
+        img = png.get_image_data()
+        preview = img.preview(4)
+        self.assertEqual(preview.get_image_buffer(), png.preview(4).get_image_buffer())
+        self.assertIs(preview.palette, img.palette)
+
+        # built from the loaded scanlines too
+        img.scanlines
+        self.assertEqual(img.preview(4).get_image_buffer(), preview.get_image_buffer())
+        # the reduced image can be saved
+        self.assertEqual(preview.to_bytes()[0], 0)
+
+    def test_invalid_factor(self):
+        data, _ = make_png(8, 8, 8, 0, 0)
+        with self.assertRaises(ValueError):
+            pngparser.PngParser(io.BytesIO(data)).preview(0)
+
+
+if __name__ == '__main__':
+    unittest.main()
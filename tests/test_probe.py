@@ -0,0 +1,77 @@
+import io
+import struct
+import unittest
+import zlib
+
+import pngparser
+from pngparser import LimitExceeded, Limits, probe
+
+from .test_deinterlace import chunk
+from .test_functional import SIMPLE_PNG
+
+
+class NoSeekStream(io.RawIOBase):
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class TestCaseProbe(unittest.TestCase):
+
+    def test_probe_path(self):
+        with pngparser.PngParser('example/grayscale.png') as png:
+            header = png.get_header()
+            types = tuple(c.type for c in png.chunks)
+            texts = png.get_text_chunks()
+
+        result = probe('example/grayscale.png', text=True)
+        self.assertEqual((result.width, result.height, result.bit_depth, result.color_type),
+                         (header.width, header.height, header.bit_depth, header.color_type))
+        self.assertEqual(result.chunk_types, types)
+        self.assertEqual(len(result.text), len(texts))
+        self.assertFalse(result.truncated)
+
+        self.assertIsNone(probe('example/grayscale.png').text)
+        with self.assertRaises(AttributeError):
+            result.width = 1
+
+    def test_probe_streams(self):
+        expected = probe(io.BytesIO(SIMPLE_PNG))
+        self.assertEqual(expected.chunk_types, (b'IHDR', b'IDAT', b'IEND'))
+        self.assertEqual(probe(NoSeekStream(SIMPLE_PNG)), expected)
+
+    def test_truncated(self):
+        result = probe(io.BytesIO(SIMPLE_PNG[:-12]))
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.chunk_types, (b'IHDR', b'IDAT'))
+
+    def test_text_limits(self):
+        # text chunk declaring far more bytes than the file holds
+        data = SIMPLE_PNG[:-12] + struct.pack('>I', 2 ** 31 - 1) + b'tEXt' + b'key\x00value'
+        result = probe(NoSeekStream(data), text=True)
+        self.assertTrue(result.truncated)
+        self.assertEqual(result.text, ())
+        with self.assertRaises(LimitExceeded):
+            probe(io.BytesIO(data), text=True, limits=Limits(max_chunk_length=1 << 20))
+
+        ztxt = chunk(b'zTXt', b'Comment\x00\x00' + zlib.compress(b'a' * 100000))
+        data = SIMPLE_PNG[:-12] + ztxt + SIMPLE_PNG[-12:]
+        with self.assertRaises(LimitExceeded):
+            probe(io.BytesIO(data), text=True, limits=Limits(max_text_inflate=1000))
+        self.assertEqual(len(probe(io.BytesIO(data), text=True, limits=Limits()).text[0][2]), 100000)
+        with self.assertRaises(LimitExceeded):
+            probe(io.BytesIO(data), limits=Limits(max_chunks=3))
+
+    def test_not_png(self):
+        with self.assertRaises(Exception):
+            probe(io.BytesIO(b'GIF89a' + bytes(40)))
+        with self.assertRaises(Exception):
+            probe(io.BytesIO(SIMPLE_PNG[:20]))
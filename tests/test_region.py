@@ -0,0 +1,79 @@
+import io
+import unittest
+from unittest import mock
+
+import pngparser
+from pngparser import imagedata
+from pngparser.samples import pack_samples, unpack_samples
+
+from .test_deinterlace import make_png
+
+
+def crop(buffer, width, height, depth, samples, box):
+    # reference crop of a full image buffer
+    x, y, w, h = box
+    row_size = -(-width * depth * samples // 8)
+    result = b''
+    for r in range(y, y + h):
+        row = buffer[r * row_size:(r + 1) * row_size]
+        if depth * samples >= 8:
+            size = depth * samples // 8
+            result += row[x * size:(x + w) * size]
+        else:
+            result += pack_samples(unpack_samples(row, depth)[x:x + w], depth)
+    return result
+
+
+class TestCaseRegion(unittest.TestCase):
+
+    def check(self, width, height, depth, color_type, interlace, boxes):
+        data, expected = make_png(width, height, depth, color_type, interlace)
+        samples = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+        png = pngparser.PngParser(io.BytesIO(data))
+        for box in boxes:
+            with self.subTest(depth=depth, color_type=color_type, interlace=interlace, box=box):
+                region = png.decode_region(*box)
+                self.assertEqual(bytes(region), crop(expected, width, height, depth, samples, box))
+
+    def test_formats(self):
+        boxes = ((0, 0, 13, 11), (3, 2, 5, 4), (7, 9, 1, 1), (12, 0, 1, 11), (1, 5, 9, 6))
+        for interlace in (0, 1):
+            for depth, color_type in ((1, 0), (2, 0), (4, 3), (8, 2), (16, 6), (8, 4), (16, 0)):
+                self.check(13, 11, depth, color_type, interlace, boxes)
+
+    def test_small_interlaced(self):
+        # passes missing columns or rows
+        for width, height in ((1, 1), (2, 3), (5, 1)):
+            self.check(width, height, 8, 2, 1, ((0, 0, width, height), (width - 1, height - 1, 1, 1)))
+
+    def test_single_large_idat(self):
+        # one IDAT inflated by many blocks, blocks end inside rows
+        with mock.patch.object(imagedata, 'INFLATE_BLOCK_SIZE', 4096):
+            for interlace in (0, 1):
+                self.check(64, 48, 8, 6, interlace, ((0, 0, 64, 48), (10, 30, 20, 5), (63, 47, 1, 1)))
+
+    def test_stops_early(self):
+        data, _ = make_png(16, 64, 8, 2, 0)
+        png = pngparser.PngParser(io.BytesIO(data))
+        with mock.patch.object(imagedata, 'unfilter_row', wraps=imagedata.unfilter_row) as unfilter:
+            png.decode_region(4, 10, 8, 5)
+        self.assertEqual(unfilter.call_count, 15)
+
+        data, _ = make_png(16, 64, 8, 2, 1)
+        png = pngparser.PngParser(io.BytesIO(data))
+        with mock.patch.object(imagedata, 'unfilter_row', wraps=imagedata.unfilter_row) as unfilter:
+            png.decode_region(0, 0, 16, 4)
+        # the last pass is only decoded to its row 3
+        self.assertEqual(unfilter.call_count, 8 + 8 + 8 + 16 + 16 + 32 + 2)
+
+    def test_invalid_region(self):
+        data, _ = make_png(8, 8, 8, 0, 0)
+        png = pngparser.PngParser(io.BytesIO(data))
+        for box in ((0, 0, 0, 1), (-1, 0, 2, 2), (4, 4, 5, 1), (0, 7, 1, 2)):
+            with self.subTest(box=box):
+                with self.assertRaises(ValueError):
+                    png.decode_region(*box)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import io
+import random
+import unittest
+import zlib
+from unittest import mock
+
+import pngparser
+from pngparser import checkpoints
+from benchmarks.corpus import Case, make_png
+
+
+def scanlines(img):
+    return [(s.filter, bytes(s.data)) for s in img]
+
+
+class TestCaseRows(unittest.TestCase):
+
+    def setUp(self):
+        # filters cycle through the 5 types, data split in 1K IDAT chunks
+        self.data = make_png(Case('small', 2, 8, 0, 'split'))
+        self.expected = scanlines(pngparser.PngParser(io.BytesIO(self.data)).get_image_data().scanlines)
+
+    def test_parser_rows(self):
+        png = pngparser.PngParser(io.BytesIO(self.data))
+        for y0, y1 in ((0, 1), (100, 140), (31, 33), (250, 300), (-5, 3), (10, 10)):
+            with self.subTest(y0=y0, y1=y1):
+                self.assertEqual(scanlines(png.rows(y0, y1, interval=32)), self.expected[max(0, y0):y1])
+
+        index = png.row_index(32)
+        self.assertIs(png.row_index(32), index)
+        self.assertEqual([c.row for c in index.checkpoints], list(range(0, 256, 32)))
+
+    def test_resume_from_checkpoint(self):
+        png = pngparser.PngParser(io.BytesIO(self.data))
+        png.row_index(16).build()
+
+        with mock.patch.object(checkpoints, 'unfilter_row', wraps=checkpoints.unfilter_row) as unfilter:
+            rows = png.rows(200, 203, interval=16)
+        self.assertEqual(scanlines(rows), self.expected[200:203])
+        # resumed from row 192
+        self.assertEqual(unfilter.call_count, 11)
+
+    def test_single_large_idat(self):
+        # one IDAT read by blocks much smaller than it, blocks end inside rows
+        rng = random.Random(7)
+        raw = b''.join(bytes([y % 5]) + rng.randbytes(300) for y in range(120))
+        header = pngparser.ChunkIHDR(b'IHDR', b'\x00\x00\x00\x64\x00\x00\x00\x78\x08\x02\x00\x00\x00', b'')
+        expected = [(f, bytes(d)) for f, d in pngparser.filters.unfilter_scanlines(header, raw, 300)]
+
+        with mock.patch.object(checkpoints, 'INFLATE_BLOCK_SIZE', 1000):
+            index = checkpoints.RowIndex(header, [zlib.compress(raw)], interval=16)
+            index.build()
+            self.assertEqual(len(index.checkpoints), 8)
+            for y0, y1 in ((0, 120), (33, 35), (112, 120)):
+                with self.subTest(y0=y0, y1=y1):
+                    self.assertEqual(scanlines(index.rows(y0, y1)), expected[y0:y1])
+
+    def test_index_dropped_on_change(self):
+        png = pngparser.PngParser(io.BytesIO(self.data))
+        index = png.row_index()
+        png.set_image_data(png.get_image_data(), filter_strategy='minsum')
+        self.assertIsNot(png.row_index(), index)
+        self.assertEqual([bytes(s.data) for s in png.rows(5, 9)], [d for _, d in self.expected[5:9]])
+
+    def test_interlaced(self):
+        data = make_png(Case('icon', 2, 8, 1, 'single'))
+        png = pngparser.PngParser(io.BytesIO(data))
+        with self.assertRaises(ValueError):
+            png.rows(0, 1)
+
+        img = png.get_image_data()
+        buffer = img.get_image_buffer()
+        self.assertEqual([bytes(s.data) for s in img.rows(3, 5)], [buffer[3 * 48:4 * 48], buffer[4 * 48:5 * 48]])
+
+    def test_image_data_rows(self):
+        img = pngparser.PngParser(io.BytesIO(self.data)).get_image_data()
+        self.assertEqual(scanlines(img.rows(100, 104, interval=50)), self.expected[100:104])
+        self.assertEqual(scanlines(img.rows(120, 122, interval=50)), self.expected[120:122])
+        self.assertEqual(sorted(img._row_checkpoints[50]), [0, 50, 100])
+        self.assertIsNone(img._scanlines)
@@ -0,0 +1,65 @@
+import random
+import unittest
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+import pngparser
+from pngparser import samples
+
+from .test_deinterlace import make_png, pack_row
+
+
+class TestCaseSamples(unittest.TestCase):
+
+    def check_round_trip(self):
+        rng = random.Random(1)
+        for depth in (1, 2, 4, 8, 16):
+            with self.subTest(depth=depth):
+                values = [rng.randrange(1 << depth) for _ in range(37)]
+                packed = pack_row([(v,) for v in values], depth, 1)
+
+                self.assertEqual(samples.pack_samples(values, depth), packed)
+                unpacked = list(samples.unpack_samples(packed, depth))
+                # padding bits of the last byte are unpacked as zeros
+                self.assertEqual(unpacked[:len(values)], values)
+                self.assertFalse(any(unpacked[len(values):]))
+
+    def test_round_trip_numpy(self):
+        if samples.np is None:
+            self.skipTest('numpy not installed')
+        self.check_round_trip()
+
+    def test_round_trip_python(self):
+        with mock.patch.object(samples, 'np', None):
+            self.check_round_trip()
+
+    def test_scale(self):
+        for np_module in (samples.np, None):
+            with self.subTest(numpy=np_module is not None), mock.patch.object(samples, 'np', np_module):
+                self.assertEqual(list(samples.scale_to_8bit([0, 1], 1)), [0, 255])
+                self.assertEqual(list(samples.scale_to_8bit([0, 1, 3], 2)), [0, 85, 255])
+                self.assertEqual(list(samples.scale_to_8bit([0, 0x12ff, 0xffff], 16)), [0, 0x12, 0xff])
+
+    def test_bad_depth(self):
+        with self.assertRaises(ValueError):
+            samples.unpack_samples(b'\x00', 3)
+
+    def test_get_pixels(self):
+        for depth, color_type in ((1, 0), (4, 0), (8, 2), (16, 6)):
+            with self.subTest(depth=depth, color_type=color_type):
+                data, expected = make_png(11, 3, depth, color_type, 0)
+                img = pngparser.PngParser(BytesIO(data)).get_image_data()
+                row = img.scanlines[0].data
+
+                pixels = img._get_pixels(row)
+                self.assertEqual(len(pixels), 11)
+                self.assertEqual(len(pixels[0]), img.header.pixel_len)
+
+                raw = list(samples.unpack_samples(expected[:len(row)], depth))
+                scaled = list(samples.scale_to_8bit(raw, depth))
+                self.assertEqual([v for px in pixels for v in px], scaled[:11 * img.header.pixel_len])
+
+                saved = img._save_pixels(SimpleNamespace(pixels=[
+                    raw[i:i + img.header.pixel_len] for i in range(0, 11 * img.header.pixel_len, img.header.pixel_len)]))
+                self.assertEqual(saved, bytes(row))
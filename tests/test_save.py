@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+import pngparser
+from pngparser import TYPE_tEXt
+
+from .test_functional import SIMPLE_PNG
+
+
+class TestCaseIncrementalSave(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'image.png')
+        shutil.copy('example/grayscale.png', self.path)
+        with open(self.path, 'rb') as f:
+            self.content = f.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_loaded_chunks_are_clean(self):
+        with pngparser.PngParser(self.path) as png:
+            self.assertFalse(any(c.dirty for c in png.get_all()))
+
+            text = png.get_by_type(TYPE_tEXt)[0]
+            text.text = 'changed'
+            self.assertTrue(text.dirty)
+            self.assertTrue(pngparser.ChunkRaw(b'teSt', b'').dirty)
+
+    def test_unmodified_chunks_are_copied(self):
+        out = os.path.join(self.tmp_dir, 'out.png')
+        with pngparser.PngParser(self.path) as png, \
+                mock.patch.object(png, '_write_chunk') as write_chunk:
+            png.save_file(out)
+            write_chunk.assert_not_called()
+
+        with open(out, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_modified_chunk_is_serialized(self):
+        out = os.path.join(self.tmp_dir, 'out.png')
+        with pngparser.PngParser(self.path, lazy=True) as png:
+            png.get_by_type(TYPE_tEXt)[0].text = 'changed'
+            png.save_file(out)
+
+        with pngparser.PngParser(out) as png:
+            self.assertEqual(png.get_by_type(TYPE_tEXt)[0].text, 'changed')
+            self.assertTrue(all(png.verify_crc(i) for i in range(len(png.get_all()))))
+            self.assertEqual(png.get_image_data().data, pngparser.PngParser(self.path).get_image_data().data)
+
+    def test_save_over_source(self):
+        with pngparser.PngParser(self.path) as png:
+            png.get_by_type(TYPE_tEXt)[1].text = 'over'
+            png.save_file(self.path)
+
+        with pngparser.PngParser(self.path) as png:
+            self.assertEqual(png.get_by_type(TYPE_tEXt)[1].text, 'over')
+
+    def test_fix_crc(self):
+        broken = bytearray(SIMPLE_PNG)
+        broken[30] ^= 0xff
+        png = pngparser.PngParser(BytesIO(bytes(broken)))
+
+        out = os.path.join(self.tmp_dir, 'out.png')
+        png.save_file(out)
+        with open(out, 'rb') as f:
+            self.assertEqual(f.read(), broken)
+
+        png.save_file(out, fix_crc=True)
+        with open(out, 'rb') as f:
+            self.assertEqual(f.read(), SIMPLE_PNG)
@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+
+import pngparser
+from pngparser.stats import Stats, measure
+
+
+class TestCaseStats(unittest.TestCase):
+
+    def test_stages(self):
+        records = []
+        stats = Stats(hooks=[records.append])
+        with pngparser.PngParser('example/grayscale.png', stats=stats) as png:
+            img = png.get_image_data()
+            img.scanlines  # pylint: disable=pointless-statement
+            png.set_image_data(img)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                path = os.path.join(tmp_dir, 'out.png')
+                png.save_file(path)
+                written = os.path.getsize(path)
+
+        self.assertEqual(list(stats.as_dict()), ['read', 'inflate', 'unfilter', 'filter', 'deflate', 'write'])
+        self.assertEqual([r.name for r in records], ['read', 'inflate', 'unfilter', 'filter', 'deflate', 'write'])
+
+        inflate = stats.stages['inflate']
+        self.assertEqual(inflate.calls, 1)
+        self.assertEqual(inflate.bytes_out, len(img.data))
+        self.assertEqual(stats.stages['deflate'].bytes_in, len(img.to_bytes()))
+        self.assertEqual(stats.stages['write'].bytes_out, written)
+        self.assertIsNone(inflate.peak_memory)
+
+        self.assertEqual(json.loads(stats.to_json())['inflate']['bytes_out'], len(img.data))
+        self.assertIn('unfilter', stats.report())
+
+    def test_memory(self):
+        stats = Stats(trace_memory=True)
+        try:
+            with stats.stage('alloc') as m:
+                data = bytearray(1 << 20)
+                m.bytes_out = len(data)
+        finally:
+            stats.close()
+        self.assertGreaterEqual(stats.stages['alloc'].peak_memory, 1 << 20)
+
+    def test_disabled(self):
+        with measure(None, 'read', 10) as m:
+            m.bytes_out = 10
+        with pngparser.PngParser('example/rgb.png') as png:
+            self.assertIsNone(png.stats)
+            self.assertIsNone(png.get_image_data().stats)
@@ -0,0 +1,92 @@
+import random
+import unittest
+import zlib
+from io import BytesIO
+
+import pngparser
+from pngparser import imagedata
+from pngparser import ChunkRaw, TYPE_IDAT
+from pngparser.png import ChunkRef
+from benchmarks.corpus import Case, make_png
+
+
+def load_example(name):
+    return pngparser.PngParser(f'example/{name}')
+
+
+class TestCaseStreaming(unittest.TestCase):
+
+    def assert_same_scanlines(self, png):
+        expected = [(s.filter, bytes(s.data)) for s in png.get_image_data().scanlines]
+        streamed = [(s.filter, bytes(s.data)) for s in png.iter_scanlines()]
+        self.assertEqual(streamed, expected)
+
+    def test_stream_matches_full_decode(self):
+        for name in ('normal.png', 'grayscale.png', 'palette.png', 'rgb.png'):
+            with self.subTest(name=name), load_example(name) as png:
+                self.assert_same_scanlines(png)
+
+    def test_stream_interlaced(self):
+        with load_example('interlaced.png') as png:
+            self.assert_same_scanlines(png)
+
+    def test_stream_tiny_idat_chunks(self):
+        with load_example('grayscale.png') as png:
+            expected = [(s.filter, bytes(s.data)) for s in png.iter_scanlines()]
+
+            data = zlib.compress(png.get_image_data().data)
+            idats = [ChunkRaw(TYPE_IDAT, data[i:i+7]) for i in range(0, len(data), 7)]
+            png.chunks = [png.get_header()] + idats
+
+            streamed = [(s.filter, bytes(s.data)) for s in png.iter_scanlines()]
+        self.assertEqual(streamed, expected)
+
+    def test_lazy_chunks_not_kept(self):
+        # 256 rows in 1K IDAT chunks
+        data = make_png(Case('small', 2, 8, 0, 'split'))
+        expected = [(s.filter, bytes(s.data)) for s in pngparser.PngParser(BytesIO(data)).iter_scanlines()]
+
+        png = pngparser.PngParser(BytesIO(data), lazy=True)
+        streamed = [(s.filter, bytes(s.data)) for s in png.iter_scanlines()]
+        self.assertEqual(streamed, expected)
+
+        for decode in (lambda: png.decode_region(0, 100, 8, 8), lambda: png.preview(4), lambda: png.rows(10, 12)):
+            decode()
+        # only the header is loaded, IDAT payloads are read and dropped
+        self.assertEqual([c.type for c in png._chunks if not isinstance(c, ChunkRef)], [b'IHDR'])
+
+    def test_single_large_idat(self):
+        class Inflater:
+            # record the size of the compressed input of each call
+            def __init__(self):
+                self.inflater = zlib.decompressobj()
+                self.sizes = []
+
+            def decompress(self, data, max_length=0):
+                self.sizes.append(len(data))
+                return self.inflater.decompress(data, max_length)
+
+            @property
+            def unconsumed_tail(self):
+                return self.inflater.unconsumed_tail
+
+        # 300 rows of random RGB pixels, the IDAT is larger than two inflate blocks
+        rng = random.Random(4)
+        raw = b''.join(bytes([y % 3]) + rng.randbytes(600) for y in range(300))
+        header = pngparser.ChunkIHDR(b'IHDR', b'\x00\x00\x00\xc8\x00\x00\x01\x2c\x08\x02\x00\x00\x00', b'')
+        data = zlib.compress(raw)
+        self.assertGreater(len(data), 2 * imagedata.INFLATE_BLOCK_SIZE)
+
+        decoder = imagedata.ScanlineDecoder(header)
+        decoder.inflater = Inflater()
+        rows = list(decoder.feed(data)) + list(decoder.finish())
+        expected = pngparser.filters.unfilter_scanlines(header, raw, 600)
+        self.assertEqual([(r.filter, bytes(r.data)) for r in rows], [(f, bytes(d)) for f, d in expected])
+        self.assertLessEqual(max(decoder.inflater.sizes), imagedata.INFLATE_BLOCK_SIZE)
+
+    def test_sixteen_bit_rows(self):
+        header = pngparser.ChunkIHDR(b'IHDR', b'\x00\x00\x00\x02\x00\x00\x00\x02\x10\x00\x00\x00\x00', b'')
+        raw = b'\x00\x01\x02\x03\x04' + b'\x01\x01\x01\x01\x01'
+        rows = list(pngparser.imagedata.stream_scanlines(header, [zlib.compress(raw)]))
+
+        self.assertEqual([bytes(r.data) for r in rows], [b'\x01\x02\x03\x04', b'\x01\x01\x02\x02'])